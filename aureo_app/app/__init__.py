@@ -1,13 +1,17 @@
 import os
-from flask import Flask, render_template, send_from_directory, jsonify
+from flask import Flask, render_template, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_cors import CORS
 from flask_session import Session
 from werkzeug.middleware.proxy_fix import ProxyFix
 
+from .storage import RoutingSession, TimedQueuePool, init_storage
+from .metrics import init_metrics
+from .query_stats import init_query_stats
+
 # Inicializar extensiones
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession}, engine_options={'poolclass': TimedQueuePool})
 login_manager = LoginManager()
 sess = Session()
 
@@ -20,16 +24,36 @@ def create_app():
     
     # Inicializar extensiones
     db.init_app(app)
+    init_storage(app, db)
+    init_metrics(app)
+    init_query_stats(app, db)
     login_manager.init_app(app)
-    sess.init_app(app)
+    if app.config['SESSION_TYPE'] == 'database':
+        from .sessions import DatabaseSessionInterface
+        app.session_interface = DatabaseSessionInterface(app)
+    else:
+        sess.init_app(app)
     CORS(app)
     
+    # Configurar caché de resultados de búsqueda
+    from .search_cache import search_cache
+    search_cache.max_bytes = app.config['SEARCH_CACHE_MAX_BYTES']
+    
+    # Configurar codificador JSON de los listados
+    from . import fast_json
+    fast_json.configure(app.config['JSON_FAST_BACKEND'])
+    
+    # Configurar caché de usuarios autenticados
+    from . import user_cache
+    user_cache.ttl_seconds = app.config['USER_CACHE_TTL_SECONDS']
+    
     # Configurar login manager
     login_manager.login_view = '/auth'
     
     with app.app_context():
         # Importar componentes
-        from .models import User, init_db
+        from .models import init_db
+        from .user_cache import load_cached_user
         from .auth import auth_bp
         from .routes import main_bp
         
@@ -42,19 +66,23 @@ def create_app():
         # Configurar login manager
         @login_manager.user_loader
         def load_user(user_id):
-            return User.query.get(int(user_id))
+            return load_cached_user(int(user_id))
         
         # Registrar blueprints
         app.register_blueprint(auth_bp)
         app.register_blueprint(main_bp)
         
-        # Ruta para servir archivos estáticos de React
+        # Archivos estáticos de React (manifiesto cargado una sola vez)
+        from .static_assets import StaticAssets
+        static_assets = StaticAssets(app.static_folder)
+        
         @app.route('/', defaults={'path': ''})
         @app.route('/<path:path>')
         def serve(path):
-            if path != "" and os.path.exists(os.path.join(app.static_folder, path)):
-                return send_from_directory(app.static_folder, path)
-            return render_template('index.html')
+            response = static_assets.serve_asset(path) if path else None
+            if response is None:
+                response = static_assets.serve_index()
+            return response
         
         # Manejador de errores 404
         @app.errorhandler(404)
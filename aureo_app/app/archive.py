@@ -0,0 +1,244 @@
+import os
+import re
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import MetaData, Table, Column, Index, text
+from . import db
+from .models import ExcelData
+from .data_versions import bump_version, bump_table_version
+
+# Máximo de archivos de archivo adjuntos a la vez a una conexión (SQLite admite 10 bases adjuntas)
+MAX_ATTACHED = 9
+
+# Registros movidos en cada lote
+ARCHIVE_BATCH_SIZE = 5000
+
+# Columnas indexadas en las bases de archivo (búsquedas y fichas de persona)
+ARCHIVE_INDEXED_COLUMNS = ['order_date', 'store_code', 'customer_name_norm', 'person_id']
+
+_ARCHIVE_FILE = re.compile(r'^excel_data_(\d{4})\.sqlite$')
+
+_archive_tables = {}
+
+def archive_schema(year):
+    """Nombre con el que se adjunta la base de archivo de un año"""
+    return f"archive_{int(year)}"
+
+def archive_path(year):
+    """Ruta del archivo SQLite de archivo de un año"""
+    return os.path.join(current_app.config['ARCHIVE_FOLDER'], f"excel_data_{int(year)}.sqlite")
+
+def archive_table(year):
+    """
+    Tabla excel_data de la base de archivo de un año, con las mismas
+    columnas que la tabla principal pero sin claves foráneas (las tablas
+    referenciadas no existen en la base de archivo).
+
+    Args:
+        year: Año del archivo
+
+    Returns:
+        Table: Tabla en el esquema adjunto archive_<año>
+    """
+    table = _archive_tables.get(year)
+    if table is None:
+        schema = archive_schema(year)
+        columns = [Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+                   for column in ExcelData.__table__.columns]
+        table = Table('excel_data', MetaData(), *columns, schema=schema)
+        for column in ARCHIVE_INDEXED_COLUMNS:
+            Index(f"ix_archive_excel_data_{column}", table.c[column])
+        _archive_tables[year] = table
+    return table
+
+def archive_years():
+    """Devuelve los años que tienen base de archivo, en orden"""
+    folder = current_app.config['ARCHIVE_FOLDER']
+    if not os.path.isdir(folder):
+        return []
+    years = []
+    for filename in os.listdir(folder):
+        match = _ARCHIVE_FILE.match(filename)
+        if match:
+            years.append(int(match.group(1)))
+    return sorted(years)
+
+def archive_years_for_range(date_from=None, date_to=None):
+    """
+    Devuelve los años archivados que pueden contener registros del rango de
+    fechas. Sin límite inferior se incluyen todos los años anteriores al final.
+
+    Args:
+        date_from: Fecha inicial (ISO, opcional)
+        date_to: Fecha final (ISO, opcional)
+
+    Returns:
+        list: Años cuyas bases hay que consultar
+    """
+    years = archive_years()
+    if date_from:
+        years = [year for year in years if year >= datetime.fromisoformat(date_from).year]
+    if date_to:
+        years = [year for year in years if year <= datetime.fromisoformat(date_to).year]
+    return years
+
+def archive_year_groups(years):
+    """
+    Reparte unos años archivados en grupos que se pueden adjuntar a la vez,
+    del más reciente al más antiguo.
+
+    Args:
+        years: Años archivados
+
+    Returns:
+        list: Listas de como máximo MAX_ATTACHED años consecutivos, en orden descendente
+    """
+    years = sorted(years, reverse=True)
+    return [years[start:start + MAX_ATTACHED] for start in range(0, len(years), MAX_ATTACHED)]
+
+def attach_archives(years, clause=None):
+    """
+    Adjunta las bases de archivo de unos años a la conexión que ejecutará
+    una consulta. Cada conexión del pool recuerda lo que ya tiene adjunto.
+
+    Args:
+        years: Años a adjuntar
+        clause: Sentencia que se va a ejecutar (elige la conexión de lectura o escritura)
+
+    Returns:
+        Connection: Conexión de la sesión con las bases adjuntas
+    """
+    bind_arguments = {'clause': clause} if clause is not None else None
+    connection = db.session.connection(bind_arguments=bind_arguments)
+    if not years:
+        return connection
+
+    attached = connection.info.setdefault('archive_schemas', [])
+    for year in years:
+        schema = archive_schema(year)
+        if schema in attached:
+            attached.remove(schema)
+            attached.append(schema)  # Usado recientemente
+            continue
+
+        # Liberar las bases adjuntas menos usadas que no hacen falta ahora
+        needed = {archive_schema(y) for y in years}
+        while len(attached) >= MAX_ATTACHED:
+            victim = next((s for s in attached if s not in needed), None)
+            if victim is None:
+                raise ValueError(f"No se pueden consultar más de {MAX_ATTACHED} años archivados a la vez")
+            connection.exec_driver_sql(f"DETACH DATABASE {victim}")
+            attached.remove(victim)
+
+        connection.exec_driver_sql(f"ATTACH DATABASE ? AS {schema}", (archive_path(year),))
+        attached.append(schema)
+    return connection
+
+def archive_old_rows(max_age_days=None, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Mueve a las bases de archivo anuales los registros Excel más antiguos
+    que la antigüedad configurada.
+
+    Los registros con alertas se quedan en la base principal (las alertas y
+    sus grupos los referencian), igual que el registro de mayor id, para que
+    SQLite no reutilice ids ya archivados. Cada lote se copia y confirma
+    antes de borrarse de la base principal, y solo se borran las filas que
+    ya están en el archivo: si el proceso se interrumpe, basta con repetirlo.
+
+    Args:
+        max_age_days: Antigüedad mínima en días (por defecto ARCHIVE_AFTER_DAYS)
+        batch_size: Registros movidos por lote
+
+    Returns:
+        dict: Año -> número de registros archivados
+    """
+    if max_age_days is None:
+        max_age_days = current_app.config['ARCHIVE_AFTER_DAYS']
+    cutoff = datetime.utcnow() - timedelta(days=max_age_days)
+    os.makedirs(current_app.config['ARCHIVE_FOLDER'], exist_ok=True)
+
+    candidates = """
+        FROM main.excel_data e
+        WHERE e.order_date < :cutoff
+          AND strftime('%Y', e.order_date) = :year
+          AND e.id > :last_id
+          AND e.id < (SELECT MAX(id) FROM main.excel_data)
+          AND NOT EXISTS (SELECT 1 FROM main.alert a WHERE a.excel_data_id = e.id)
+    """
+    column_list = ", ".join(column.name for column in ExcelData.__table__.columns)
+
+    db.session.commit()
+    years = [int(row[0]) for row in db.session.execute(text(
+        "SELECT DISTINCT strftime('%Y', order_date) FROM excel_data WHERE order_date < :cutoff"
+    ), {'cutoff': cutoff}) if row[0]]
+
+    moved = {}
+    for year in years:
+        connection = attach_archives([year])
+        table = archive_table(year)
+        table.create(bind=connection, checkfirst=True)
+        db.session.commit()
+
+        schema = archive_schema(year)
+        last_id = 0
+        while True:
+            params = {'cutoff': cutoff, 'year': str(year), 'last_id': last_id}
+            ids = [row[0] for row in db.session.execute(text(
+                f"SELECT e.id {candidates} ORDER BY e.id LIMIT {int(batch_size)}"
+            ), params)]
+            if not ids:
+                break
+            params['max_id'] = ids[-1]
+
+            # 1) Copiar al archivo (idempotente). Tras cada commit la sesión puede
+            # recibir otra conexión del pool, así que se vuelve a adjuntar
+            attach_archives([year])
+            db.session.execute(text(f"""
+                INSERT OR IGNORE INTO {schema}.excel_data ({column_list})
+                SELECT {column_list} {candidates} AND e.id <= :max_id
+            """), params)
+            db.session.commit()
+
+            # 2) Borrar de la base principal solo lo que ya está copiado
+            attach_archives([year])
+            result = db.session.execute(text(f"""
+                DELETE FROM main.excel_data
+                WHERE id > :last_id AND id <= :max_id
+                  AND EXISTS (
+                      SELECT 1 FROM {schema}.excel_data a
+                      WHERE a.id = main.excel_data.id
+                        AND a.order_number = main.excel_data.order_number
+                        AND a.order_date = main.excel_data.order_date
+                  )
+                  AND NOT EXISTS (SELECT 1 FROM main.alert al WHERE al.excel_data_id = main.excel_data.id)
+            """), {'last_id': last_id, 'max_id': ids[-1]})
+            if result.rowcount:
+                bump_table_version('excel_data')
+            db.session.commit()
+
+            moved[year] = moved.get(year, 0) + result.rowcount
+            last_id = ids[-1]
+
+    if moved:
+        # Los resultados no cambian, pero sí el orden de los empates y las consultas cacheadas
+        bump_version('excel_data')
+    return moved
+
+def archived_person_transactions(person_id):
+    """
+    Obtiene los registros archivados de una persona en todas las bases de archivo.
+
+    Args:
+        person_id: ID de la persona
+
+    Returns:
+        list: Objetos ExcelData transitorios (no añadidos a la sesión)
+    """
+    records = []
+    for year in archive_years():
+        table = archive_table(year)
+        statement = table.select().where(table.c.person_id == person_id)
+        attach_archives([year], statement)
+        for row in db.session.execute(statement):
+            records.append(ExcelData(**row._mapping))
+    return records
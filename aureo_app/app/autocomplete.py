@@ -0,0 +1,255 @@
+import bisect
+import heapq
+import threading
+from sqlalchemy import func
+from . import db
+from .models import ExcelData, SearchHistory
+from .normalization import fold_text
+
+# Tamaño máximo de un rango de prefijo que se recorre sin usar la caché de top-k
+SCAN_LIMIT = 2000
+
+# Número de sugerencias guardadas por prefijo cacheado
+TOP_SIZE = 50
+
+# Longitud de los prefijos cuyo top-k se precalcula al construir el índice
+WARM_PREFIX_LENGTH = 2
+
+# Peso extra de las búsquedas del historial frente a los valores de los datos
+HISTORY_WEIGHT = 5
+
+def fold_code(value):
+    """Normaliza un código (número de pedido, papeleta) para el índice de prefijos"""
+    return str(value).strip().casefold() if value else ''
+
+class PrefixIndex:
+    """
+    Índice de prefijos en memoria sobre un conjunto de valores con peso.
+
+    Mantiene las claves ordenadas para localizar el rango de un prefijo con
+    bisección. Los prefijos con rangos grandes guardan su top-k calculado,
+    que se actualiza al vuelo cuando cambian claves con ese prefijo (los
+    pesos solo crecen, así que basta con comparar con el último del top).
+    """
+    def __init__(self):
+        self._keys = []
+        self._entries = {}  # clave -> [valor a mostrar, peso]
+        self._top = {}      # prefijo -> claves ordenadas por peso
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add_many(self, items):
+        """
+        Añade valores o incrementa su peso.
+
+        Args:
+            items: Iterable de tuplas (clave, valor a mostrar, peso)
+        """
+        new_keys = []
+        for key, display, weight in items:
+            if not key:
+                continue
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = [display, weight]
+                new_keys.append(key)
+            else:
+                entry[1] += weight
+            self._update_top(key)
+
+        if not new_keys:
+            return
+        new_keys.sort()
+        if len(new_keys) < 1000:
+            for key in new_keys:
+                bisect.insort(self._keys, key)
+        else:
+            self._keys = list(heapq.merge(self._keys, new_keys))
+
+    def _update_top(self, key):
+        """Actualiza los top-k cacheados de los prefijos de una clave"""
+        if not self._top:
+            return
+        weight = self._entries[key][1]
+        for length in range(1, len(key) + 1):
+            top = self._top.get(key[:length])
+            if top is None:
+                continue
+            if key not in top:
+                if len(top) >= TOP_SIZE and weight <= self._entries[top[-1]][1]:
+                    continue
+                top.append(key)
+            top.sort(key=lambda k: self._entries[k][1], reverse=True)
+            del top[TOP_SIZE:]
+
+    def warm_up(self, max_length=WARM_PREFIX_LENGTH):
+        """Precalcula el top-k de los prefijos cortos, los más costosos de recorrer"""
+        prefixes = set()
+        for key in self._keys:
+            for length in range(1, max_length + 1):
+                prefixes.add(key[:length])
+        for prefix in prefixes:
+            self.search(prefix, TOP_SIZE)
+
+    def search(self, prefix, limit):
+        """
+        Obtiene los valores más frecuentes que empiezan por un prefijo.
+
+        Args:
+            prefix: Prefijo ya normalizado
+            limit: Número máximo de sugerencias
+
+        Returns:
+            list: Tuplas (valor a mostrar, peso) ordenadas por peso
+        """
+        cached = self._top.get(prefix)
+        if cached is None:
+            lo = bisect.bisect_left(self._keys, prefix)
+            hi = bisect.bisect_left(self._keys, prefix + '\uffff', lo)
+            candidates = self._keys[lo:hi] if hi - lo <= SCAN_LIMIT else (self._keys[i] for i in range(lo, hi))
+            cached = heapq.nlargest(TOP_SIZE, candidates, key=lambda k: self._entries[k][1])
+            if hi - lo > SCAN_LIMIT:
+                self._top[prefix] = cached
+
+        return [tuple(self._entries[key]) for key in cached[:limit]]
+
+class AutocompleteIndex:
+    """
+    Sugerencias de búsqueda por campo, construidas desde ExcelData y SearchHistory.
+
+    El índice guarda el último id de cada tabla que ha incorporado; antes de
+    cada sugerencia se comparan con los de la base de datos y se cargan solo
+    las filas nuevas, incluidas las guardadas por otros procesos.
+    """
+    FIELDS = {
+        'customerName': (ExcelData.customer_name, fold_text),
+        'orderNumber': (ExcelData.order_number, fold_code),
+        'pawnTicket': (ExcelData.pawn_ticket, fold_code),
+    }
+
+    def __init__(self):
+        self._indexes = {}
+        self._lock = threading.RLock()
+        self._last_data_id = 0     # Último ExcelData incorporado
+        self._last_history_id = 0  # Última búsqueda del historial incorporada
+        self.loaded = False
+
+    def _load_values(self, field, filters=()):
+        """Carga los valores agrupados de un campo desde la base de datos"""
+        column, folder = self.FIELDS[field]
+        rows = db.session.query(column, func.count()).filter(
+            column.isnot(None), *filters
+        ).group_by(column).all()
+        return [(folder(value), value, count) for value, count in rows]
+
+    def _load_history(self, filters=()):
+        """Carga las búsquedas del historial agrupadas, con su peso"""
+        history = db.session.query(SearchHistory.query, func.count()).filter(*filters).group_by(
+            SearchHistory.query
+        ).all()
+        return [(fold_text(query), query, count * HISTORY_WEIGHT) for query, count in history]
+
+    def _max_ids(self):
+        """Últimos ids de ExcelData y SearchHistory (consultas por clave primaria)"""
+        last_data_id = db.session.query(func.max(ExcelData.id)).scalar() or 0
+        last_history_id = db.session.query(func.max(SearchHistory.id)).scalar() or 0
+        return last_data_id, last_history_id
+
+    def ensure_loaded(self):
+        """Construye el índice completo la primera vez que se necesita"""
+        if self.loaded:
+            return
+        with self._lock:
+            if self.loaded:
+                return
+            last_data_id, last_history_id = self._max_ids()
+            indexes = {}
+            for field in self.FIELDS:
+                indexes[field] = PrefixIndex()
+                indexes[field].add_many(self._load_values(field, (ExcelData.id <= last_data_id,)))
+                indexes[field].warm_up()
+
+            indexes['query'] = PrefixIndex()
+            indexes['query'].add_many(self._load_history((SearchHistory.id <= last_history_id,)))
+            indexes['query'].warm_up()
+
+            self._indexes = indexes
+            self._last_data_id = last_data_id
+            self._last_history_id = last_history_id
+            self.loaded = True
+
+    def refresh(self):
+        """Incorpora al índice los registros y búsquedas guardados desde la última carga"""
+        if not self.loaded:
+            return  # Se cargará completo en el primer uso
+        last_data_id, last_history_id = self._max_ids()
+        if last_data_id <= self._last_data_id and last_history_id <= self._last_history_id:
+            return
+
+        with self._lock:
+            if last_data_id > self._last_data_id:
+                new_rows = (ExcelData.id > self._last_data_id, ExcelData.id <= last_data_id)
+                for field in self.FIELDS:
+                    self._indexes[field].add_many(self._load_values(field, new_rows))
+                self._last_data_id = last_data_id
+            if last_history_id > self._last_history_id:
+                self._indexes['query'].add_many(self._load_history(
+                    (SearchHistory.id > self._last_history_id, SearchHistory.id <= last_history_id)
+                ))
+                self._last_history_id = last_history_id
+
+    def add_activity(self, activity_id):
+        """
+        Incorpora al índice los registros de un archivo recién procesado (y
+        cualquier otro registro nuevo, ya que se localizan por id).
+
+        Args:
+            activity_id: ID de la actividad de archivo
+        """
+        self.refresh()
+
+    def add_query(self, query):
+        """Incorpora una búsqueda del historial (ya guardada) al índice"""
+        if query:
+            self.refresh()
+
+    def suggest(self, text, fields=None, limit=10):
+        """
+        Obtiene sugerencias para un texto parcial.
+
+        Args:
+            text: Texto introducido por el usuario
+            fields: Campos donde buscar (por defecto todos)
+            limit: Número máximo de sugerencias
+
+        Returns:
+            list: Diccionarios con el valor, el campo y su frecuencia
+        """
+        self.ensure_loaded()
+        self.refresh()
+        fields = fields or list(self._indexes.keys())
+
+        suggestions = []
+        with self._lock:
+            for field in fields:
+                index = self._indexes.get(field)
+                if index is None:
+                    continue
+                folder = fold_code if field in ('orderNumber', 'pawnTicket') else fold_text
+                prefix = folder(text)
+                if not prefix:
+                    continue
+                for value, weight in index.search(prefix, limit):
+                    suggestions.append({'value': value, 'field': field, 'count': weight})
+
+        suggestions.sort(key=lambda s: s['count'], reverse=True)
+        return suggestions[:limit]
+
+    def stats(self):
+        """Devuelve el número de claves de cada campo"""
+        with self._lock:
+            return {field: len(index) for field, index in self._indexes.items()}
+
+# Instancia compartida por la aplicación
+autocomplete_index = AutocompleteIndex()
@@ -0,0 +1,483 @@
+import os
+import json
+import time
+import zlib
+import struct
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime
+
+# Páginas copiadas en cada paso de la copia en línea
+BACKUP_PAGES_PER_STEP = 1024
+
+# Pausa entre pasos para dejar paso a los escritores (segundos)
+BACKUP_STEP_SLEEP = 0.005
+
+# Reinicios tolerados (la base cambió durante la copia) antes de copiar en un solo paso
+BACKUP_MAX_RESTARTS = 3
+
+# Antigüedad (segundos) a partir de la cual un bloqueo sin renovar se considera abandonado
+BACKUP_LOCK_STALE_SECONDS = 15 * 60
+
+# Intervalo de renovación del bloqueo mientras dura la operación (segundos)
+BACKUP_LOCK_HEARTBEAT_SECONDS = 60
+
+# Entrada del índice de una instantánea: hash de la página, paquete, desplazamiento y longitud
+_ENTRY = struct.Struct('<16sIQI')
+
+class _BackupRestarted(Exception):
+    """La base de datos se modificó demasiadas veces durante la copia por pasos"""
+
+class BackupInProgressError(RuntimeError):
+    """Otro proceso o hilo está creando o depurando instantáneas en la misma carpeta"""
+
+class BackupLock:
+    """
+    Bloqueo entre procesos de una carpeta de copias: un archivo creado en
+    exclusiva. Lo comparten el hilo programado de cada proceso de la
+    aplicación y backup_db.py. Mientras se mantiene se renueva su fecha de
+    modificación; uno sin renovar durante BACKUP_LOCK_STALE_SECONDS se
+    considera abandonado (proceso terminado) y se sustituye.
+    """
+    def __init__(self, folder):
+        self.path = os.path.join(folder, 'backup.lock')
+        self._stop = threading.Event()
+        self._heartbeat = None
+
+    def _try_create(self):
+        try:
+            fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w') as f:
+            f.write(f"{os.getpid()} {datetime.utcnow().isoformat()}\n")
+        return True
+
+    def acquire(self):
+        """
+        Toma el bloqueo.
+
+        Raises:
+            BackupInProgressError: Si otra operación lo mantiene
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if not self._try_create():
+            try:
+                stale = time.time() - os.path.getmtime(self.path) > BACKUP_LOCK_STALE_SECONDS
+            except FileNotFoundError:
+                stale = True
+            if stale:
+                try:
+                    os.remove(self.path)
+                except FileNotFoundError:
+                    pass
+            if not stale or not self._try_create():
+                raise BackupInProgressError("Ya hay una copia de seguridad en curso en esta carpeta")
+
+        self._stop.clear()
+        self._heartbeat = threading.Thread(target=self._renew, name='backup-lock', daemon=True)
+        self._heartbeat.start()
+
+    def _renew(self):
+        while not self._stop.wait(BACKUP_LOCK_HEARTBEAT_SECONDS):
+            try:
+                os.utime(self.path)
+            except OSError:
+                pass
+
+    def release(self):
+        """Libera el bloqueo"""
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+def _page_hash(page):
+    return hashlib.blake2b(page, digest_size=16).digest()
+
+def online_backup(source_path, dest_path, pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP):
+    """
+    Copia una base SQLite en uso con la API de copia de seguridad.
+
+    La copia avanza por pasos de unas pocas páginas y libera el bloqueo entre
+    ellos. Si otra conexión escribe durante la copia, SQLite la reinicia; si
+    ocurre demasiadas veces se copia en un solo paso, que en modo WAL no
+    bloquea a los escritores.
+
+    Args:
+        source_path: Ruta de la base de datos de origen
+        dest_path: Ruta de la copia (se crea mediante un archivo temporal)
+        pages: Páginas por paso
+        sleep: Pausa entre pasos en segundos
+
+    Returns:
+        str: Ruta de la copia
+    """
+    temp_path = dest_path + '.tmp'
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+    state = {'remaining': None, 'restarts': 0}
+
+    def progress(status, remaining, total):
+        if state['remaining'] is not None and remaining > state['remaining']:
+            state['restarts'] += 1
+            if state['restarts'] > BACKUP_MAX_RESTARTS:
+                raise _BackupRestarted()
+        state['remaining'] = remaining
+
+    source = sqlite3.connect(source_path)
+    dest = sqlite3.connect(temp_path)
+    try:
+        try:
+            source.backup(dest, pages=pages, progress=progress, sleep=sleep)
+        except _BackupRestarted:
+            source.backup(dest, pages=-1)
+    finally:
+        dest.close()
+        source.close()
+
+    os.replace(temp_path, dest_path)
+    return dest_path
+
+def verify_database(path):
+    """
+    Comprueba la integridad de una base SQLite.
+
+    Args:
+        path: Ruta de la base de datos
+
+    Returns:
+        tuple: (True si es correcta, resultado de PRAGMA integrity_check)
+    """
+    connection = sqlite3.connect(path)
+    try:
+        rows = [row[0] for row in connection.execute("PRAGMA integrity_check").fetchall()]
+    finally:
+        connection.close()
+    return rows == ['ok'], rows
+
+class SnapshotStore:
+    """
+    Instantáneas incrementales a nivel de página de una base SQLite.
+
+    Cada instantánea parte de una copia en línea consistente y guarda un
+    índice con el hash de cada página. Solo las páginas que no estaban en la
+    instantánea anterior se escriben (comprimidas) en un paquete nuevo; las
+    demás apuntan a los paquetes anteriores. Una instantánea completa
+    reescribe todas las páginas para que los paquetes antiguos se puedan
+    eliminar al depurar.
+
+    Lo incremental es el almacenamiento, no la lectura: SQLite no indica qué
+    páginas cambiaron desde la última copia, así que cada instantánea lee la
+    base entera (copia en línea a un archivo temporal y hash de cada página).
+    El disco y la E/S de escritura crecen con los cambios; la lectura y el
+    espacio temporal, con el tamaño de la base.
+
+    La creación y la depuración se serializan con BackupLock, y cada
+    instantánea usa su propio archivo temporal.
+    """
+    def __init__(self, folder):
+        self.folder = folder
+        self.snapshot_dir = os.path.join(folder, 'snapshots')
+        self.pack_dir = os.path.join(folder, 'packs')
+
+    def _manifest_path(self, snapshot_id):
+        return os.path.join(self.snapshot_dir, f"{snapshot_id}.json")
+
+    def _index_path(self, snapshot_id):
+        return os.path.join(self.snapshot_dir, f"{snapshot_id}.idx")
+
+    def _pack_path(self, pack_id):
+        return os.path.join(self.pack_dir, f"{pack_id}.pack")
+
+    def list_snapshots(self):
+        """Devuelve los metadatos de las instantáneas, de la más antigua a la más reciente"""
+        if not os.path.isdir(self.snapshot_dir):
+            return []
+        snapshots = []
+        for filename in sorted(os.listdir(self.snapshot_dir)):
+            if filename.endswith('.json'):
+                with open(os.path.join(self.snapshot_dir, filename)) as f:
+                    snapshots.append(json.load(f))
+        return snapshots
+
+    def _read_index(self, snapshot_id):
+        """Lee el índice de páginas de una instantánea"""
+        with open(self._index_path(snapshot_id), 'rb') as f:
+            data = f.read()
+        return [_ENTRY.unpack_from(data, offset) for offset in range(0, len(data), _ENTRY.size)]
+
+    def lock(self):
+        """Bloqueo de la carpeta de copias (ver BackupLock)"""
+        return BackupLock(self.folder)
+
+    def create_snapshot(self, source_path, full=False):
+        """
+        Crea una instantánea de la base de datos.
+
+        Args:
+            source_path: Ruta de la base de datos en uso
+            full: Reescribir todas las páginas en lugar de solo las cambiadas
+
+        Returns:
+            dict: Metadatos de la instantánea
+
+        Raises:
+            BackupInProgressError: Si otra operación está usando la carpeta de copias
+        """
+        with self.lock():
+            return self._create_snapshot(source_path, full)
+
+    def _create_snapshot(self, source_path, full):
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        os.makedirs(self.pack_dir, exist_ok=True)
+
+        started = time.time()
+        snapshot_id = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+        staging_path = os.path.join(self.folder, f"staging_{snapshot_id}_{os.getpid()}.sqlite")
+        try:
+            online_backup(source_path, staging_path)
+            return self._write_snapshot(snapshot_id, staging_path, full, started)
+        finally:
+            for path in (staging_path, staging_path + '.tmp', self._pack_path(snapshot_id) + '.tmp'):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _write_snapshot(self, snapshot_id, staging_path, full, started):
+        """Guarda las páginas de la copia temporal como una instantánea"""
+        # Páginas conocidas de la instantánea anterior, por hash
+        known = {}
+        previous = self.list_snapshots()
+        if previous and not full:
+            previous_packs = previous[-1]['packs']
+            for digest, pack_number, offset, length in self._read_index(previous[-1]['id']):
+                known[digest] = (previous_packs[pack_number], offset, length)
+
+        pack_id = snapshot_id
+        pack_path = self._pack_path(pack_id)
+        entries = []
+        changed_pages = 0
+        packs = set()
+
+        with open(staging_path, 'rb') as source, open(pack_path + '.tmp', 'wb') as pack:
+            header = source.read(100)
+            page_size = struct.unpack('>H', header[16:18])[0]
+            page_size = 65536 if page_size == 1 else page_size
+            source.seek(0)
+
+            while True:
+                page = source.read(page_size)
+                if not page:
+                    break
+                digest = _page_hash(page)
+                location = known.get(digest)
+                if location is None:
+                    compressed = zlib.compress(page, 6)
+                    location = (pack_id, pack.tell(), len(compressed))
+                    pack.write(compressed)
+                    known[digest] = location
+                    changed_pages += 1
+                packs.add(location[0])
+                entries.append((digest,) + location)
+
+        if changed_pages:
+            os.replace(pack_path + '.tmp', pack_path)
+        else:
+            os.remove(pack_path + '.tmp')
+            packs.discard(pack_id)
+
+        pack_ids = sorted(packs)
+        pack_numbers = {pack: number for number, pack in enumerate(pack_ids)}
+        with open(self._index_path(snapshot_id) + '.tmp', 'wb') as f:
+            for digest, pack, offset, length in entries:
+                f.write(_ENTRY.pack(digest, pack_numbers[pack], offset, length))
+        os.replace(self._index_path(snapshot_id) + '.tmp', self._index_path(snapshot_id))
+
+        manifest = {
+            'id': snapshot_id,
+            'created': datetime.utcnow().isoformat(),
+            'full': full or not previous,
+            'pageSize': page_size,
+            'pageCount': len(entries),
+            'changedPages': changed_pages,
+            'bytesWritten': os.path.getsize(pack_path) if changed_pages else 0,
+            'packs': pack_ids,
+            'seconds': round(time.time() - started, 2)
+        }
+        with open(self._manifest_path(snapshot_id) + '.tmp', 'w') as f:
+            json.dump(manifest, f)
+        os.replace(self._manifest_path(snapshot_id) + '.tmp', self._manifest_path(snapshot_id))
+        return manifest
+
+    def restore_snapshot(self, snapshot_id, dest_path):
+        """
+        Reconstruye una instantánea en un archivo y verifica el resultado:
+        el hash de cada página y PRAGMA integrity_check.
+
+        Args:
+            snapshot_id: ID de la instantánea
+            dest_path: Ruta del archivo restaurado (no debe ser la base en uso)
+
+        Returns:
+            str: Ruta del archivo restaurado
+
+        Raises:
+            ValueError: Si alguna página o la integridad de la base no es correcta
+        """
+        with open(self._manifest_path(snapshot_id)) as f:
+            manifest = json.load(f)
+        pack_ids = manifest['packs']
+
+        temp_path = dest_path + '.tmp'
+        pack_files = {}
+        try:
+            with open(temp_path, 'wb') as out:
+                for number, (digest, pack_number, offset, length) in enumerate(self._read_index(snapshot_id)):
+                    pack_id = pack_ids[pack_number]
+                    if pack_id not in pack_files:
+                        pack_files[pack_id] = open(self._pack_path(pack_id), 'rb')
+                    pack = pack_files[pack_id]
+                    pack.seek(offset)
+                    page = zlib.decompress(pack.read(length))
+                    if _page_hash(page) != digest:
+                        raise ValueError(f"La página {number + 1} de la instantánea {snapshot_id} está dañada")
+                    out.write(page)
+        finally:
+            for pack in pack_files.values():
+                pack.close()
+
+        ok, result = verify_database(temp_path)
+        if not ok:
+            os.remove(temp_path)
+            raise ValueError(f"La instantánea {snapshot_id} no supera la comprobación de integridad: {result[:5]}")
+
+        os.replace(temp_path, dest_path)
+        return dest_path
+
+    def verify_snapshot(self, snapshot_id):
+        """
+        Restaura una instantánea en un archivo temporal y la verifica.
+
+        Args:
+            snapshot_id: ID de la instantánea
+
+        Returns:
+            bool: True si la instantánea es correcta
+        """
+        temp_path = os.path.join(self.folder, f"verify_{snapshot_id}.sqlite")
+        try:
+            self.restore_snapshot(snapshot_id, temp_path)
+            return True
+        except (ValueError, OSError, zlib.error, sqlite3.DatabaseError) as e:
+            print(f"Error al verificar la instantánea {snapshot_id}: {str(e)}")
+            return False
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def prune(self, keep):
+        """
+        Elimina las instantáneas más antiguas y los paquetes que ya no usa ninguna.
+
+        Args:
+            keep: Número de instantáneas a conservar
+
+        Returns:
+            int: Número de instantáneas eliminadas
+
+        Raises:
+            BackupInProgressError: Si otra operación está usando la carpeta de copias
+        """
+        with self.lock():
+            return self._prune(keep)
+
+    def _prune(self, keep):
+        snapshots = self.list_snapshots()
+        expired = snapshots[:-keep] if keep > 0 else snapshots
+        for snapshot in expired:
+            for path in (self._manifest_path(snapshot['id']), self._index_path(snapshot['id'])):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        used = {pack for snapshot in self.list_snapshots() for pack in snapshot['packs']}
+        if os.path.isdir(self.pack_dir):
+            for filename in os.listdir(self.pack_dir):
+                if filename.endswith('.pack') and filename[:-len('.pack')] not in used:
+                    os.remove(os.path.join(self.pack_dir, filename))
+        return len(expired)
+
+def database_path(app):
+    """Ruta del archivo SQLite principal de la aplicación"""
+    return app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', '')
+
+def run_scheduled_backup(app, store):
+    """
+    Ejecuta una instantánea programada: completa cada BACKUP_FULL_EVERY
+    instantáneas, incremental el resto, verificada y con depuración.
+
+    Args:
+        app: Aplicación Flask
+        store: SnapshotStore de destino
+    """
+    full_every = app.config['BACKUP_FULL_EVERY']
+    previous = store.list_snapshots()
+    since_full = 0
+    for snapshot in reversed(previous):
+        if snapshot['full']:
+            break
+        since_full += 1
+    full = not previous or since_full + 1 >= full_every
+
+    manifest = store.create_snapshot(database_path(app), full=full)
+    if not store.verify_snapshot(manifest['id']):
+        print(f"Advertencia: la instantánea {manifest['id']} no se pudo verificar")
+    store.prune(app.config['BACKUP_KEEP'])
+    print(f"Instantánea {manifest['id']} creada: {manifest['changedPages']} de "
+          f"{manifest['pageCount']} páginas nuevas en {manifest['seconds']} s")
+
+_scheduler_thread = None
+
+def start_backup_scheduler(app):
+    """Inicia el hilo que crea instantáneas cada BACKUP_INTERVAL_HOURS horas"""
+    global _scheduler_thread
+    if _scheduler_thread is not None:
+        return
+
+    interval = app.config['BACKUP_INTERVAL_HOURS'] * 3600
+    store = SnapshotStore(app.config['BACKUP_FOLDER'])
+
+    def loop():
+        while True:
+            snapshots = store.list_snapshots()
+            if snapshots:
+                last = datetime.fromisoformat(snapshots[-1]['created'])
+                wait = interval - (datetime.utcnow() - last).total_seconds()
+                if wait > 0:
+                    time.sleep(min(wait, interval))
+                    continue
+            try:
+                run_scheduled_backup(app, store)
+            except BackupInProgressError as e:
+                # Otro proceso está haciendo la copia: volver a calcular la espera después
+                print(f"Copia de seguridad programada aplazada: {str(e)}")
+                time.sleep(BACKUP_LOCK_HEARTBEAT_SECONDS)
+            except Exception as e:
+                print(f"Error en la copia de seguridad programada: {str(e)}")
+                time.sleep(interval)
+
+    _scheduler_thread = threading.Thread(target=loop, name='backup-scheduler', daemon=True)
+    _scheduler_thread.start()
@@ -0,0 +1,233 @@
+import os
+import json
+import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import func
+from werkzeug.utils import secure_filename
+from . import db
+from .models import FileActivity, Store, SystemConfig, UploadBatch
+from .uploads import UploadError, file_type_for, upload_dir_for, unique_upload_path, save_stream
+from .file_processors import read_excel_frame, process_excel_file, process_pdf_file
+from .file_watcher import extract_store_code_from_filename
+from .stats import record_activity_status_change
+from .events import publish_activity
+from .storage import ingestion_writer
+
+# Estados finales de una actividad
+FINISHED_STATUSES = ('Processed', 'Failed')
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+def _get_parse_pool(workers):
+    """Grupo de hilos que leen los Excel de las cargas masivas (uno por proceso)"""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bulk-parse')
+        return _parse_pool
+
+class _StoreResolver:
+    """
+    Resuelve la tienda de cada entrada con las mismas reglas que la
+    vigilancia de carpetas: código al inicio del nombre, tienda por defecto
+    de la carga y, si está activada, detección automática.
+    """
+    def __init__(self, default_store_code=None):
+        self.stores = {(store.code, store.type): store for store in Store.query.all()}
+        self.default_store_code = default_store_code
+        auto_detection = SystemConfig.query.filter_by(key='AUTO_STORE_DETECTION').first()
+        self.auto_detection = bool(auto_detection and auto_detection.value.lower() == 'true')
+
+    def resolve(self, filename, file_type):
+        """
+        Returns:
+            tuple: (tienda o None, código detectado en el nombre)
+        """
+        detected = extract_store_code_from_filename(filename)
+        store = self.stores.get((detected, file_type)) if detected else None
+        if not store and self.default_store_code:
+            store = self.stores.get((self.default_store_code, file_type))
+        if not store and self.auto_detection:
+            store = next((s for s in self.stores.values() if s.type == file_type and s.active), None)
+        return store, detected
+
+def _iter_entries(files):
+    """
+    Recorre los archivos recibidos expandiendo los ZIP entrada a entrada.
+
+    Args:
+        files: Lista de (nombre, función que abre el flujo o ruta de un ZIP)
+
+    Yields:
+        tuple: (nombre de la entrada, flujo abierto o None, motivo de descarte o None)
+    """
+    for name, source in files:
+        if file_type_for(name) != 'ZIP':
+            yield name, source, None
+            continue
+        try:
+            archive = zipfile.ZipFile(source)
+        except zipfile.BadZipFile:
+            yield name, None, 'ZIP no válido'
+            continue
+        with archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                entry_name = os.path.basename(info.filename)
+                if entry_name.startswith('.') or entry_name.startswith('__MACOSX'):
+                    continue
+                if file_type_for(entry_name) == 'ZIP':
+                    yield entry_name, None, 'ZIP anidado no soportado'
+                    continue
+                # Se lee entrada a entrada, sin extraer el ZIP completo en memoria
+                with archive.open(info) as stream:
+                    yield entry_name, stream, None
+
+def create_batch(user_id, files, default_store_code=None):
+    """
+    Guarda los archivos de una carga masiva y registra todas sus actividades
+    en una sola transacción.
+
+    Args:
+        user_id: Usuario que realiza la carga
+        files: Lista de (nombre, flujo o ruta) de archivos Excel, PDF o ZIP
+        default_store_code: Tienda para las entradas cuyo nombre no la identifica
+
+    Returns:
+        UploadBatch: Carga creada (las actividades quedan pendientes de encolar)
+    """
+    max_size = current_app.config['UPLOAD_MAX_FILE_SIZE']
+    max_files = current_app.config['BULK_UPLOAD_MAX_FILES']
+    resolver = _StoreResolver(default_store_code)
+
+    activities = []
+    saved_paths = []
+    skipped = []
+    try:
+        for name, stream, reason in _iter_entries(files):
+            filename = secure_filename(name)
+            file_type = file_type_for(filename) if filename else None
+            if reason or file_type not in ('Excel', 'PDF'):
+                skipped.append({'filename': name, 'reason': reason or 'Tipo de archivo no soportado'})
+                continue
+            if len(activities) >= max_files:
+                raise UploadError(f'Máximo {max_files} archivos por carga masiva', 413)
+
+            file_path = unique_upload_path(upload_dir_for(file_type), filename)
+            # Evitar colisiones entre entradas con el mismo nombre en el mismo segundo
+            base, extension = os.path.splitext(file_path)
+            counter = 1
+            while os.path.exists(file_path):
+                file_path = f"{base}_{counter}{extension}"
+                counter += 1
+            size, content_hash = save_stream(stream, file_path, max_size)
+            saved_paths.append(file_path)
+
+            store, detected = resolver.resolve(filename, file_type)
+            activities.append(FileActivity(
+                filename=filename,
+                saved_path=file_path,
+                file_size=size,
+                store_code=store.code if store else None,
+                detected_store_code=detected,
+                file_type=file_type,
+                status='Pending' if store else 'PendingStoreAssignment',
+                upload_date=datetime.utcnow(),
+                processed_by=user_id,
+                content_hash=content_hash
+            ))
+
+        if not activities:
+            raise UploadError('La carga no contiene archivos Excel o PDF')
+
+        batch = UploadBatch(user_id=user_id, total_files=len(activities),
+                            skipped=json.dumps(skipped, ensure_ascii=False) if skipped else None)
+        db.session.add(batch)
+        db.session.flush()
+        for activity in activities:
+            activity.batch_id = batch.id
+            record_activity_status_change(None, activity.status)
+        db.session.add_all(activities)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        for path in saved_paths:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+
+    for activity in activities:
+        publish_activity(activity)
+    return batch
+
+def dispatch_batch(batch_id):
+    """
+    Reparte el procesamiento de una carga masiva: los Excel se leen en el
+    grupo de hilos de lectura y su escritura se encola en el hilo escritor;
+    los PDF se encolan directamente. El número de Excel leídos pendientes de
+    escribir está acotado para no acumular DataFrames en memoria.
+
+    Args:
+        batch_id: ID de la carga
+    """
+    app = current_app._get_current_object()
+    workers = app.config['BULK_PARSE_WORKERS']
+    pool = _get_parse_pool(workers)
+    in_flight = threading.BoundedSemaphore(workers * 2)
+
+    pending = db.session.query(FileActivity.id, FileActivity.file_type, FileActivity.saved_path).filter(
+        FileActivity.batch_id == batch_id,
+        FileActivity.status == 'Pending'
+    ).order_by(FileActivity.id).all()
+
+    def write_excel(activity_id, parse_future):
+        try:
+            try:
+                frame = parse_future.result()
+            except Exception:
+                frame = None  # process_excel_file vuelve a leer y registra el error
+            return process_excel_file(activity_id, frame)
+        finally:
+            in_flight.release()
+
+    def feed():
+        for activity_id, file_type, saved_path in pending:
+            if file_type == 'PDF':
+                ingestion_writer.submit(process_pdf_file, activity_id)
+                continue
+            in_flight.acquire()
+            parse_future = pool.submit(read_excel_frame, saved_path)
+            parse_future.add_done_callback(
+                lambda future, activity_id=activity_id: ingestion_writer.submit(write_excel, activity_id, future)
+            )
+
+    threading.Thread(target=feed, name=f'bulk-dispatch-{batch_id}', daemon=True).start()
+
+def batch_progress(batch):
+    """
+    Progreso agregado de una carga masiva.
+
+    Args:
+        batch: UploadBatch
+
+    Returns:
+        dict: Datos de la carga con recuentos por estado y porcentaje completado
+    """
+    counts = dict(db.session.query(FileActivity.status, func.count()).filter(
+        FileActivity.batch_id == batch.id
+    ).group_by(FileActivity.status).all())
+    finished = sum(counts.get(status, 0) for status in FINISHED_STATUSES)
+    waiting = counts.get('PendingStoreAssignment', 0)
+
+    result = batch.to_dict()
+    result['statusCounts'] = counts
+    result['finished'] = finished
+    result['progress'] = round(100.0 * finished / batch.total_files, 1) if batch.total_files else 100.0
+    # Los archivos sin tienda no avanzan hasta que se asignan manualmente
+    result['done'] = finished + waiting >= batch.total_files
+    return result
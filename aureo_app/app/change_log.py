@@ -0,0 +1,149 @@
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import event, insert, select, delete, func, and_, table, column
+from sqlalchemy.orm import object_session
+from . import db, fast_json
+from .models import ChangeLog, FileActivity, Alert, AlertGroup, WatchlistPerson, WatchlistItem
+from .projection import project_rows, LIST_KEYS
+from .storage import ingestion_writer
+
+# Entidades registradas automáticamente en cada inserción, modificación o borrado ORM
+LOGGED_MODELS = [FileActivity, Alert, AlertGroup, WatchlistPerson, WatchlistItem]
+
+ENTITY_NAMES = [model.__table__.name for model in LOGGED_MODELS]
+
+# Claves de to_dict() que no se copian al registro: crecen con cada coincidencia y
+# multiplicarían su tamaño (se obtienen completas con GET /api/alert-groups/<id>)
+EXCLUDED_KEYS = {
+    AlertGroup: ('excelDataIds',),
+}
+
+# Momento (time.monotonic) de la última purga del registro en este proceso
+_last_prune = 0.0
+
+def _serialize(data):
+    return fast_json.dumps(data).decode('utf-8') if data is not None else None
+
+def _payload(target):
+    """Datos de una entidad tal como se guardan en el registro"""
+    data = target.to_dict()
+    for key in EXCLUDED_KEYS.get(type(target), ()):
+        data.pop(key, None)
+    return data
+
+def _log_change(action):
+    def listener(mapper, connection, target):
+        # after_update también se dispara por cambios solo en relaciones (p. ej. añadir
+        # una alerta a un grupo): sin cambios en columnas no hay nada que registrar
+        if action == 'update':
+            session = object_session(target)
+            if session is not None and not session.is_modified(target, include_collections=False):
+                return
+        # Misma transacción que el cambio: el registro nunca se adelanta ni se pierde
+        connection.execute(insert(ChangeLog.__table__).values(
+            entity=mapper.local_table.name,
+            entity_id=target.id,
+            action=action,
+            change_date=datetime.utcnow(),
+            data=_serialize(_payload(target)) if action != 'delete' else None
+        ))
+    return listener
+
+for _model in LOGGED_MODELS:
+    for _action in ('insert', 'update', 'delete'):
+        event.listen(_model, f'after_{_action}', _log_change(_action))
+
+def record_alert_changes(query):
+    """
+    Registra como modificadas las alertas de una consulta tras una
+    actualización masiva (que no dispara los eventos ORM), con los mismos
+    datos que to_dict().
+
+    Args:
+        query: Consulta de Alert con las alertas modificadas
+    """
+    now = datetime.utcnow()
+    keys = LIST_KEYS[Alert]
+    rows = [{
+        'entity': Alert.__table__.name,
+        'entity_id': row[0],
+        'action': 'update',
+        'change_date': now,
+        'data': _serialize(dict(zip(keys, row)))
+    } for row in project_rows(query, Alert)]
+    if rows:
+        db.session.execute(insert(ChangeLog.__table__), rows)
+
+def prune_change_log(retention_days):
+    """
+    Elimina las entradas del registro de cambios más antiguas que la retención.
+
+    Args:
+        retention_days: Días que se conservan
+
+    Returns:
+        int: Entradas eliminadas
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    result = db.session.execute(delete(ChangeLog).where(ChangeLog.change_date < cutoff))
+    db.session.commit()
+    return result.rowcount
+
+def schedule_prune(retention_days, interval_seconds=3600):
+    """Encola la purga del registro como mucho una vez por intervalo en este proceso"""
+    global _last_prune
+    now = time.monotonic()
+    if now - _last_prune >= interval_seconds:
+        _last_prune = now
+        ingestion_writer.submit(prune_change_log, retention_days)
+
+def get_changes(since=None, limit=500, entities=None):
+    """
+    Obtiene los cambios posteriores a un cursor.
+
+    Args:
+        since: Último id de cambio recibido por el cliente (None para obtener solo el cursor actual)
+        limit: Máximo de cambios devueltos
+        entities: Limitar a estas entidades (opcional)
+
+    Returns:
+        dict: {'changes', 'cursor', 'hasMore', 'resync'}
+    """
+    # Último id asignado (se conserva en sqlite_sequence aunque se purgue todo el registro)
+    sequence = table('sqlite_sequence', column('name'), column('seq'))
+    latest_query = select(sequence.c.seq).where(sequence.c.name == ChangeLog.__table__.name)
+    if since is None:
+        latest = db.session.execute(latest_query).scalar() or 0
+        return {'changes': [], 'cursor': latest, 'hasMore': False, 'resync': False}
+
+    # Último id, id más antiguo y página en una sola consulta (la misma instantánea):
+    # leídos por separado, el hilo escritor podría confirmar cambios entre medias y
+    # el cursor saltarse ids o quedar por detrás de los ya devueltos
+    bounds = select(
+        latest_query.scalar_subquery().label('latest'),
+        select(func.min(ChangeLog.id)).scalar_subquery().label('oldest')
+    ).subquery()
+    conditions = [ChangeLog.id > since]
+    if entities:
+        conditions.append(ChangeLog.entity.in_(entities))
+    rows = db.session.query(bounds.c.latest, bounds.c.oldest, ChangeLog).select_from(bounds).outerjoin(
+        ChangeLog, and_(*conditions)
+    ).order_by(ChangeLog.id).limit(limit + 1).all()
+
+    latest = rows[0].latest or 0
+    oldest = rows[0].oldest
+    changes = [row.ChangeLog for row in rows if row.ChangeLog is not None]
+
+    # Si ya se han purgado cambios posteriores al cursor, el cliente debe recargar sus listas
+    resync = since < latest and (oldest is None or since < oldest - 1)
+
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    # Sin más cambios, el cursor avanza hasta el último id aunque sea de otra entidad
+    cursor = changes[-1].id if has_more else max(latest, since)
+    return {
+        'changes': [change.to_dict() for change in changes],
+        'cursor': cursor,
+        'hasMore': has_more,
+        'resync': resync
+    }
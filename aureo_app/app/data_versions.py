@@ -0,0 +1,107 @@
+import threading
+from sqlalchemy import event, select, text
+from sqlalchemy.orm import object_session
+from . import db
+from .storage import RoutingSession
+from .models import TableVersion, Store, SystemConfig, WatchlistPerson, WatchlistItem, ExcelData, Alert
+
+# Contadores de versión por conjunto de datos (en memoria del proceso)
+_versions = {}
+_lock = threading.Lock()
+
+def get_version(name):
+    """
+    Obtiene la versión actual de un conjunto de datos: la versión persistente,
+    que cambia con las escrituras de cualquier proceso, y el contador local,
+    que este proceso incrementa en cuanto confirma sus propios cambios.
+
+    Args:
+        name: Nombre del conjunto de datos (p. ej. 'excel_data')
+
+    Returns:
+        tuple: (versión persistente, versión local)
+    """
+    return get_table_version(name), _versions.get(name, 0)
+
+def bump_version(name):
+    """
+    Incrementa el contador local de un conjunto de datos para invalidar cachés
+    derivadas. Las escrituras de otros procesos se detectan con la versión
+    persistente (ver get_version).
+
+    Args:
+        name: Nombre del conjunto de datos
+
+    Returns:
+        int: Nueva versión
+    """
+    with _lock:
+        _versions[name] = _versions.get(name, 0) + 1
+        return _versions[name]
+
+
+# Tablas de referencia con versión persistente (compartida por todos los procesos)
+VERSIONED_MODELS = [Store, SystemConfig, WatchlistPerson, WatchlistItem]
+
+# Tablas de datos con versión persistente: se incrementa una vez por transacción
+# (una ingesta escribe miles de filas)
+TRANSACTION_VERSIONED_MODELS = [ExcelData, Alert]
+
+_TABLE_VERSION_UPSERT = text("""
+    INSERT INTO table_version (name, version) VALUES (:name, 1)
+    ON CONFLICT(name) DO UPDATE SET version = version + 1
+""")
+
+def get_table_version(name):
+    """
+    Obtiene la versión persistente de una tabla de referencia.
+
+    Args:
+        name: Nombre de la tabla (p. ej. 'store')
+
+    Returns:
+        int: Versión actual (0 si nunca se ha modificado)
+    """
+    version = db.session.execute(
+        select(TableVersion.version).where(TableVersion.name == name)
+    ).scalar()
+    return version or 0
+
+def bump_table_version(name):
+    """
+    Incrementa la versión persistente de una tabla en la transacción actual.
+    Necesario tras escrituras masivas que no pasan por los eventos del mapeador
+    (UPDATE o DELETE con query.update o text).
+
+    Args:
+        name: Nombre de la tabla (p. ej. 'excel_data')
+    """
+    db.session.execute(_TABLE_VERSION_UPSERT, {'name': name})
+
+def _bump_table_version(mapper, connection, target):
+    # Misma transacción que la escritura: la versión no puede adelantarse ni quedarse atrás
+    connection.execute(_TABLE_VERSION_UPSERT, {'name': mapper.local_table.name})
+
+def _bump_table_version_once(mapper, connection, target):
+    # Basta un incremento por transacción: se confirma o se deshace con todas sus filas
+    name = mapper.local_table.name
+    session = object_session(target)
+    bumped = session.info.setdefault('bumped_table_versions', set()) if session is not None else set()
+    if name not in bumped:
+        connection.execute(_TABLE_VERSION_UPSERT, {'name': name})
+        bumped.add(name)
+
+@event.listens_for(RoutingSession, 'after_transaction_end')
+def _reset_bumped_table_versions(session, transaction):
+    # Cada flush abre una subtransacción: solo cuentan la transacción principal
+    # y los SAVEPOINT (si se deshacen, se deshace también su incremento)
+    if transaction.parent is None or transaction.nested:
+        session.info.pop('bumped_table_versions', None)
+
+for _model in VERSIONED_MODELS:
+    for _event_name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event_name, _bump_table_version)
+
+for _model in TRANSACTION_VERSIONED_MODELS:
+    for _event_name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event_name, _bump_table_version_once)
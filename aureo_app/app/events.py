@@ -0,0 +1,105 @@
+import json
+import queue
+import threading
+from collections import deque
+
+# Número de eventos recientes guardados para reanudar con Last-Event-ID
+BUFFER_SIZE = 1000
+
+# Eventos pendientes por suscriptor antes de considerarlo desconectado
+SUBSCRIBER_QUEUE_SIZE = 500
+
+class EventBus:
+    """
+    Bus de publicación/suscripción en memoria para enviar eventos a los
+    navegadores mediante Server-Sent Events.
+
+    Cada evento recibe un id creciente y se guarda en un búfer circular, de
+    modo que un cliente que se reconecta con Last-Event-ID recibe lo que se
+    perdió sin consultar la base de datos.
+    """
+    def __init__(self, buffer_size=BUFFER_SIZE):
+        self._buffer = deque(maxlen=buffer_size)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._last_id = 0
+
+    def publish(self, event_type, data):
+        """
+        Publica un evento para todos los suscriptores.
+
+        Args:
+            event_type: Tipo de evento (p. ej. 'alert', 'file_activity')
+            data: Datos serializables a JSON
+
+        Returns:
+            int: ID asignado al evento
+        """
+        with self._lock:
+            self._last_id += 1
+            event = (self._last_id, event_type, json.dumps(data, default=str))
+            self._buffer.append(event)
+
+            for subscriber in list(self._subscribers):
+                try:
+                    subscriber.put_nowait(event)
+                except queue.Full:
+                    # Cliente demasiado lento: se descarta y se reconectará con Last-Event-ID
+                    self._subscribers.discard(subscriber)
+                    try:
+                        subscriber.get_nowait()
+                    except queue.Empty:
+                        pass
+                    subscriber.put_nowait(None)
+            return self._last_id
+
+    def subscribe(self, last_event_id=None):
+        """
+        Registra un suscriptor.
+
+        Args:
+            last_event_id: Último id recibido por el cliente (cabecera Last-Event-ID)
+
+        Returns:
+            tuple: (cola de eventos, eventos pendientes del búfer, si el cliente
+                   debe recargar porque el búfer ya no cubre su último id)
+        """
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            backlog = []
+            resync = False
+            if last_event_id is not None:
+                backlog = [event for event in self._buffer if event[0] > last_event_id]
+                oldest = self._buffer[0][0] if self._buffer else self._last_id + 1
+                # También tras reiniciar el proceso, cuando los ids vuelven a empezar
+                resync = last_event_id < oldest - 1 or last_event_id > self._last_id
+            self._subscribers.add(subscriber)
+        return subscriber, backlog, resync
+
+    def unsubscribe(self, subscriber):
+        """Elimina un suscriptor"""
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+def format_sse(event_id, event_type, data):
+    """Da formato Server-Sent Events a un evento"""
+    return f"id: {event_id}\nevent: {event_type}\ndata: {data}\n\n"
+
+# Instancia compartida por la aplicación
+event_bus = EventBus()
+
+def publish_activity(activity):
+    """Publica el estado actual de una actividad de archivo"""
+    event_bus.publish('file_activity', activity.to_dict())
+
+def publish_alert(alert_data):
+    """Publica la creación de una alerta"""
+    event_bus.publish('alert', alert_data)
+
+def publish_watching_status(active):
+    """Publica un cambio en el estado de la vigilancia de archivos"""
+    event_bus.publish('file_watching', {'active': active})
@@ -0,0 +1,146 @@
+from sqlalchemy import text
+from . import db
+from .models import FacetCount
+from .search import build_search_conditions, search_archive_years
+from .archive import archive_schema, attach_archives, archive_year_groups
+
+# Expresión SQL de cada faceta sobre excel_data (alias e)
+FACET_EXPRESSIONS = {
+    'store': "e.store_code",
+    'metal': "COALESCE(NULLIF(TRIM(e.metals), ''), '')",
+    'month': "strftime('%Y-%m', e.order_date)",
+}
+
+# Faceta calculada sobre las alertas de los registros
+ALERT_STATUS_FACET = 'alertStatus'
+
+FACET_NAMES = list(FACET_EXPRESSIONS.keys()) + [ALERT_STATUS_FACET]
+
+_UPSERT_SUFFIX = """
+    ON CONFLICT(facet, value) DO UPDATE SET count = count + excluded.count
+"""
+
+def _facet_source_sql(facet):
+    """Devuelve la consulta agrupada (facet, value, count) sobre excel_data"""
+    return f"""
+        SELECT '{facet}', {FACET_EXPRESSIONS[facet]}, COUNT(*)
+        FROM excel_data e
+        WHERE e.file_activity_id = :activity_id
+        GROUP BY 2
+    """
+
+def record_activity_facets(activity_id):
+    """
+    Suma a las tablas agregadas los registros y alertas de un archivo procesado.
+    Se ejecuta en la misma transacción que marca la actividad como procesada.
+
+    Args:
+        activity_id: ID de la actividad de archivo
+    """
+    for facet in FACET_EXPRESSIONS:
+        db.session.execute(text(
+            "INSERT INTO facet_count (facet, value, count) "
+            + _facet_source_sql(facet) + _UPSERT_SUFFIX
+        ), {'activity_id': activity_id})
+
+    db.session.execute(text(f"""
+        INSERT INTO facet_count (facet, value, count)
+        SELECT '{ALERT_STATUS_FACET}', a.status, COUNT(*)
+        FROM alert a JOIN excel_data e ON e.id = a.excel_data_id
+        WHERE e.file_activity_id = :activity_id
+        GROUP BY a.status
+    """ + _UPSERT_SUFFIX), {'activity_id': activity_id})
+
+def record_alert_status_change(old_status, new_status, count=1):
+    """
+    Actualiza la faceta de estado de alerta cuando se revisan alertas.
+
+    Args:
+        old_status: Estado anterior
+        new_status: Estado nuevo
+        count: Número de alertas que cambian
+    """
+    if old_status == new_status or not count:
+        return
+    upsert = text("INSERT INTO facet_count (facet, value, count) VALUES (:facet, :value, :count)"
+                  + _UPSERT_SUFFIX)
+    db.session.execute(upsert, {'facet': ALERT_STATUS_FACET, 'value': old_status, 'count': -count})
+    db.session.execute(upsert, {'facet': ALERT_STATUS_FACET, 'value': new_status, 'count': count})
+
+def rebuild_facet_counts():
+    """Recalcula desde cero todas las tablas agregadas de facetas"""
+    db.session.execute(text("DELETE FROM facet_count"))
+    for facet, expression in FACET_EXPRESSIONS.items():
+        db.session.execute(text(f"""
+            INSERT INTO facet_count (facet, value, count)
+            SELECT '{facet}', {expression}, COUNT(*) FROM excel_data e GROUP BY 2
+        """))
+    db.session.execute(text(f"""
+        INSERT INTO facet_count (facet, value, count)
+        SELECT '{ALERT_STATUS_FACET}', status, COUNT(*) FROM alert GROUP BY status
+    """))
+    db.session.commit()
+
+def _format(rows):
+    """Convierte filas (valor, recuento) en la lista de la respuesta"""
+    return [{'value': value, 'count': count} for value, count in rows if count]
+
+def get_facets(criteria, facets):
+    """
+    Calcula los recuentos por faceta de una búsqueda.
+
+    Sin criterios se leen las tablas agregadas; con criterios se agrupa en
+    SQL con las mismas condiciones de la búsqueda, sin cargar los registros.
+
+    Args:
+        criteria: Criterios normalizados de la búsqueda
+        facets: Nombres de las facetas solicitadas
+
+    Returns:
+        dict: Faceta -> lista de {'value', 'count'} ordenada por recuento
+    """
+    result = {}
+
+    if not criteria:
+        rows = FacetCount.query.filter(FacetCount.facet.in_(facets)).order_by(
+            FacetCount.count.desc()
+        ).all()
+        for facet in facets:
+            result[facet] = _format((row.value, row.count) for row in rows if row.facet == facet)
+        return result
+
+    conditions, params = build_search_conditions(criteria)
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+
+    # Los registros archivados no tienen alertas: solo cuentan en las facetas de datos.
+    # Los años se consultan en grupos que se pueden adjuntar a la vez; la tabla
+    # principal va con el primero
+    year_groups = archive_year_groups(search_archive_years(criteria)) or [[]]
+
+    for facet in facets:
+        if facet == ALERT_STATUS_FACET:
+            sql = f"""
+                SELECT a.status, COUNT(*) FROM alert a
+                JOIN excel_data e ON e.id = a.excel_data_id
+                {where} GROUP BY a.status ORDER BY 2 DESC
+            """
+            result[facet] = _format(db.session.execute(text(sql), params).fetchall())
+            continue
+
+        counts = {}
+        for index, years in enumerate(year_groups):
+            sources = (["main.excel_data"] if index == 0 else []) + \
+                [f"{archive_schema(year)}.excel_data" for year in years]
+            sql = " UNION ALL ".join(
+                f"SELECT {FACET_EXPRESSIONS[facet]} AS value, COUNT(*) AS count FROM {source} e{where} GROUP BY 1"
+                for source in sources
+            )
+            if len(sources) > 1:
+                sql = f"SELECT value, SUM(count) FROM ({sql}) GROUP BY value"
+            statement = text(sql)
+            attach_archives(years, statement)
+            for value, count in db.session.execute(statement, params):
+                counts[value] = counts.get(value, 0) + count
+        result[facet] = _format(sorted(counts.items(), key=lambda item: item[1], reverse=True))
+
+    return result
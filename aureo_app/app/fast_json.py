@@ -0,0 +1,46 @@
+import json
+from datetime import date, datetime
+
+try:
+    import orjson
+except ImportError:  # Codificador opcional; sin él se usa json de la biblioteca estándar
+    orjson = None
+
+def _default(value):
+    """Serializa las fechas igual que isoformat() en los to_dict()"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Tipo no serializable a JSON: {type(value).__name__}")
+
+def _dumps_orjson(data):
+    # Sin OPT_NAIVE_UTC las fechas sin zona se escriben como isoformat()
+    return orjson.dumps(data, default=_default)
+
+def _dumps_stdlib(data):
+    return json.dumps(data, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+BACKENDS = {'json': _dumps_stdlib}
+if orjson is not None:
+    BACKENDS['orjson'] = _dumps_orjson
+
+# Codificador en uso (se puede cambiar con configure o JSON_FAST_BACKEND)
+dumps = BACKENDS.get('orjson', _dumps_stdlib)
+
+def configure(backend='auto'):
+    """
+    Elige el codificador JSON de las rutas de listados.
+
+    Args:
+        backend: 'auto' (orjson si está instalado), 'orjson' o 'json'
+    """
+    global dumps
+    if backend == 'auto':
+        dumps = BACKENDS.get('orjson', _dumps_stdlib)
+    elif backend in BACKENDS:
+        dumps = BACKENDS[backend]
+    else:
+        raise ValueError(f"Codificador JSON no disponible: {backend}")
+
+def backend_name():
+    """Nombre del codificador en uso"""
+    return 'orjson' if dumps is BACKENDS.get('orjson') else 'json'
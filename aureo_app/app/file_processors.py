@@ -1,21 +1,46 @@
 import os
+import time
 import pandas as pd
 from datetime import datetime
 import re
 from PyPDF2 import PdfReader
 from . import db
-from .models import FileActivity, ExcelData, PdfDocument, WatchlistPerson, WatchlistItem, Alert, Store
+from .models import FileActivity, ExcelData, PdfDocument, WatchlistPerson, WatchlistItem, Alert, AlertGroup, Store, Person
+from .data_versions import bump_version
+from .normalization import normalize_name, name_token_subsets, normalize_id_number
+from .autocomplete import autocomplete_index
+from .facets import record_activity_facets
+from .stats import record_activity_stats, record_alert_stats_change, record_alert_group_stats_change
+from .events import publish_activity, publish_alert
+from .fuzzy_matching import FuzzyNameMatcher
+from .metrics import INGEST_ROWS, INGEST_FILES, INGEST_STAGE_SECONDS, ALERTS_CREATED
 
-def process_excel_file(activity_id):
+def read_excel_frame(path):
+    """
+    Lee un archivo Excel en un DataFrame. No usa la base de datos, así que
+    puede ejecutarse fuera del hilo escritor (cargas masivas).
+    
+    Args:
+        path: Ruta del archivo
+    
+    Returns:
+        DataFrame: Contenido de la primera hoja
+    """
+    with INGEST_STAGE_SECONDS.time('parse'):
+        return pd.read_excel(path)
+
+def process_excel_file(activity_id, frame=None):
     """
     Procesa un archivo Excel asociado a una actividad.
     
     Args:
         activity_id: ID de la actividad de archivo
+        frame: DataFrame ya leído (opcional; si no se indica se lee el archivo)
     
     Returns:
         bool: True si se procesó correctamente, False en caso contrario
     """
+    alert_groups = {}  # Grupos de alertas del archivo, por elemento vigilado
     try:
         # Obtener la actividad
         activity = FileActivity.query.get(activity_id)
@@ -26,35 +51,83 @@ def process_excel_file(activity_id):
         activity.status = 'Processing'
         activity.processing_date = datetime.utcnow()
         db.session.commit()
+        publish_activity(activity)
         
         # Leer el archivo Excel
-        df = pd.read_excel(activity.saved_path)
+        df = frame if frame is not None else read_excel_frame(activity.saved_path)
         store_code = activity.store_code
         
         # Procesar filas
         rows_processed = 0
+        persons = {}  # Personas ya resueltas en este archivo, por DNI/NIE
+        fuzzy_matcher = FuzzyNameMatcher.from_database()
+        
+        # Tiempo acumulado por etapa; se publica una vez por archivo
+        normalize_time = match_time = write_time = 0.0
+        clock = time.perf_counter
         
         for _, row in df.iterrows():
+            started = clock()
             excel_data = create_excel_data_from_values(row.values, store_code, activity_id)
             if excel_data:
+                link_person(excel_data, persons)
                 db.session.add(excel_data)
                 rows_processed += 1
+                normalized = clock()
                 
                 # Verificar si hay coincidencias con elementos de la lista de vigilancia
                 db.session.flush()  # Obtener el ID asignado
-                check_watchlist_matches(excel_data)
+                flushed = clock()
+                check_watchlist_matches(excel_data, fuzzy_matcher, alert_groups)
+                normalize_time += normalized - started
+                write_time += flushed - normalized
+                match_time += clock() - flushed
+            else:
+                normalize_time += clock() - started
         
-        # Actualizar estado a procesado
+        # Actualizar estado a procesado junto con los recuentos agregados por faceta
+        started = clock()
         activity.status = 'Processed'
+        apply_alert_group_hits(alert_groups)
+        record_activity_facets(activity_id)
+        record_activity_stats(activity)
         db.session.commit()
+        write_time += clock() - started
+        publish_activity(activity)
+        
+        INGEST_STAGE_SECONDS.observe(normalize_time, 'normalize')
+        INGEST_STAGE_SECONDS.observe(match_time, 'match')
+        INGEST_STAGE_SECONDS.observe(write_time, 'write')
+        INGEST_ROWS.inc(rows_processed)
+        INGEST_FILES.inc(1, 'Excel', 'Processed')
+        
+        # Invalidar resultados de búsqueda cacheados
+        bump_version('excel_data')
+        
+        # Añadir los nuevos valores a las sugerencias de búsqueda
+        autocomplete_index.add_activity(activity_id)
         
         return True
     except Exception as e:
-        # Manejo de errores
-        if activity:
-            activity.status = 'Failed'
-            activity.error_message = str(e)
-            db.session.commit()
+        # Manejo de errores: si el fallo vino de un flush o commit la sesión
+        # no admite más operaciones hasta deshacer la transacción
+        db.session.rollback()
+        try:
+            activity = db.session.get(FileActivity, activity_id)
+            if activity:
+                activity.status = 'Failed'
+                activity.error_message = str(e)
+                # Las filas ya confirmadas por check_watchlist_matches son visibles
+                apply_alert_group_hits(alert_groups)
+                record_activity_facets(activity_id)
+                record_activity_stats(activity)
+                db.session.commit()
+                publish_activity(activity)
+        except Exception as recovery_error:
+            db.session.rollback()
+            print(f"Error al marcar como fallida la actividad {activity_id}: {str(recovery_error)}")
+        INGEST_FILES.inc(1, 'Excel', 'Failed')
+        bump_version('excel_data')
         return False
 
 def process_pdf_file(activity_id):
@@ -77,6 +150,7 @@ def process_pdf_file(activity_id):
         activity.status = 'Processing'
         activity.processing_date = datetime.utcnow()
         db.session.commit()
+        publish_activity(activity)
         
         # Leer el archivo PDF
         reader = PdfReader(activity.saved_path)
@@ -102,7 +176,10 @@ def process_pdf_file(activity_id):
         
         # Actualizar estado a procesado
         activity.status = 'Processed'
+        record_activity_stats(activity)
         db.session.commit()
+        publish_activity(activity)
+        INGEST_FILES.inc(1, 'PDF', 'Processed')
         
         return True
     except Exception as e:
@@ -110,7 +187,10 @@ def process_pdf_file(activity_id):
         if activity:
             activity.status = 'Failed'
             activity.error_message = str(e)
+            record_activity_stats(activity)
             db.session.commit()
+            publish_activity(activity)
+        INGEST_FILES.inc(1, 'PDF', 'Failed')
         return False
 
 def create_excel_data_from_values(values, store_code, activity_id):
@@ -172,6 +252,7 @@ def create_excel_data_from_values(values, store_code, activity_id):
         order_number=order_number,
         order_date=order_date,
         customer_name=customer_name,
+        customer_name_norm=normalize_name(customer_name),
         customer_contact=safe_get(values, 4),  # Columna E (DNI)
         customer_address=safe_get(values, 5),  # Columna F
         customer_location=safe_get(values, 6),  # Columna G
@@ -186,41 +267,83 @@ def create_excel_data_from_values(values, store_code, activity_id):
         file_activity_id=activity_id
     )
 
-def check_watchlist_matches(excel_data):
+def link_person(excel_data, persons):
+    """
+    Vincula un registro Excel con la persona de su DNI/NIE, creándola si no existe.
+    
+    Args:
+        excel_data: Objeto ExcelData recién creado
+        persons: Diccionario DNI/NIE -> Person usado como caché durante el archivo
+    
+    Returns:
+        Person: Persona vinculada o None si el registro no tiene un documento válido
+    """
+    id_number = normalize_id_number(excel_data.customer_contact)
+    if not id_number:
+        return None
+    
+    person = persons.get(id_number)
+    if person is None:
+        person = Person.query.filter_by(id_number=id_number).first()
+        if person is None:
+            person = Person(id_number=id_number, transaction_count=0)
+            db.session.add(person)
+        persons[id_number] = person
+    
+    person.name = excel_data.customer_name
+    person.transaction_count = (person.transaction_count or 0) + 1
+    if not person.first_seen or excel_data.order_date < person.first_seen:
+        person.first_seen = excel_data.order_date
+    if not person.last_seen or excel_data.order_date > person.last_seen:
+        person.last_seen = excel_data.order_date
+    
+    excel_data.person = person
+    return person
+
+def check_watchlist_matches(excel_data, fuzzy_matcher=None, groups=None):
     """
     Comprueba si hay coincidencias con elementos de la lista de vigilancia.
     
+    Cada registro genera como máximo una alerta por elemento vigilado (los
+    tipos de coincidencia se combinan, p. ej. "Name+IDNumber"), y las alertas
+    de un mismo elemento en un mismo archivo se agrupan en un AlertGroup.
+    
     Args:
         excel_data: Objeto ExcelData para comprobar
+        fuzzy_matcher: FuzzyNameMatcher del archivo en curso (opcional)
+        groups: Grupos de alertas ya creados para el archivo en curso (opcional;
+            quien lo indica debe llamar a apply_alert_group_hits al terminar)
     """
-    # Comprobar coincidencias de personas
-    watchlist_persons = WatchlistPerson.query.filter_by(active=True).all()
-    for person in watchlist_persons:
-        # Coincidencia por nombre (no sensible a mayúsculas/minúsculas)
-        if person.name and excel_data.customer_name and \
-           person.name.lower() in excel_data.customer_name.lower():
-            alert = Alert(
-                excel_data_id=excel_data.id,
-                watchlist_person_id=person.id,
-                type='Person',
-                match_type='Name',
-                match_value=excel_data.customer_name,
-                status='Pending'
-            )
-            db.session.add(alert)
-        
-        # Coincidencia por número de identificación
-        if person.id_number and excel_data.customer_contact and \
-           person.id_number in excel_data.customer_contact:
-            alert = Alert(
-                excel_data_id=excel_data.id,
-                watchlist_person_id=person.id,
-                type='Person',
-                match_type='IDNumber',
-                match_value=excel_data.customer_contact,
-                status='Pending'
-            )
-            db.session.add(alert)
+    matches = {}  # (tipo, id del elemento vigilado) -> Alert
+    
+    # Coincidencias por nombre: búsqueda indexada de cada combinación de tokens
+    # del cliente en la columna normalizada de la lista de vigilancia
+    name_subsets = name_token_subsets(excel_data.customer_name_norm)
+    if name_subsets:
+        name_matches = WatchlistPerson.query.filter(
+            WatchlistPerson.active == True,
+            WatchlistPerson.name_norm.in_(name_subsets)
+        ).all()
+        for person in name_matches:
+            add_match(matches, excel_data, 'Person', person.id, 'Name', excel_data.customer_name)
+    
+    # Coincidencias aproximadas de nombre (erratas, transliteraciones)
+    if fuzzy_matcher:
+        exact_ids = {entity_id for kind, entity_id in matches}
+        for person_id, score in fuzzy_matcher.match(excel_data.customer_name, exclude=exact_ids):
+            add_match(matches, excel_data, 'Person', person_id, f'FuzzyName:{score:.2f}',
+                      excel_data.customer_name)
+    
+    # Coincidencia por número de identificación
+    if excel_data.customer_contact:
+        id_persons = WatchlistPerson.query.filter(
+            WatchlistPerson.active == True,
+            WatchlistPerson.id_number.isnot(None)
+        ).all()
+        for person in id_persons:
+            if person.id_number and person.id_number in excel_data.customer_contact:
+                add_match(matches, excel_data, 'Person', person.id, 'IDNumber',
+                          excel_data.customer_contact)
     
     # Comprobar coincidencias de elementos
     watchlist_items = WatchlistItem.query.filter_by(active=True).all()
@@ -228,30 +351,128 @@ def check_watchlist_matches(excel_data):
         # Coincidencia en descripción de artículo
         if item.description and excel_data.item_details and \
            item.description.lower() in excel_data.item_details.lower():
-            alert = Alert(
-                excel_data_id=excel_data.id,
-                watchlist_item_id=item.id,
-                type='Item',
-                match_type='Description',
-                match_value=excel_data.item_details,
-                status='Pending'
-            )
-            db.session.add(alert)
+            add_match(matches, excel_data, 'Item', item.id, 'Description', excel_data.item_details)
         
         # Coincidencia por número de serie/grabado
         if item.serial_number and excel_data.engravings and \
            item.serial_number in excel_data.engravings:
-            alert = Alert(
-                excel_data_id=excel_data.id,
-                watchlist_item_id=item.id,
-                type='Item',
-                match_type='Serial',
-                match_value=excel_data.engravings,
-                status='Pending'
-            )
-            db.session.add(alert)
+            add_match(matches, excel_data, 'Item', item.id, 'Serial', excel_data.engravings)
+    
+    if not matches:
+        return
+    
+    # Agrupar por elemento vigilado y archivo
+    owns_groups = groups is None
+    if owns_groups:
+        groups = {}
+    hits = []
+    for (kind, entity_id), alert in matches.items():
+        group = get_alert_group(groups, excel_data, kind, entity_id)
+        alert.group = group
+        db.session.add(alert)
+        hits.append((group, alert.match_type))
+    record_alert_stats_change(None, 'Pending', len(matches))
+    
+    # Serializar antes de confirmar para no recargar cada alerta después
+    db.session.flush()
+    alert_data = [alert.to_dict() for alert in matches.values()]
     
     db.session.commit()
+    
+    # Los registros de cada grupo se escriben una sola vez al terminar el archivo
+    for group, match_type in hits:
+        group.add_hit(excel_data.id, match_type)
+    if owns_groups:
+        apply_alert_group_hits(groups)
+        db.session.commit()
+    
+    for kind, entity_id in matches:
+        ALERTS_CREATED.inc(1, kind)
+    for data in alert_data:
+        publish_alert(data)
+
+def add_match(matches, excel_data, kind, entity_id, match_type, match_value):
+    """
+    Registra una coincidencia de un registro, combinándola con la alerta que
+    ya exista para el mismo elemento vigilado.
+    
+    Args:
+        matches: Diccionario (tipo, id del elemento) -> Alert del registro
+        excel_data: Objeto ExcelData
+        kind: "Person" o "Item"
+        entity_id: ID de la persona o elemento vigilado
+        match_type: Tipo de coincidencia
+        match_value: Valor que ha coincidido
+    """
+    alert = matches.get((kind, entity_id))
+    if alert is None:
+        matches[(kind, entity_id)] = Alert(
+            excel_data_id=excel_data.id,
+            watchlist_person_id=entity_id if kind == 'Person' else None,
+            watchlist_item_id=entity_id if kind == 'Item' else None,
+            type=kind,
+            match_type=match_type,
+            match_value=match_value,
+            status='Pending'
+        )
+        return
+    
+    combined = f"{alert.match_type}+{match_type}"
+    if match_type not in alert.match_type.split('+') and len(combined) <= 50:
+        alert.match_type = combined
+
+def apply_alert_group_hits(groups):
+    """
+    Escribe en los grupos de alertas de un archivo los registros acumulados
+    durante su procesamiento (una actualización por grupo).
+    
+    Args:
+        groups: Grupos del archivo, por (tipo, id del elemento)
+    """
+    for group in groups.values():
+        group.apply_hits()
+
+def get_alert_group(groups, excel_data, kind, entity_id):
+    """
+    Obtiene (o crea) el grupo de alertas de un elemento vigilado en el archivo
+    de un registro.
+    
+    Args:
+        groups: Caché de grupos del archivo, por (tipo, id del elemento)
+        excel_data: Objeto ExcelData
+        kind: "Person" o "Item"
+        entity_id: ID de la persona o elemento vigilado
+    
+    Returns:
+        AlertGroup: Grupo de alertas
+    """
+    group = groups.get((kind, entity_id))
+    if group is not None:
+        return group
+    
+    entity_column = AlertGroup.watchlist_person_id if kind == 'Person' else AlertGroup.watchlist_item_id
+    group = AlertGroup.query.filter(
+        AlertGroup.file_activity_id == excel_data.file_activity_id,
+        AlertGroup.type == kind,
+        entity_column == entity_id
+    ).first()
+    
+    if group is None:
+        group = AlertGroup(
+            file_activity_id=excel_data.file_activity_id,
+            watchlist_person_id=entity_id if kind == 'Person' else None,
+            watchlist_item_id=entity_id if kind == 'Item' else None,
+            type=kind,
+            match_types='',
+            hit_count=0,
+            excel_data_ids='[]',
+            status='Pending'
+        )
+        db.session.add(group)
+        record_alert_group_stats_change(None, 'Pending')
+    
+    groups[(kind, entity_id)] = group
+    return group
 
 def determine_document_type(text):
     """
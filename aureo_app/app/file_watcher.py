@@ -9,6 +9,10 @@ import re
 from . import db
 from .models import FileActivity, SystemConfig, Store
 from .file_processors import process_excel_file, process_pdf_file
+from .events import publish_activity, publish_watching_status
+from .stats import record_activity_status_change
+from .storage import ingestion_writer
+from .metrics import WATCHER_LAG_SECONDS, ERRORS
 
 # Variables globales
 excel_observer = None
@@ -23,12 +27,15 @@ class ExcelFileHandler(FileSystemEventHandler):
         if event.is_directory:
             return
         
+        detected_at = time.time()
         filepath = event.src_path
         filename = os.path.basename(filepath)
         
         # Verificar extensiones de Excel
         if filename.lower().endswith(('.xlsx', '.xls', '.xlsm')):
-            handle_new_excel_file(filepath)
+            # Esperar a que el archivo termine de escribirse
+            time.sleep(1)  # Pequeño retraso para asegurar que el archivo esté completo
+            ingestion_writer.submit(handle_new_excel_file, filepath, detected_at)
 
 class PdfFileHandler(FileSystemEventHandler):
     """Manejador de eventos para archivos PDF"""
@@ -37,12 +44,15 @@ class PdfFileHandler(FileSystemEventHandler):
         if event.is_directory:
             return
         
+        detected_at = time.time()
         filepath = event.src_path
         filename = os.path.basename(filepath)
         
         # Verificar extensión PDF
         if filename.lower().endswith('.pdf'):
-            handle_new_pdf_file(filepath)
+            # Esperar a que el archivo termine de escribirse
+            time.sleep(1)  # Pequeño retraso para asegurar que el archivo esté completo
+            ingestion_writer.submit(handle_new_pdf_file, filepath, detected_at)
 
 def init_watchers():
     """Inicializa los vigilantes de archivos según la configuración del sistema"""
@@ -93,6 +103,7 @@ def start_file_watchers():
         excel_observer.start()
         pdf_observer.start()
         is_watching = True
+        publish_watching_status(True)
         
         print(f"Vigilancia de archivos iniciada: Excel en {excel_watch_dir}, PDF en {pdf_watch_dir}")
         
@@ -129,27 +140,28 @@ def stop_file_watchers():
             pdf_observer = None
         
         is_watching = False
+        publish_watching_status(False)
         print("Vigilancia de archivos detenida")
         return True
     except Exception as e:
         print(f"Error al detener vigilancia de archivos: {str(e)}")
         return False
 
-def handle_new_excel_file(file_path):
+def handle_new_excel_file(file_path, detected_at=None):
     """
     Procesa un nuevo archivo Excel detectado.
     
     Args:
         file_path: Ruta al archivo Excel
+        detected_at: Momento (time.time()) en que el vigilante detectó el archivo (opcional)
     """
+    if detected_at is not None:
+        WATCHER_LAG_SECONDS.observe(max(time.time() - detected_at, 0.0), 'Excel')
     try:
         # Información del archivo
         filename = os.path.basename(file_path)
         file_size = os.path.getsize(file_path)
         
-        # Esperar a que el archivo termine de escribirse
-        time.sleep(1)  # Pequeño retraso para asegurar que el archivo esté completo
-        
         # Extraer código de tienda del nombre del archivo (típicamente un código alfanumérico al inicio)
         store_code = extract_store_code_from_filename(filename)
         
@@ -191,33 +203,36 @@ def handle_new_excel_file(file_path):
         )
         
         db.session.add(activity)
+        record_activity_status_change(None, activity.status)
         db.session.commit()
+        publish_activity(activity)
         
         # Si tenemos tienda, procesar inmediatamente
         if store:
-            # Iniciar procesamiento en un hilo separado
-            threading.Thread(target=process_excel_file, args=(activity.id,)).start()
+            # Encolar el procesamiento en el hilo escritor de la ingesta
+            ingestion_writer.submit(process_excel_file, activity.id)
         
         print(f"Archivo Excel detectado: {filename}, tienda: {store.code if store else 'Pendiente de asignación'}")
         
     except Exception as e:
+        ERRORS.inc(1, 'watcher')
         print(f"Error al procesar archivo Excel {file_path}: {str(e)}")
 
-def handle_new_pdf_file(file_path):
+def handle_new_pdf_file(file_path, detected_at=None):
     """
     Procesa un nuevo archivo PDF detectado.
     
     Args:
         file_path: Ruta al archivo PDF
+        detected_at: Momento (time.time()) en que el vigilante detectó el archivo (opcional)
     """
+    if detected_at is not None:
+        WATCHER_LAG_SECONDS.observe(max(time.time() - detected_at, 0.0), 'PDF')
     try:
         # Información del archivo
         filename = os.path.basename(file_path)
         file_size = os.path.getsize(file_path)
         
-        # Esperar a que el archivo termine de escribirse
-        time.sleep(1)  # Pequeño retraso para asegurar que el archivo esté completo
-        
         # Extraer código de tienda del nombre del archivo
         store_code = extract_store_code_from_filename(filename)
         
@@ -259,16 +274,19 @@ def handle_new_pdf_file(file_path):
         )
         
         db.session.add(activity)
+        record_activity_status_change(None, activity.status)
         db.session.commit()
+        publish_activity(activity)
         
         # Si tenemos tienda, procesar inmediatamente
         if store:
-            # Iniciar procesamiento en un hilo separado
-            threading.Thread(target=process_pdf_file, args=(activity.id,)).start()
+            # Encolar el procesamiento en el hilo escritor de la ingesta
+            ingestion_writer.submit(process_pdf_file, activity.id)
         
         print(f"Archivo PDF detectado: {filename}, tienda: {store.code if store else 'Pendiente de asignación'}")
         
     except Exception as e:
+        ERRORS.inc(1, 'watcher')
         print(f"Error al procesar archivo PDF {file_path}: {str(e)}")
 
 def extract_store_code_from_filename(filename):
@@ -316,6 +334,7 @@ def update_activity_status(activity_id, status, error_message=None):
         if not activity:
             return False
             
+        record_activity_status_change(activity.status, status)
         activity.status = status
         if error_message:
             activity.error_message = error_message
@@ -324,6 +343,7 @@ def update_activity_status(activity_id, status, error_message=None):
             activity.processing_date = datetime.utcnow()
         
         db.session.commit()
+        publish_activity(activity)
         return True
     except Exception as e:
         print(f"Error al actualizar estado de actividad {activity_id}: {str(e)}")
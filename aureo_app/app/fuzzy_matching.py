@@ -0,0 +1,250 @@
+import re
+import zlib
+from functools import lru_cache
+from .models import WatchlistPerson, SystemConfig
+from .normalization import name_tokens
+
+# Umbral de similitud por defecto si no hay configuración
+DEFAULT_FUZZY_THRESHOLD = 0.85
+
+# Peso de la similitud fonética frente a la ortográfica
+PHONETIC_WEIGHT = 0.95
+
+# Número de firmas min-hash de trigramas por token
+MINHASH_SEEDS = (0x9e3779b1, 0x85ebca6b)
+
+# Reglas fonéticas para español, aplicadas en orden sobre texto ya normalizado
+_PHONETIC_RULES = [
+    (re.compile(r'ch'), 'X'),
+    (re.compile(r'ph'), 'f'),
+    (re.compile(r'h'), ''),
+    (re.compile(r'qu(?=[ei])'), 'k'),
+    (re.compile(r'gu(?=[ei])'), 'g'),
+    (re.compile(r'g(?=[ei])'), 'j'),
+    (re.compile(r'c(?=[ei])'), 's'),
+    (re.compile(r'[ckq]'), 'k'),
+    (re.compile(r'z'), 's'),
+    (re.compile(r'x'), 'ks'),
+    (re.compile(r'[vw]'), 'b'),
+    (re.compile(r'll'), 'y'),
+    (re.compile(r'i(?=[aeou])'), 'y'),
+    (re.compile(r'(?<=[aeiou])b$|(?<=[aeiou])f+$'), 'f'),  # Transliteraciones: -ov / -of / -off
+    (re.compile(r'(.)\1+'), r'\1'),
+]
+
+@lru_cache(maxsize=65536)
+def spanish_phonetic(token):
+    """
+    Calcula un código fonético aproximado para un token en español.
+
+    Agrupa grafías que suenan igual (v/b, z/ce/ci, ll/y, h muda, qu/k/c) y
+    las terminaciones transliteradas -ov/-of/-off.
+
+    Args:
+        token: Token normalizado (minúsculas, sin acentos)
+
+    Returns:
+        str: Código fonético
+    """
+    code = token
+    for pattern, replacement in _PHONETIC_RULES:
+        code = pattern.sub(replacement, code)
+    return code
+
+def trigram_signatures(token):
+    """
+    Calcula firmas min-hash de los trigramas de un token.
+
+    Dos tokens comparten cada firma con probabilidad igual a la similitud
+    de Jaccard de sus trigramas, lo que sirve como clave de bloqueo.
+
+    Args:
+        token: Token normalizado
+
+    Returns:
+        list: Una firma por semilla
+    """
+    padded = f"#{token}#"
+    grams = [padded[i:i + 3] for i in range(len(padded) - 2)]
+    if not grams:
+        return []
+    return [min(zlib.crc32(gram.encode(), seed) for gram in grams) for seed in MINHASH_SEEDS]
+
+def blocking_keys(token):
+    """Devuelve las claves de bloqueo de un token"""
+    keys = [('p', spanish_phonetic(token))]
+    keys.extend(('g', index, signature) for index, signature in enumerate(trigram_signatures(token)))
+    return keys
+
+def edit_similarity(a, b):
+    """
+    Similitud entre dos textos basada en la distancia de edición (0 a 1).
+
+    Args:
+        a: Primer texto
+        b: Segundo texto
+
+    Returns:
+        float: 1 - distancia de Levenshtein / longitud del más largo
+    """
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            ))
+        previous = current
+    return 1.0 - previous[-1] / max(len(a), len(b))
+
+@lru_cache(maxsize=262144)
+def token_similarity(a, b):
+    """
+    Similitud entre dos tokens: la mayor entre la ortográfica y la fonética
+    (ponderada), para que "basquez" y "vazquez" puntúen alto.
+
+    Args:
+        a: Primer token
+        b: Segundo token
+
+    Returns:
+        float: Puntuación entre 0 y 1
+    """
+    if a == b:
+        return 1.0
+    return max(edit_similarity(a, b),
+               PHONETIC_WEIGHT * edit_similarity(spanish_phonetic(a), spanish_phonetic(b)))
+
+def name_similarity(watch_tokens, customer_tokens):
+    """
+    Similitud de un nombre vigilado con el nombre de un cliente: media de la
+    mejor similitud de cada token vigilado entre los tokens del cliente.
+
+    Args:
+        watch_tokens: Tokens del nombre vigilado
+        customer_tokens: Tokens del nombre del cliente
+
+    Returns:
+        float: Puntuación entre 0 y 1
+    """
+    if not watch_tokens or not customer_tokens:
+        return 0.0
+    total = 0.0
+    for watch_token in watch_tokens:
+        total += max(token_similarity(watch_token, token) for token in customer_tokens)
+    return total / len(watch_tokens)
+
+def parse_fuzzy_threshold(value):
+    """
+    Valida el umbral de similitud de una persona vigilada.
+
+    Args:
+        value: Valor recibido (número, texto numérico o None)
+
+    Returns:
+        float: Umbral entre 0 (excluido) y 1, o None para usar el umbral general
+
+    Raises:
+        ValueError: Si el valor no es un número en (0, 1]
+    """
+    if value is None or value == '':
+        return None
+    try:
+        threshold = float(value)
+    except (TypeError, ValueError):
+        raise ValueError('El umbral de similitud debe ser un número')
+    if isinstance(value, bool) or not 0 < threshold <= 1:
+        raise ValueError('El umbral de similitud debe estar entre 0 (excluido) y 1')
+    return threshold
+
+class FuzzyNameMatcher:
+    """
+    Buscador aproximado de nombres de la lista de vigilancia.
+
+    Se construye una vez por archivo: indexa cada token de las personas
+    activas por sus claves de bloqueo (código fonético y firmas de
+    trigramas). Una persona solo es candidata para una fila si todos sus
+    tokens comparten alguna clave con los del cliente, y solo entonces se
+    calcula la similitud, en lugar de compararla con toda la lista.
+    """
+    def __init__(self, persons, default_threshold=DEFAULT_FUZZY_THRESHOLD):
+        self.default_threshold = default_threshold
+        self._persons = {}
+        self._blocks = {}
+
+        for person in persons:
+            tokens = name_tokens(person.name)
+            if not tokens:
+                continue
+            # Umbrales guardados antes de validarlos: uno fuera de (0, 1] coincidiría con todo
+            threshold = person.fuzzy_threshold
+            if threshold is None or not 0 < threshold <= 1:
+                threshold = default_threshold
+            self._persons[person.id] = (tokens, threshold)
+            for position, token in enumerate(tokens):
+                for key in blocking_keys(token):
+                    self._blocks.setdefault(key, set()).add((person.id, position))
+
+    @classmethod
+    def from_database(cls):
+        """
+        Construye el buscador con las personas activas y la configuración actual.
+
+        Returns:
+            FuzzyNameMatcher: Buscador, o None si la búsqueda aproximada está desactivada
+        """
+        active = SystemConfig.query.filter_by(key='FUZZY_MATCHING_ACTIVE').first()
+        if active and active.value.lower() != 'true':
+            return None
+
+        threshold = DEFAULT_FUZZY_THRESHOLD
+        config = SystemConfig.query.filter_by(key='FUZZY_MATCH_THRESHOLD').first()
+        if config:
+            try:
+                threshold = parse_fuzzy_threshold(config.value) or DEFAULT_FUZZY_THRESHOLD
+            except ValueError:
+                pass
+
+        persons = WatchlistPerson.query.filter_by(active=True).all()
+        return cls(persons, threshold)
+
+    def match(self, customer_name, exclude=()):
+        """
+        Busca personas vigiladas con nombre similar al de un cliente.
+
+        Args:
+            customer_name: Nombre del cliente
+            exclude: IDs de personas ya detectadas por coincidencia exacta
+
+        Returns:
+            list: Tuplas (id de persona, puntuación) que superan su umbral
+        """
+        customer_tokens = name_tokens(customer_name)
+        if not customer_tokens or not self._persons:
+            return []
+
+        # Tokens de cada persona que comparten alguna clave con el cliente
+        hits = {}
+        for token in customer_tokens:
+            for key in blocking_keys(token):
+                for person_id, position in self._blocks.get(key, ()):
+                    hits.setdefault(person_id, set()).add(position)
+
+        matches = []
+        for person_id, positions in hits.items():
+            if person_id in exclude:
+                continue
+            watch_tokens, threshold = self._persons[person_id]
+            if len(positions) < len(watch_tokens):
+                continue
+            score = name_similarity(watch_tokens, customer_tokens)
+            if score >= threshold:
+                matches.append((person_id, score))
+        return matches
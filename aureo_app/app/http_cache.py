@@ -0,0 +1,49 @@
+import hashlib
+from flask import current_app, request
+from .models import Store, SystemConfig, WatchlistPerson, WatchlistItem
+from .search_cache import SearchResultCache
+from .data_versions import get_table_version
+
+# Cuerpos JSON ya serializados de los datos de referencia, por versión de tabla
+reference_cache = SearchResultCache(max_bytes=8 * 1024 * 1024)
+
+def _schema_fingerprint(model):
+    """Huella de las columnas de un modelo: cambia el ETag si una migración cambia la respuesta"""
+    columns = ','.join(column.name for column in model.__table__.columns)
+    return hashlib.blake2b(columns.encode(), digest_size=4).hexdigest()
+
+_FINGERPRINTS = {model.__table__.name: _schema_fingerprint(model)
+                 for model in (Store, SystemConfig, WatchlistPerson, WatchlistItem)}
+
+def versioned_json_response(table, variant, build):
+    """
+    Responde con los datos de una tabla de referencia usando un ETag fuerte
+    derivado de la versión de la tabla.
+
+    Si el cliente ya tiene esa versión (If-None-Match) se responde 304 sin
+    consultar la tabla; si no, se sirve el JSON cacheado para la versión o
+    se genera una sola vez.
+
+    Args:
+        table: Nombre de la tabla versionada
+        variant: Variante de la respuesta (filtros de la ruta)
+        build: Función sin argumentos que devuelve los datos a serializar
+
+    Returns:
+        Response: Respuesta 200 con el JSON o 304
+    """
+    version = get_table_version(table)
+    etag = f"{table}-{version}-{_FINGERPRINTS[table]}-{variant}"
+
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        body = reference_cache.get_or_compute(
+            (table, variant, version), lambda: current_app.json.dumps(build())
+        )
+        response = current_app.response_class(body, status=200, mimetype='application/json')
+
+    response.set_etag(etag)
+    # El navegador debe revalidar siempre (los datos cambian sin aviso)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,243 @@
+import hmac
+import time
+import threading
+from bisect import bisect_left
+
+# Límites de los histogramas de latencia, en segundos
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Límites de los histogramas de etapas de ingesta (por archivo) y de retrasos
+SLOW_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    """Base de las métricas: nombre, ayuda, etiquetas y valores por combinación de etiquetas"""
+    type_name = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_name}"]
+
+class Counter(_Metric):
+    """Contador monótono"""
+    type_name = 'counter'
+
+    def inc(self, amount=1, *labels):
+        """
+        Incrementa el contador.
+
+        Args:
+            amount: Cantidad a sumar
+            *labels: Valores de las etiquetas, en el orden declarado
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}")
+        return lines
+
+class Gauge(_Metric):
+    """Valor instantáneo obtenido al exponer las métricas (sin coste en el camino crítico)"""
+    type_name = 'gauge'
+
+    def __init__(self, name, help_text, callback):
+        super().__init__(name, help_text)
+        self.callback = callback
+
+    def render(self):
+        try:
+            value = self.callback()
+        except Exception:
+            return []
+        return self._header() + [f"{self.name} {_format_value(value)}"]
+
+class Histogram(_Metric):
+    """Histograma acumulado con límites fijos"""
+    type_name = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        """
+        Registra una observación.
+
+        Args:
+            value: Valor observado (segundos)
+            *labels: Valores de las etiquetas, en el orden declarado
+        """
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, *labels):
+        """Contexto que mide la duración de un bloque"""
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            items = [(labels, (list(state[0]), state[1], state[2])) for labels, state in self._values.items()]
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}")
+            label_text = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+class Registry:
+    """Conjunto de métricas del proceso expuestas en /metrics"""
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, callback):
+        return self.register(Gauge(name, help_text, callback))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def render(self):
+        """
+        Genera el formato de exposición de texto de Prometheus.
+
+        Returns:
+            str: Métricas en formato texto (versión 0.0.4)
+        """
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+# Ingesta
+INGEST_ROWS = registry.counter(
+    'aureo_ingest_rows_total', 'Registros Excel guardados')
+INGEST_FILES = registry.counter(
+    'aureo_ingest_files_total', 'Archivos procesados por tipo y resultado', ('file_type', 'status'))
+INGEST_STAGE_SECONDS = registry.histogram(
+    'aureo_ingest_stage_seconds', 'Tiempo por archivo de cada etapa de la ingesta (parse, normalize, match, write)',
+    ('stage',), SLOW_BUCKETS)
+WRITER_WAIT_SECONDS = registry.histogram(
+    'aureo_writer_queue_wait_seconds', 'Espera de los trabajos en la cola del hilo escritor', ('queue',), SLOW_BUCKETS)
+WRITER_JOB_SECONDS = registry.histogram(
+    'aureo_writer_job_seconds', 'Duración de los trabajos del hilo escritor', ('queue', 'job'), SLOW_BUCKETS)
+WATCHER_LAG_SECONDS = registry.histogram(
+    'aureo_watcher_event_lag_seconds', 'Retraso entre la detección de un archivo y su registro', ('file_type',),
+    SLOW_BUCKETS)
+ALERTS_CREATED = registry.counter(
+    'aureo_alerts_created_total', 'Alertas creadas', ('type',))
+ERRORS = registry.counter(
+    'aureo_errors_total', 'Errores capturados por componente', ('component',))
+
+# API
+HTTP_REQUEST_SECONDS = registry.histogram(
+    'aureo_http_request_duration_seconds', 'Duración de las peticiones por ruta', ('endpoint', 'method'))
+HTTP_REQUESTS = registry.counter(
+    'aureo_http_requests_total', 'Peticiones por ruta y código de estado', ('endpoint', 'method', 'status'))
+
+# Base de datos
+DB_CONNECTION_WAIT_SECONDS = registry.histogram(
+    'aureo_db_connection_wait_seconds', 'Espera para obtener una conexión del pool', ('pool',))
+
+def _ingestion_queue_depth():
+    from .storage import ingestion_writer
+    return ingestion_writer.pending
+
+INGESTION_QUEUE_DEPTH = registry.gauge(
+    'aureo_ingestion_queue_depth', 'Trabajos en espera en la cola de ingesta', _ingestion_queue_depth)
+
+def init_metrics(app):
+    """
+    Registra la medición de las peticiones y la ruta /metrics, que expone las
+    métricas del proceso en el formato de texto de Prometheus. Si se define
+    METRICS_TOKEN, la ruta exige la cabecera "Authorization: Bearer <token>".
+
+    Args:
+        app: Aplicación Flask
+    """
+    from flask import request, g, Response
+
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    @app.before_request
+    def _start_request_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        start = g.pop('_metrics_start', None)
+        if start is not None:
+            endpoint = request.url_rule.endpoint if request.url_rule else 'unmatched'
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint, request.method)
+            HTTP_REQUESTS.inc(1, endpoint, request.method, str(response.status_code))
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        token = app.config['METRICS_TOKEN']
+        if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+            return Response('No autorizado\n', status=401, mimetype='text/plain')
+        response = Response(registry.render(), mimetype='text/plain')
+        response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+        response.headers['Cache-Control'] = 'no-store'
+        return response
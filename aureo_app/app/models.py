@@ -2,6 +2,7 @@ from . import db
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+import json
 import os
 
 class User(UserMixin, db.Model):
@@ -93,6 +94,8 @@ class FileActivity(db.Model):
     processing_date = db.Column(db.DateTime, nullable=True)
     processed_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     error_message = db.Column(db.Text, nullable=True)
+    content_hash = db.Column(db.String(64), nullable=True, index=True)  # SHA-256 del archivo cargado
+    batch_id = db.Column(db.Integer, db.ForeignKey('upload_batch.id'), nullable=True, index=True)
     
     # Relaciones
     processor = db.relationship('User', backref='processed_files', foreign_keys=[processed_by])
@@ -118,6 +121,7 @@ class ExcelData(db.Model):
     order_number = db.Column(db.String(50), nullable=False)
     order_date = db.Column(db.DateTime, nullable=False)
     customer_name = db.Column(db.String(120), nullable=False)
+    customer_name_norm = db.Column(db.String(120), nullable=True, index=True)  # Sin acentos, minúsculas, tokens ordenados
     customer_contact = db.Column(db.String(120), nullable=True)
     customer_address = db.Column(db.String(255), nullable=True)
     customer_location = db.Column(db.String(120), nullable=True)
@@ -129,10 +133,12 @@ class ExcelData(db.Model):
     price = db.Column(db.String(20), nullable=True)
     pawn_ticket = db.Column(db.String(50), nullable=True)
     sale_date = db.Column(db.DateTime, nullable=True)
-    file_activity_id = db.Column(db.Integer, db.ForeignKey('file_activity.id'), nullable=False)
+    file_activity_id = db.Column(db.Integer, db.ForeignKey('file_activity.id'), nullable=False, index=True)
+    person_id = db.Column(db.Integer, db.ForeignKey('person.id'), nullable=True, index=True)
     
     # Relaciones
     file_activity = db.relationship('FileActivity', backref='excel_data')
+    person = db.relationship('Person', backref='transactions')
     
     def to_dict(self):
         return {
@@ -152,7 +158,27 @@ class ExcelData(db.Model):
             'price': self.price,
             'pawnTicket': self.pawn_ticket,
             'saleDate': self.sale_date.isoformat() if self.sale_date else None,
-            'fileActivityId': self.file_activity_id
+            'fileActivityId': self.file_activity_id,
+            'personId': self.person_id
+        }
+
+class Person(db.Model):
+    """Persona identificada por su DNI/NIE validado, común a todas las tiendas"""
+    id = db.Column(db.Integer, primary_key=True)
+    id_number = db.Column(db.String(9), unique=True, nullable=False)  # DNI/NIE normalizado con letra de control
+    name = db.Column(db.String(120), nullable=True)  # Último nombre registrado
+    first_seen = db.Column(db.DateTime, nullable=True)
+    last_seen = db.Column(db.DateTime, nullable=True)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'idNumber': self.id_number,
+            'name': self.name,
+            'firstSeen': self.first_seen.isoformat() if self.first_seen else None,
+            'lastSeen': self.last_seen.isoformat() if self.last_seen else None,
+            'transactionCount': self.transaction_count
         }
 
 class PdfDocument(db.Model):
@@ -183,8 +209,10 @@ class PdfDocument(db.Model):
 class WatchlistPerson(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
+    name_norm = db.Column(db.String(120), nullable=True, index=True)  # Sin acentos, minúsculas, tokens ordenados
     id_number = db.Column(db.String(50), nullable=True)
     description = db.Column(db.Text, nullable=True)
+    fuzzy_threshold = db.Column(db.Float, nullable=True)  # Umbral de similitud propio (si no, FUZZY_MATCH_THRESHOLD)
     created_date = db.Column(db.DateTime, default=datetime.utcnow)
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     active = db.Column(db.Boolean, default=True)
@@ -198,6 +226,7 @@ class WatchlistPerson(db.Model):
             'name': self.name,
             'idNumber': self.id_number,
             'description': self.description,
+            'fuzzyThreshold': self.fuzzy_threshold,
             'createdDate': self.created_date.isoformat(),
             'createdBy': self.created_by,
             'active': self.active
@@ -228,22 +257,29 @@ class WatchlistItem(db.Model):
 
 class Alert(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    excel_data_id = db.Column(db.Integer, db.ForeignKey('excel_data.id'), nullable=False)
+    excel_data_id = db.Column(db.Integer, db.ForeignKey('excel_data.id'), nullable=False, index=True)
     watchlist_item_id = db.Column(db.Integer, db.ForeignKey('watchlist_item.id'), nullable=True)
     watchlist_person_id = db.Column(db.Integer, db.ForeignKey('watchlist_person.id'), nullable=True)
     type = db.Column(db.String(20), nullable=False)  # "Person" o "Item"
-    match_type = db.Column(db.String(50), nullable=False)  # "Name", "IDNumber", "Serial", etc.
+    match_type = db.Column(db.String(50), nullable=False)  # "Name", "IDNumber", "Serial", "FuzzyName:<puntuación>", etc.
     match_value = db.Column(db.String(255), nullable=False)
     alert_date = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(20), nullable=False, default='Pending')  # "Pending", "Reviewed", "Dismissed"
     reviewed_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     review_notes = db.Column(db.Text, nullable=True)
+    group_id = db.Column(db.Integer, db.ForeignKey('alert_group.id'), nullable=True, index=True)
     
     # Relaciones
     excel_data = db.relationship('ExcelData', backref='alerts')
     watchlist_item = db.relationship('WatchlistItem', backref='alerts')
     watchlist_person = db.relationship('WatchlistPerson', backref='alerts')
     reviewer = db.relationship('User', backref='reviewed_alerts')
+    group = db.relationship('AlertGroup', backref='alerts')
+    
+    __table_args__ = (
+        db.Index('ix_alert_date_id', 'alert_date', 'id'),
+        db.Index('ix_alert_status_date_id', 'status', 'alert_date', 'id'),
+    )
     
     def to_dict(self):
         return {
@@ -257,6 +293,92 @@ class Alert(db.Model):
             'alertDate': self.alert_date.isoformat(),
             'status': self.status,
             'reviewedBy': self.reviewed_by,
+            'reviewNotes': self.review_notes,
+            'groupId': self.group_id
+        }
+
+class AlertGroup(db.Model):
+    """Alertas de un mismo elemento vigilado en un mismo archivo, revisables de una vez"""
+    id = db.Column(db.Integer, primary_key=True)
+    file_activity_id = db.Column(db.Integer, db.ForeignKey('file_activity.id'), nullable=True, index=True)
+    watchlist_item_id = db.Column(db.Integer, db.ForeignKey('watchlist_item.id'), nullable=True)
+    watchlist_person_id = db.Column(db.Integer, db.ForeignKey('watchlist_person.id'), nullable=True)
+    type = db.Column(db.String(20), nullable=False)  # "Person" o "Item"
+    match_types = db.Column(db.String(255), nullable=False, default='')  # Tipos de coincidencia separados por comas
+    hit_count = db.Column(db.Integer, nullable=False, default=0)
+    excel_data_ids = db.Column(db.Text, nullable=False, default='[]')  # IDs de ExcelData en JSON
+    first_alert_date = db.Column(db.DateTime, default=datetime.utcnow)
+    last_alert_date = db.Column(db.DateTime, default=datetime.utcnow)
+    status = db.Column(db.String(20), nullable=False, default='Pending')  # "Pending", "Reviewed", "Dismissed"
+    reviewed_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    review_date = db.Column(db.DateTime, nullable=True)
+    review_notes = db.Column(db.Text, nullable=True)
+    
+    # Relaciones
+    file_activity = db.relationship('FileActivity', backref='alert_groups')
+    watchlist_item = db.relationship('WatchlistItem', backref='alert_groups')
+    watchlist_person = db.relationship('WatchlistPerson', backref='alert_groups')
+    reviewer = db.relationship('User', backref='reviewed_alert_groups')
+    
+    __table_args__ = (
+        db.Index('ix_alert_group_status_date_id', 'status', 'last_alert_date', 'id'),
+    )
+    
+    def add_hit(self, excel_data_id, match_type):
+        """
+        Añade al grupo un registro coincidente. Los registros se acumulan en
+        memoria y se guardan de una vez con apply_hits (al terminar el archivo).
+        
+        Args:
+            excel_data_id: ID del registro Excel
+            match_type: Tipo de coincidencia de la alerta del registro
+        """
+        pending = getattr(self, '_pending_hits', None)
+        if pending is None:
+            pending = self._pending_hits = []
+        pending.append((excel_data_id, match_type))
+    
+    def apply_hits(self, last_alert_date=None):
+        """
+        Escribe en el grupo los registros acumulados con add_hit.
+        
+        Args:
+            last_alert_date: Fecha de la última alerta (por defecto, ahora)
+        """
+        pending = getattr(self, '_pending_hits', None)
+        if not pending:
+            return
+        self._pending_hits = []
+        
+        ids = json.loads(self.excel_data_ids or '[]')
+        match_types = [t for t in (self.match_types or '').split(',') if t]
+        for excel_data_id, match_type in pending:
+            ids.append(excel_data_id)
+            for t in match_type.split('+'):
+                # Las coincidencias aproximadas se agrupan sin su puntuación
+                t = t.split(':')[0]
+                if t not in match_types:
+                    match_types.append(t)
+        self.excel_data_ids = json.dumps(ids)
+        self.hit_count = len(ids)
+        self.match_types = ','.join(match_types)
+        self.last_alert_date = last_alert_date or datetime.utcnow()
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'fileActivityId': self.file_activity_id,
+            'watchlistItemId': self.watchlist_item_id,
+            'watchlistPersonId': self.watchlist_person_id,
+            'type': self.type,
+            'matchTypes': [t for t in (self.match_types or '').split(',') if t],
+            'hitCount': self.hit_count,
+            'excelDataIds': json.loads(self.excel_data_ids or '[]'),
+            'firstAlertDate': self.first_alert_date.isoformat() if self.first_alert_date else None,
+            'lastAlertDate': self.last_alert_date.isoformat() if self.last_alert_date else None,
+            'status': self.status,
+            'reviewedBy': self.reviewed_by,
+            'reviewDate': self.review_date.isoformat() if self.review_date else None,
             'reviewNotes': self.review_notes
         }
 
@@ -277,6 +399,165 @@ class SearchHistory(db.Model):
             'searchDate': self.search_date.isoformat()
         }
 
+class SearchJob(db.Model):
+    """Búsqueda ejecutada en segundo plano cuyo resultado se exporta a un archivo"""
+    id = db.Column(db.String(36), primary_key=True)  # UUID
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    criteria = db.Column(db.Text, nullable=False)  # Criterios normalizados en JSON
+    format = db.Column(db.String(10), nullable=False, default='csv')  # "csv" (gzip) o "xlsx"
+    status = db.Column(db.String(20), nullable=False, default='Pending')  # "Pending", "Running", "Completed", "Failed"
+    row_count = db.Column(db.Integer, nullable=True)
+    file_path = db.Column(db.String(512), nullable=True)
+    file_size = db.Column(db.Integer, nullable=True)
+    error_message = db.Column(db.Text, nullable=True)
+    created_date = db.Column(db.DateTime, default=datetime.utcnow)
+    started_date = db.Column(db.DateTime, nullable=True)
+    finished_date = db.Column(db.DateTime, nullable=True)
+    
+    # Relaciones
+    user = db.relationship('User', backref='search_jobs')
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'userId': self.user_id,
+            'criteria': json.loads(self.criteria),
+            'format': self.format,
+            'status': self.status,
+            'rowCount': self.row_count,
+            'fileSize': self.file_size,
+            'errorMessage': self.error_message,
+            'createdDate': self.created_date.isoformat(),
+            'startedDate': self.started_date.isoformat() if self.started_date else None,
+            'finishedDate': self.finished_date.isoformat() if self.finished_date else None
+        }
+
+class FacetCount(db.Model):
+    """Recuento agregado por faceta (tienda, metal, mes, estado de alerta), mantenido en la ingesta"""
+    id = db.Column(db.Integer, primary_key=True)
+    facet = db.Column(db.String(20), nullable=False)  # "store", "metal", "month", "alertStatus"
+    value = db.Column(db.String(120), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (db.UniqueConstraint('facet', 'value', name='uq_facet_count_facet_value'),)
+    
+    def to_dict(self):
+        return {
+            'facet': self.facet,
+            'value': self.value,
+            'count': self.count
+        }
+
+class DailyStoreStats(db.Model):
+    """
+    Estadísticas diarias por tienda, mantenidas en la ingesta y la revisión.
+    Los registros se cuentan por fecha de operación, los archivos por fecha
+    de procesamiento y las alertas por fecha de alerta.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.String(10), nullable=False)  # "YYYY-MM-DD"
+    store_code = db.Column(db.String(20), nullable=False)
+    excel_rows = db.Column(db.Integer, nullable=False, default=0)
+    files_processed = db.Column(db.Integer, nullable=False, default=0)
+    files_failed = db.Column(db.Integer, nullable=False, default=0)
+    alerts = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (db.UniqueConstraint('day', 'store_code', name='uq_daily_store_stats_day_store'),)
+    
+    def to_dict(self):
+        return {
+            'day': self.day,
+            'storeCode': self.store_code,
+            'excelRows': self.excel_rows,
+            'filesProcessed': self.files_processed,
+            'filesFailed': self.files_failed,
+            'alerts': self.alerts
+        }
+
+class StatCounter(db.Model):
+    """Contador global mantenido de forma incremental (alertas pendientes, etc.)"""
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+class UserSession(db.Model):
+    """Sesión de servidor (datos de la sesión Flask serializados en JSON)"""
+    session_id = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.Text, nullable=False)
+    expiry = db.Column(db.DateTime, nullable=False, index=True)
+
+class TableVersion(db.Model):
+    """Versión persistente de una tabla de referencia, incrementada en cada escritura"""
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class UploadSession(db.Model):
+    """Carga por fragmentos en curso"""
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    store_code = db.Column(db.String(20), nullable=True)  # Tienda por defecto en los ZIP
+    filename = db.Column(db.String(255), nullable=False)
+    file_type = db.Column(db.String(10), nullable=False)  # "Excel", "PDF" o "ZIP"
+    part_path = db.Column(db.String(512), nullable=False)
+    total_size = db.Column(db.BigInteger, nullable=False)
+    received_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    expected_hash = db.Column(db.String(64), nullable=True)
+    created_date = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_date = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def to_dict(self):
+        return {
+            'uploadId': self.id,
+            'storeCode': self.store_code,
+            'filename': self.filename,
+            'fileType': self.file_type,
+            'totalSize': self.total_size,
+            'offset': self.received_bytes,
+            'createdDate': self.created_date.isoformat(),
+            'updatedDate': self.updated_date.isoformat()
+        }
+
+class UploadBatch(db.Model):
+    """Carga masiva de archivos (varios archivos o un ZIP)"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    created_date = db.Column(db.DateTime, default=datetime.utcnow)
+    total_files = db.Column(db.Integer, nullable=False, default=0)
+    skipped = db.Column(db.Text, nullable=True)  # JSON con las entradas descartadas y el motivo
+    
+    # Relaciones
+    activities = db.relationship('FileActivity', backref='batch', lazy='dynamic')
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'userId': self.user_id,
+            'createdDate': self.created_date.isoformat(),
+            'totalFiles': self.total_files,
+            'skipped': json.loads(self.skipped) if self.skipped else []
+        }
+
+class ChangeLog(db.Model):
+    """Registro de cambios (outbox) para la sincronización incremental de clientes"""
+    # AUTOINCREMENT: los ids son el cursor de los clientes y no deben reutilizarse tras la purga
+    __table_args__ = {'sqlite_autoincrement': True}
+    
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(30), nullable=False)  # "file_activity", "alert", "watchlist_person", etc.
+    entity_id = db.Column(db.Integer, nullable=False)
+    action = db.Column(db.String(10), nullable=False)  # "insert", "update", "delete"
+    change_date = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    data = db.Column(db.Text, nullable=True)  # JSON con el to_dict() de la entidad (None si se ha eliminado)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'entity': self.entity,
+            'entityId': self.entity_id,
+            'action': self.action,
+            'changeDate': self.change_date.isoformat(),
+            'data': json.loads(self.data) if self.data else None
+        }
+
 # Función para inicializar la base de datos con datos iniciales
 def init_db():
     # Habilitar el soporte para claves foráneas en SQLite
@@ -316,6 +597,16 @@ def init_db():
             'value': 'false',
             'description': 'Asigna automáticamente una tienda cuando no se detecta en el nombre del archivo'
         },
+        {
+            'key': 'FUZZY_MATCHING_ACTIVE',
+            'value': 'true',
+            'description': 'Indica si se buscan coincidencias aproximadas de nombres en la lista de vigilancia'
+        },
+        {
+            'key': 'FUZZY_MATCH_THRESHOLD',
+            'value': '0.85',
+            'description': 'Similitud mínima (0-1) para las coincidencias aproximadas de nombres'
+        },
         {
             'key': 'APP_NAME',
             'value': 'Áureo',
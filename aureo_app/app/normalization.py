@@ -0,0 +1,124 @@
+import re
+import unicodedata
+from itertools import combinations
+
+# Máximo de tokens considerados al generar subconjuntos de un nombre
+MAX_NAME_TOKENS = 6
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+def fold_text(value):
+    """
+    Elimina acentos y pasa a minúsculas un texto.
+
+    Args:
+        value: Texto original
+
+    Returns:
+        str: Texto sin acentos, en minúsculas y con signos convertidos en espacios
+    """
+    if not value:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', str(value))
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return _NON_ALNUM.sub(' ', stripped.casefold()).strip()
+
+def name_tokens(value):
+    """Devuelve los tokens normalizados y ordenados de un nombre"""
+    return sorted(fold_text(value).split())
+
+def normalize_name(value):
+    """
+    Normaliza un nombre de persona para comparaciones indexables.
+
+    "JOSÉ GARCÍA", "Jose Garcia" y "garcia, jose" producen "garcia jose".
+
+    Args:
+        value: Nombre original
+
+    Returns:
+        str: Nombre sin acentos, en minúsculas y con los tokens ordenados,
+             o None si no contiene caracteres útiles
+    """
+    tokens = name_tokens(value)
+    return ' '.join(tokens) if tokens else None
+
+def name_token_subsets(normalized_name):
+    """
+    Genera todas las combinaciones de tokens de un nombre normalizado.
+
+    Un nombre vigilado coincide con un cliente si sus tokens son un
+    subconjunto de los del cliente; como ambos están ordenados, basta con
+    buscar cada combinación como valor exacto en la columna normalizada.
+
+    Args:
+        normalized_name: Nombre ya normalizado (ver normalize_name)
+
+    Returns:
+        list: Combinaciones de tokens unidas por espacios
+    """
+    if not normalized_name:
+        return []
+    tokens = normalized_name.split()[:MAX_NAME_TOKENS]
+    subsets = []
+    for size in range(1, len(tokens) + 1):
+        for combo in combinations(tokens, size):
+            subsets.append(' '.join(combo))
+    return subsets
+
+def name_like_pattern(value):
+    """
+    Construye un patrón LIKE sobre la columna normalizada que encuentra
+    los nombres que contienen todos los tokens buscados.
+
+    Args:
+        value: Nombre (o parte) introducido por el usuario
+
+    Returns:
+        str: Patrón LIKE o None si el texto no contiene tokens
+    """
+    tokens = name_tokens(value)
+    if not tokens:
+        return None
+    return '%' + '%'.join(tokens) + '%'
+
+# Letras de control del DNI/NIE según el resto de dividir entre 23
+ID_CHECK_LETTERS = 'TRWAGMYFPDXBNJZSQVHLCKE'
+
+_ID_CANDIDATE = re.compile(r'([XYZ]?)(\d{7,8})([A-Z])')
+
+def normalize_id_number(value):
+    """
+    Extrae y valida un DNI o NIE de un texto libre.
+
+    Acepta espacios, guiones, puntos y minúsculas ("12.345.678-z",
+    "x 1234567 l"). Solo devuelve el documento si la letra de control es
+    correcta.
+
+    Args:
+        value: Texto que contiene el documento (p. ej. customer_contact)
+
+    Returns:
+        str: DNI (8 dígitos + letra) o NIE (X/Y/Z + 7 dígitos + letra)
+             normalizado, o None si no hay un documento válido
+    """
+    if not value:
+        return None
+    compact = re.sub(r'[\s.\-/]', '', str(value).upper())
+
+    for prefix, digits, letter in _ID_CANDIDATE.findall(compact):
+        if prefix:
+            if len(digits) != 7:
+                continue
+            # El prefijo del NIE equivale a un dígito: X=0, Y=1, Z=2
+            number = int(str('XYZ'.index(prefix)) + digits)
+            canonical = f"{prefix}{digits}{letter}"
+        else:
+            digits = digits.zfill(8)
+            number = int(digits)
+            canonical = f"{digits}{letter}"
+
+        if ID_CHECK_LETTERS[number % 23] == letter:
+            return canonical
+
+    return None
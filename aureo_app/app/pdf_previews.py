@@ -0,0 +1,117 @@
+import os
+import threading
+import pdfplumber
+from flask import current_app
+
+# Anchos de miniatura admitidos: se redondean para acotar las variantes cacheadas
+THUMBNAIL_WIDTH_STEP = 100
+THUMBNAIL_MIN_WIDTH = 100
+THUMBNAIL_MAX_WIDTH = 800
+
+# Tamaño total ocupado por la caché en este proceso (None hasta el primer recorrido)
+_cache_bytes = None
+_cache_lock = threading.Lock()
+_render_locks = {}
+
+def normalize_width(width):
+    """Ajusta el ancho pedido al escalón admitido más cercano"""
+    width = max(THUMBNAIL_MIN_WIDTH, min(THUMBNAIL_MAX_WIDTH, width or 200))
+    return int(round(width / THUMBNAIL_WIDTH_STEP) * THUMBNAIL_WIDTH_STEP)
+
+def _document_stamp(path):
+    """Marca del contenido del archivo: cambia si el PDF se sustituye"""
+    stat = os.stat(path)
+    return f"{int(stat.st_mtime)}-{stat.st_size}"
+
+def _cache_folder():
+    folder = current_app.config['THUMBNAIL_CACHE_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+def _cache_size(folder):
+    """Tamaño de la caché, calculado recorriendo la carpeta solo la primera vez"""
+    global _cache_bytes
+    if _cache_bytes is None:
+        _cache_bytes = sum(entry.stat().st_size for entry in os.scandir(folder)
+                           if entry.is_file() and entry.name.endswith('.png'))
+    return _cache_bytes
+
+def _evict(folder, max_bytes, keep):
+    """Elimina las miniaturas usadas hace más tiempo (salvo keep) hasta respetar el tamaño máximo"""
+    global _cache_bytes
+    entries = sorted(
+        (entry for entry in os.scandir(folder)
+         if entry.is_file() and entry.name.endswith('.png') and entry.path != keep),
+        key=lambda entry: entry.stat().st_mtime
+    )
+    for entry in entries:
+        if _cache_bytes <= max_bytes:
+            break
+        size = entry.stat().st_size
+        try:
+            os.remove(entry.path)
+            _cache_bytes -= size
+        except FileNotFoundError:
+            pass
+
+def get_page_count(path):
+    """
+    Obtiene el número de páginas de un PDF.
+
+    Args:
+        path: Ruta del PDF
+
+    Returns:
+        int: Número de páginas
+    """
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+def get_thumbnail(document, page_number, width):
+    """
+    Devuelve la miniatura PNG de una página, renderizándola solo la primera vez.
+
+    Las miniaturas se guardan en THUMBNAIL_CACHE_FOLDER con un nombre que
+    incluye la marca del PDF, de modo que nunca quedan obsoletas; al superar
+    THUMBNAIL_CACHE_MAX_BYTES se eliminan las menos usadas.
+
+    Args:
+        document: PdfDocument
+        page_number: Página (empezando en 1)
+        width: Ancho en píxeles (ya normalizado)
+
+    Returns:
+        str: Ruta de la miniatura
+
+    Raises:
+        IndexError: Si la página no existe
+    """
+    global _cache_bytes
+    folder = _cache_folder()
+    key = f"{document.id}-{_document_stamp(document.path)}-p{page_number}-w{width}"
+    path = os.path.join(folder, f"{key}.png")
+
+    with _cache_lock:
+        _cache_size(folder)
+        lock = _render_locks.setdefault(key, threading.Lock())
+
+    with lock:
+        if os.path.exists(path):
+            os.utime(path)  # Usada recientemente
+            return path
+
+        with pdfplumber.open(document.path) as pdf:
+            if page_number < 1 or page_number > len(pdf.pages):
+                raise IndexError(f"El documento tiene {len(pdf.pages)} páginas")
+            image = pdf.pages[page_number - 1].to_image(width=width)
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            image.save(temp_path, format='PNG')
+        os.replace(temp_path, path)
+
+    with _cache_lock:
+        _render_locks.pop(key, None)
+        _cache_bytes += os.path.getsize(path)
+        max_bytes = current_app.config['THUMBNAIL_CACHE_MAX_BYTES']
+        if _cache_bytes > max_bytes:
+            _evict(folder, max_bytes, path)
+    return path
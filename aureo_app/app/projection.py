@@ -0,0 +1,66 @@
+from flask import current_app
+from . import fast_json
+from .models import FileActivity, ExcelData, PdfDocument, Alert
+
+def _camel_case(name):
+    head, *rest = name.split('_')
+    return head + ''.join(part.capitalize() for part in rest)
+
+# Columnas de cada modelo en los listados, en el orden y con las claves de su to_dict()
+LIST_COLUMNS = {
+    FileActivity: ['id', 'filename', 'store_code', 'detected_store_code', 'file_type', 'status',
+                   'upload_date', 'processing_date', 'processed_by', 'error_message', 'file_size'],
+    ExcelData: ['id', 'store_code', 'order_number', 'order_date', 'customer_name', 'customer_contact',
+                'customer_address', 'customer_location', 'item_details', 'metals', 'engravings',
+                'stones', 'carats', 'price', 'pawn_ticket', 'sale_date', 'file_activity_id', 'person_id'],
+    PdfDocument: ['id', 'store_code', 'document_type', 'title', 'path', 'upload_date', 'file_size',
+                  'file_activity_id'],
+    Alert: ['id', 'excel_data_id', 'watchlist_item_id', 'watchlist_person_id', 'type', 'match_type',
+            'match_value', 'alert_date', 'status', 'reviewed_by', 'review_notes', 'group_id'],
+}
+
+LIST_KEYS = {model: [_camel_case(name) for name in columns] for model, columns in LIST_COLUMNS.items()}
+
+def project_rows(query, model):
+    """
+    Ejecuta una consulta ORM devolviendo solo las columnas del listado como
+    tuplas, sin construir instancias del modelo.
+
+    Args:
+        query: Consulta del modelo (con filtros, orden y límite)
+        model: Clase del modelo
+
+    Returns:
+        list: Filas (tuplas) en el orden de LIST_COLUMNS[model]
+    """
+    columns = [getattr(model, name) for name in LIST_COLUMNS[model]]
+    return query.with_entities(*columns).all()
+
+def rows_to_json(model, rows):
+    """
+    Serializa filas proyectadas con las mismas claves que to_dict().
+
+    Args:
+        model: Clase del modelo
+        rows: Filas devueltas por project_rows
+
+    Returns:
+        bytes: Lista JSON
+    """
+    keys = LIST_KEYS[model]
+    return fast_json.dumps([dict(zip(keys, row)) for row in rows])
+
+def list_response(query, model):
+    """
+    Respuesta JSON de un listado usando la proyección de columnas y el
+    codificador rápido.
+
+    Args:
+        query: Consulta del modelo
+        model: Clase del modelo
+
+    Returns:
+        Response: Respuesta 200 con la lista
+    """
+    body = rows_to_json(model, project_rows(query, model))
+    return current_app.response_class(body, status=200, mimetype='application/json')
@@ -0,0 +1,191 @@
+import time
+import threading
+from flask import request, g
+from sqlalchemy import event
+from .metrics import registry
+
+# Histogramas de número de consultas por petición o trabajo
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000, 20000)
+
+# Longitud máxima de la sentencia mostrada en el registro de consultas lentas
+MAX_LOGGED_STATEMENT = 2000
+
+SLOW_QUERIES = registry.counter(
+    'aureo_db_slow_queries_total', 'Consultas que superan SLOW_QUERY_THRESHOLD_MS', ('kind',))
+REQUEST_DB_QUERIES = registry.histogram(
+    'aureo_http_request_db_queries', 'Consultas SQL por petición', ('endpoint',), QUERY_COUNT_BUCKETS)
+JOB_DB_QUERIES = registry.histogram(
+    'aureo_writer_job_db_queries', 'Consultas SQL por trabajo del hilo escritor', ('job',), QUERY_COUNT_BUCKETS)
+JOB_DB_SECONDS = registry.histogram(
+    'aureo_writer_job_db_seconds', 'Tiempo en la base de datos por trabajo del hilo escritor', ('job',))
+
+# Configuración aplicada por init_query_stats
+slow_query_seconds = 0.2
+explain_slow_queries = True
+
+_local = threading.local()
+
+class QueryStats:
+    """Consultas ejecutadas y tiempo acumulado en la base de datos durante una petición o trabajo"""
+    __slots__ = ('kind', 'context', 'count', 'seconds', 'slow')
+
+    def __init__(self, kind, context):
+        self.kind = kind
+        self.context = context
+        self.count = 0
+        self.seconds = 0.0
+        self.slow = 0
+
+def start_tracking(kind, context):
+    """
+    Empieza a contar las consultas del hilo actual.
+
+    Args:
+        kind: "request" o "job"
+        context: Descripción de lo que se mide (ruta o nombre del trabajo)
+
+    Returns:
+        QueryStats: Contadores que se irán actualizando
+    """
+    stats = QueryStats(kind, context)
+    _local.stats = stats
+    return stats
+
+def stop_tracking():
+    """
+    Deja de contar las consultas del hilo actual.
+
+    Returns:
+        QueryStats: Contadores acumulados (None si no se estaba midiendo)
+    """
+    stats = getattr(_local, 'stats', None)
+    _local.stats = None
+    return stats
+
+def _describe_parameters(parameters, executemany):
+    """Resume los parámetros sin mostrar sus valores (pueden contener datos personales)"""
+    if executemany:
+        return f"{len(parameters)} filas"
+    if not parameters:
+        return "sin parámetros"
+    values = parameters.values() if isinstance(parameters, dict) else parameters
+    return ', '.join(type(value).__name__ for value in values)
+
+def _explain(cursor, statement, parameters):
+    """Obtiene el plan de ejecución de SQLite de una consulta de lectura"""
+    if not statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+    explain_cursor = cursor.connection.cursor()
+    try:
+        explain_cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        return [row[-1] for row in explain_cursor.fetchall()]
+    except Exception as e:
+        return [f"(no disponible: {str(e)})"]
+    finally:
+        explain_cursor.close()
+
+def _log_slow_query(cursor, statement, parameters, executemany, elapsed, dialect, stats):
+    SLOW_QUERIES.inc(1, stats.kind if stats is not None else 'other')
+    context = stats.context if stats is not None else 'sin contexto'
+    text = ' '.join(statement.split())
+    if len(text) > MAX_LOGGED_STATEMENT:
+        text = text[:MAX_LOGGED_STATEMENT] + '...'
+    print(f"Consulta lenta ({elapsed * 1000:.1f} ms) en {context}: {text} "
+          f"[parámetros: {_describe_parameters(parameters, executemany)}]")
+    if explain_slow_queries and not executemany and dialect == 'sqlite':
+        plan = _explain(cursor, statement, parameters)
+        if plan:
+            print("  Plan: " + ' | '.join(plan))
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    stats = getattr(_local, 'stats', None)
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += elapsed
+    if elapsed >= slow_query_seconds:
+        if stats is not None:
+            stats.slow += 1
+        _log_slow_query(cursor, statement, parameters, executemany, elapsed, conn.dialect.name, stats)
+
+def _handle_error(exception_context):
+    # Una sentencia fallida no llega a after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('query_start'):
+        connection.info['query_start'].pop()
+
+def init_query_stats(app, db):
+    """
+    Registra la medición de las consultas SQL en los motores de la aplicación:
+    número de consultas y tiempo por petición (cabecera Server-Timing) y por
+    trabajo del hilo escritor, y registro de las consultas lentas con su plan
+    de ejecución.
+
+    Args:
+        app: Aplicación Flask
+        db: Extensión SQLAlchemy
+    """
+    global slow_query_seconds, explain_slow_queries
+    slow_query_seconds = app.config['SLOW_QUERY_THRESHOLD_MS'] / 1000
+    explain_slow_queries = app.config['SLOW_QUERY_EXPLAIN']
+    query_count_warning = app.config['QUERY_COUNT_WARNING']
+    server_timing = app.config['SERVER_TIMING_ENABLED']
+
+    with app.app_context():
+        for engine in db.engines.values():
+            if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+                event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+                event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+                event.listen(engine, 'handle_error', _handle_error)
+
+    @app.before_request
+    def _start_query_stats():
+        g._request_started = time.perf_counter()
+        start_tracking('request', f"{request.method} {request.path}")
+
+    @app.after_request
+    def _report_query_stats(response):
+        stats = stop_tracking()
+        started = g.pop('_request_started', None)
+        if stats is None or started is None:
+            return response
+
+        endpoint = request.url_rule.endpoint if request.url_rule else 'unmatched'
+        REQUEST_DB_QUERIES.observe(stats.count, endpoint)
+        if query_count_warning and stats.count >= query_count_warning:
+            print(f"Petición con {stats.count} consultas SQL ({stats.seconds * 1000:.1f} ms): {stats.context}")
+
+        if server_timing:
+            total = (time.perf_counter() - started) * 1000
+            db_time = stats.seconds * 1000
+            response.headers.add('Server-Timing', f'db;dur={db_time:.1f};desc="{stats.count} consultas"')
+            response.headers.add('Server-Timing', f'app;dur={max(total - db_time, 0.0):.1f}')
+            response.headers.add('Server-Timing', f'total;dur={total:.1f}')
+        return response
+
+def track_job(job_name, func, *args, **kwargs):
+    """
+    Ejecuta un trabajo contando sus consultas SQL.
+
+    Args:
+        job_name: Nombre del trabajo (etiqueta de las métricas)
+        func: Función a ejecutar
+        *args, **kwargs: Argumentos de la función
+
+    Returns:
+        Resultado de la función
+    """
+    previous = getattr(_local, 'stats', None)
+    stats = start_tracking('job', job_name)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _local.stats = previous
+        JOB_DB_QUERIES.observe(stats.count, job_name)
+        JOB_DB_SECONDS.observe(stats.seconds, job_name)
+        if stats.slow:
+            print(f"Trabajo {job_name}: {stats.count} consultas SQL, {stats.seconds:.2f} s en la base de datos, "
+                  f"{stats.slow} lentas")
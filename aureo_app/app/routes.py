@@ -1,18 +1,38 @@
-from flask import Blueprint, request, jsonify, current_app, send_file
+from flask import Blueprint, request, jsonify, current_app, send_file, Response
 from flask_login import current_user, login_required
-from werkzeug.utils import secure_filename
 import os
 import json
 import time
 import re
 from datetime import datetime, timedelta
-import threading
+import queue
+from sqlalchemy import or_, and_, func
+from sqlalchemy.orm import contains_eager, joinedload
 from . import db
 from .models import User, Store, SystemConfig, FileActivity, ExcelData, PdfDocument
-from .models import WatchlistPerson, WatchlistItem, Alert, SearchHistory
+from .models import WatchlistPerson, WatchlistItem, Alert, AlertGroup, SearchHistory, Person, SearchJob, UploadSession, UploadBatch
 from .auth import authorize
 from .file_processors import process_excel_file, process_pdf_file
 from .file_watcher import init_watchers, start_file_watchers, stop_file_watchers, update_activity_status
+from .search import normalize_search_criteria, execute_search
+from .search_cache import search_cache
+from .data_versions import get_version, bump_version, get_table_version, bump_table_version
+from .http_cache import versioned_json_response
+from .projection import list_response
+from .uploads import (UploadError, resolve_upload_target, unique_upload_path, save_stream, create_upload,
+                      write_chunk, complete_upload, discard_upload, schedule_purge)
+from .pdf_previews import get_thumbnail, get_page_count, normalize_width
+from .bulk_upload import create_batch, dispatch_batch, batch_progress
+from .change_log import get_changes, record_alert_changes, schedule_prune, ENTITY_NAMES
+from .search_jobs import create_search_job, EXPORT_FORMATS
+from .normalization import normalize_name, normalize_id_number
+from .fuzzy_matching import parse_fuzzy_threshold
+from .autocomplete import autocomplete_index, TOP_SIZE
+from .facets import get_facets, record_alert_status_change, FACET_NAMES, ALERT_STATUS_FACET
+from .events import event_bus, format_sse, publish_activity
+from .storage import ingestion_writer
+from .archive import archived_person_transactions, archive_old_rows, archive_years, archive_path
+from .stats import get_stats, record_activity_status_change, record_alert_stats_change, record_alert_group_stats_change, BUCKET_FORMATS
 
 main_bp = Blueprint('main', __name__, url_prefix='/api')
 
@@ -21,22 +41,23 @@ main_bp = Blueprint('main', __name__, url_prefix='/api')
 @login_required
 def get_stores():
     """Obtiene todas las tiendas"""
-    stores = Store.query.all()
-    return jsonify([store.to_dict() for store in stores]), 200
+    return versioned_json_response('store', 'all', lambda: [store.to_dict() for store in Store.query.all()])
 
 @main_bp.route('/stores/excel', methods=['GET'])
 @login_required
 def get_excel_stores():
     """Obtiene todas las tiendas de tipo Excel"""
-    stores = Store.query.filter_by(type='Excel').all()
-    return jsonify([store.to_dict() for store in stores]), 200
+    return versioned_json_response('store', 'excel', lambda: [
+        store.to_dict() for store in Store.query.filter_by(type='Excel').all()
+    ])
 
 @main_bp.route('/stores/pdf', methods=['GET'])
 @login_required
 def get_pdf_stores():
     """Obtiene todas las tiendas de tipo PDF"""
-    stores = Store.query.filter_by(type='PDF').all()
-    return jsonify([store.to_dict() for store in stores]), 200
+    return versioned_json_response('store', 'pdf', lambda: [
+        store.to_dict() for store in Store.query.filter_by(type='PDF').all()
+    ])
 
 @main_bp.route('/stores', methods=['POST'])
 @login_required
@@ -148,22 +169,21 @@ def get_file_activities():
     """Obtiene las actividades de archivos recientes"""
     limit = request.args.get('limit', 20, type=int)
     
-    activities = FileActivity.query.order_by(FileActivity.upload_date.desc()).limit(limit).all()
-    return jsonify([activity.to_dict() for activity in activities]), 200
+    return list_response(FileActivity.query.order_by(FileActivity.upload_date.desc()).limit(limit), FileActivity)
 
 @main_bp.route('/file-activities/store/<store_code>', methods=['GET'])
 @login_required
 def get_store_file_activities(store_code):
     """Obtiene actividades de archivos para una tienda específica"""
-    activities = FileActivity.query.filter_by(store_code=store_code).order_by(FileActivity.upload_date.desc()).all()
-    return jsonify([activity.to_dict() for activity in activities]), 200
+    query = FileActivity.query.filter_by(store_code=store_code).order_by(FileActivity.upload_date.desc())
+    return list_response(query, FileActivity)
 
 @main_bp.route('/file-activities/pending-store-assignment', methods=['GET'])
 @login_required
 def get_pending_store_assignments():
     """Obtiene actividades de archivos pendientes de asignación de tienda"""
-    activities = FileActivity.query.filter_by(status='PendingStoreAssignment').order_by(FileActivity.upload_date.desc()).all()
-    return jsonify([activity.to_dict() for activity in activities]), 200
+    query = FileActivity.query.filter_by(status='PendingStoreAssignment').order_by(FileActivity.upload_date.desc())
+    return list_response(query, FileActivity)
 
 @main_bp.route('/file-activities/<int:id>/assign-store', methods=['POST'])
 @login_required
@@ -190,17 +210,19 @@ def assign_store_to_activity(id):
         return jsonify({'error': f'Tipo de tienda ({store.type}) no coincide con tipo de archivo ({activity.file_type})'}), 400
     
     # Actualizar actividad
+    record_activity_status_change(activity.status, 'Pending')
     activity.store_code = store_code
     activity.status = 'Pending'
     activity.processed_by = current_user.id
     
     db.session.commit()
+    publish_activity(activity)
     
-    # Iniciar procesamiento en un hilo separado
+    # Encolar el procesamiento en el hilo escritor de la ingesta
     if activity.file_type == 'Excel':
-        threading.Thread(target=process_excel_file, args=(activity.id,)).start()
+        ingestion_writer.submit(process_excel_file, activity.id)
     else:  # PDF
-        threading.Thread(target=process_pdf_file, args=(activity.id,)).start()
+        ingestion_writer.submit(process_pdf_file, activity.id)
     
     return jsonify(activity.to_dict()), 200
 
@@ -209,8 +231,8 @@ def assign_store_to_activity(id):
 @login_required
 def get_excel_data_by_store(store_code):
     """Obtiene datos Excel para una tienda específica"""
-    excel_data = ExcelData.query.filter_by(store_code=store_code).order_by(ExcelData.order_date.desc()).all()
-    return jsonify([data.to_dict() for data in excel_data]), 200
+    query = ExcelData.query.filter_by(store_code=store_code).order_by(ExcelData.order_date.desc())
+    return list_response(query, ExcelData)
 
 @main_bp.route('/excel-data/<int:id>', methods=['GET'])
 @login_required
@@ -222,13 +244,143 @@ def get_excel_data(id):
     
     return jsonify(data.to_dict()), 200
 
+# Rutas para trabajos de búsqueda en segundo plano
+@main_bp.route('/search-jobs', methods=['POST'])
+@login_required
+def submit_search_job():
+    """Encola una búsqueda para ejecutarla en segundo plano y exportar el resultado"""
+    data = request.json or {}
+    
+    export_format = data.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'Formato no soportado: {export_format}'}), 400
+    
+    try:
+        criteria = normalize_search_criteria(data.get('criteria', data))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    job = create_search_job(current_user.id, criteria, export_format)
+    return jsonify(job.to_dict()), 202
+
+@main_bp.route('/search-jobs', methods=['GET'])
+@login_required
+def get_search_jobs():
+    """Obtiene los trabajos de búsqueda del usuario actual"""
+    limit = request.args.get('limit', 20, type=int)
+    
+    jobs = SearchJob.query.filter_by(user_id=current_user.id).order_by(SearchJob.created_date.desc()).limit(limit).all()
+    return jsonify([job.to_dict() for job in jobs]), 200
+
+def _get_own_search_job(id):
+    """Obtiene un trabajo de búsqueda si pertenece al usuario actual (o es administrador)"""
+    job = SearchJob.query.get(id)
+    if not job:
+        return None
+    if job.user_id != current_user.id and current_user.role not in ['SuperAdmin', 'Admin']:
+        return None
+    return job
+
+@main_bp.route('/search-jobs/<id>', methods=['GET'])
+@login_required
+def get_search_job(id):
+    """Obtiene el estado de un trabajo de búsqueda"""
+    job = _get_own_search_job(id)
+    if not job:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    
+    return jsonify(job.to_dict()), 200
+
+@main_bp.route('/search-jobs/<id>/download', methods=['GET'])
+@login_required
+def download_search_job(id):
+    """Descarga el archivo generado por un trabajo de búsqueda"""
+    job = _get_own_search_job(id)
+    if not job:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    
+    if job.status != 'Completed':
+        return jsonify({'error': f'El trabajo no ha finalizado (estado: {job.status})'}), 409
+    
+    if not job.file_path or not os.path.exists(job.file_path):
+        return jsonify({'error': 'Archivo no encontrado en el sistema'}), 404
+    
+    download_name = f"busqueda_{job.created_date.strftime('%Y%m%d%H%M%S')}{EXPORT_FORMATS[job.format]}"
+    return send_file(job.file_path, as_attachment=True, download_name=download_name)
+
+@main_bp.route('/autocomplete', methods=['GET'])
+@login_required
+def autocomplete():
+    """Obtiene sugerencias de búsqueda para un texto parcial"""
+    text = request.args.get('q', '')
+    limit = min(request.args.get('limit', 10, type=int), TOP_SIZE)
+    fields = request.args.get('fields')
+    fields = [field.strip() for field in fields.split(',')] if fields else None
+    
+    if not text.strip():
+        return jsonify([]), 200
+    
+    return jsonify(autocomplete_index.suggest(text, fields=fields, limit=limit)), 200
+
+# Rutas para personas (DNI/NIE)
+@main_bp.route('/persons/<person_ref>/timeline', methods=['GET'])
+@login_required
+def get_person_timeline(person_ref):
+    """Obtiene todas las operaciones y alertas de una persona en todas las tiendas"""
+    if person_ref.isdigit():
+        person = Person.query.get(int(person_ref))
+    else:
+        id_number = normalize_id_number(person_ref)
+        if not id_number:
+            return jsonify({'error': 'DNI/NIE no válido'}), 400
+        person = Person.query.filter_by(id_number=id_number).first()
+    
+    if not person:
+        return jsonify({'error': 'Persona no encontrada'}), 404
+    
+    # Una sola consulta por el índice de person_id, con las alertas en el mismo JOIN
+    rows = db.session.query(ExcelData, Alert).outerjoin(
+        Alert, Alert.excel_data_id == ExcelData.id
+    ).filter(
+        ExcelData.person_id == person.id
+    ).order_by(ExcelData.order_date.desc(), ExcelData.id.desc(), Alert.id).all()
+    
+    transactions = []
+    by_id = {}
+    for excel_data, alert in rows:
+        entry = by_id.get(excel_data.id)
+        if entry is None:
+            entry = excel_data.to_dict()
+            entry['alerts'] = []
+            by_id[excel_data.id] = entry
+            transactions.append(entry)
+        if alert is not None:
+            entry['alerts'].append(alert.to_dict())
+    
+    # Operaciones antiguas en las bases de archivo (nunca tienen alertas)
+    archived = archived_person_transactions(person.id)
+    if archived:
+        for excel_data in archived:
+            entry = excel_data.to_dict()
+            entry['alerts'] = []
+            entry['archived'] = True
+            transactions.append(entry)
+        transactions.sort(key=lambda entry: (entry['orderDate'] or '', entry['id']), reverse=True)
+    
+    return jsonify({
+        'person': person.to_dict(),
+        'transactions': transactions,
+        'stores': sorted({entry['storeCode'] for entry in transactions}),
+        'alertCount': sum(len(entry['alerts']) for entry in transactions)
+    }), 200
+
 # Rutas para documentos PDF
 @main_bp.route('/pdf-documents/store/<store_code>', methods=['GET'])
 @login_required
 def get_pdf_documents_by_store(store_code):
     """Obtiene documentos PDF para una tienda específica"""
-    documents = PdfDocument.query.filter_by(store_code=store_code).order_by(PdfDocument.upload_date.desc()).all()
-    return jsonify([doc.to_dict() for doc in documents]), 200
+    query = PdfDocument.query.filter_by(store_code=store_code).order_by(PdfDocument.upload_date.desc())
+    return list_response(query, PdfDocument)
 
 @main_bp.route('/pdf-documents/<int:id>', methods=['GET'])
 @login_required
@@ -252,7 +404,50 @@ def view_pdf_document(id):
     if not os.path.exists(document.path):
         return jsonify({'error': 'Archivo no encontrado en el sistema'}), 404
     
-    return send_file(document.path, mimetype='application/pdf')
+    # Peticiones condicionales (ETag/If-Modified-Since) y por rangos (visores que leen por partes)
+    response = send_file(document.path, mimetype='application/pdf', conditional=True, etag=True, max_age=0)
+    response.accept_ranges = 'bytes'
+    response.cache_control.private = True
+    response.cache_control.public = None
+    return response
+
+@main_bp.route('/pdf-documents/<int:id>/pages', methods=['GET'])
+@login_required
+def get_pdf_document_pages(id):
+    """Obtiene el número de páginas de un documento PDF"""
+    document = PdfDocument.query.get(id)
+    if not document:
+        return jsonify({'error': 'Documento no encontrado'}), 404
+    if not os.path.exists(document.path):
+        return jsonify({'error': 'Archivo no encontrado en el sistema'}), 404
+    
+    return jsonify({'id': document.id, 'pageCount': get_page_count(document.path)}), 200
+
+@main_bp.route('/pdf-documents/<int:id>/pages/<int:page>/thumbnail', methods=['GET'])
+@login_required
+def get_pdf_page_thumbnail(id, page):
+    """Obtiene la miniatura PNG de una página (?width=), renderizada una sola vez"""
+    document = PdfDocument.query.get(id)
+    if not document:
+        return jsonify({'error': 'Documento no encontrado'}), 404
+    if not os.path.exists(document.path):
+        return jsonify({'error': 'Archivo no encontrado en el sistema'}), 404
+    
+    width = normalize_width(request.args.get('width', type=int))
+    try:
+        thumbnail_path = get_thumbnail(document, page, width)
+    except IndexError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        return jsonify({'error': f'No se pudo generar la miniatura: {str(e)}'}), 500
+    
+    # El nombre de la miniatura incluye la marca del PDF: su contenido no cambia y sirve de ETag
+    etag = os.path.splitext(os.path.basename(thumbnail_path))[0]
+    response = send_file(thumbnail_path, mimetype='image/png', conditional=True, etag=etag,
+                         max_age=current_app.config['THUMBNAIL_MAX_AGE'])
+    response.cache_control.private = True
+    response.cache_control.public = None
+    return response
 
 # Ruta para búsqueda de datos Excel
 @main_bp.route('/excel-data/search', methods=['POST'])
@@ -270,133 +465,48 @@ def search_excel_data():
         )
         db.session.add(search_entry)
         db.session.commit()
-    
-    # Construir consulta
-    query_text = data.get('query', '')
-    store_code = data.get('storeCode')
-    date_from = data.get('dateFrom')
-    date_to = data.get('dateTo')
-    order_number = data.get('orderNumber')
-    customer_name = data.get('customerName')
-    customer_contact = data.get('customerContact')
-    item_details = data.get('itemDetails')
-    metals = data.get('metals')
-    price = data.get('price')
-    price_operator = data.get('priceOperator', '=')
-    only_alerts = data.get('onlyAlerts', False)
+        autocomplete_index.add_query(data['query'])
     
     try:
-        # Usar SQLite directamente para controlar la construcción de la consulta
-        # Esta parte es crítica para permitir búsquedas más flexibles
-        
-        sql_query = """
-        SELECT e.* FROM excel_data e
-        """
-        
-        # Si solo queremos registros con alertas, hacemos un JOIN
-        if only_alerts:
-            sql_query += """
-            JOIN alerts a ON e.id = a.excel_data_id
-            """
-        
-        # Construir WHERE
-        conditions = []
-        params = {}
-        
-        if store_code:
-            conditions.append("e.store_code = :store_code")
-            params['store_code'] = store_code
-        
-        if date_from:
-            conditions.append("e.order_date >= :date_from")
-            params['date_from'] = datetime.fromisoformat(date_from)
-        
-        if date_to:
-            conditions.append("e.order_date <= :date_to")
-            params['date_to'] = datetime.fromisoformat(date_to)
-        
-        if order_number:
-            conditions.append("e.order_number LIKE :order_number")
-            params['order_number'] = f"%{order_number}%"
-        
-        if customer_name:
-            conditions.append("e.customer_name LIKE :customer_name")
-            params['customer_name'] = f"%{customer_name}%"
-        
-        if customer_contact:
-            conditions.append("e.customer_contact LIKE :customer_contact")
-            params['customer_contact'] = f"%{customer_contact}%"
-        
-        if item_details:
-            conditions.append("e.item_details LIKE :item_details")
-            params['item_details'] = f"%{item_details}%"
-        
-        if metals:
-            conditions.append("e.metals LIKE :metals")
-            params['metals'] = f"%{metals}%"
-        
-        # Manejo especial para búsqueda de precio
-        # Esto es complejo porque el campo price es un string pero queremos compararlo como número
-        if price:
-            # Función para determinar si un string es numérico
-            def is_numeric_string(value):
-                return re.match(r'^[0-9]+(\.[0-9]+)?$', value) is not None
-            
-            # Usar CASE WHEN para manejar valores numéricos y no numéricos en SQLite
-            # SQLite no tiene REGEXP nativo, usamos LIKE para una aproximación
-            price_condition = f"""
-            CASE 
-                WHEN (e.price GLOB '*[0-9]*' AND 
-                     e.price NOT GLOB '*[a-zA-Z]*' AND 
-                     (e.price GLOB '*.*' OR e.price NOT GLOB '*.*')) THEN 
-                    CAST(e.price AS REAL) {price_operator} :price_value
-                ELSE 0
-            END
-            """
-            
-            conditions.append(price_condition)
-            params['price_value'] = float(price)
-        
-        # Búsqueda general de texto
-        if query_text:
-            # Escapar caracteres especiales en el patrón de búsqueda
-            def escape_like_pattern(pattern):
-                return pattern.replace('%', '\\%').replace('_', '\\_')
-            
-            escaped_query = escape_like_pattern(query_text)
-            text_conditions = []
-            
-            # Campos de texto donde buscar
-            text_fields = ['order_number', 'customer_name', 'customer_contact', 
-                          'customer_address', 'customer_location', 'item_details', 
-                          'metals', 'engravings', 'stones']
-            
-            for field in text_fields:
-                text_conditions.append(f"e.{field} LIKE :query_text")
-            
-            conditions.append("(" + " OR ".join(text_conditions) + ")")
-            params['query_text'] = f"%{escaped_query}%"
-        
-        # Unir todas las condiciones
-        if conditions:
-            sql_query += " WHERE " + " AND ".join(conditions)
-        
-        # Ordenar por fecha de forma descendente
-        sql_query += " ORDER BY e.order_date DESC"
-        
-        # Ejecutar la consulta
-        result = db.session.execute(sql_query, params)
-        records = [dict(row) for row in result]
-        
-        return jsonify({
+        criteria = normalize_search_criteria(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    facets = sorted(set(data.get('facets') or []))
+    unknown_facets = [facet for facet in facets if facet not in FACET_NAMES]
+    if unknown_facets:
+        return jsonify({'error': f'Facetas no válidas: {unknown_facets}'}), 400
+    
+    # La clave incluye la versión de los datos: cualquier ingesta, en cualquier proceso, invalida las entradas previas
+    cache_key = (json.dumps(criteria, sort_keys=True), tuple(facets), get_version('excel_data'),
+                 get_version('alert') if ALERT_STATUS_FACET in facets else None)
+    
+    def run_search():
+        records = execute_search(criteria)
+        response = {
             'results': records,
             'count': len(records),
             'searchType': 'advanced'
-        }), 200
-        
+        }
+        if facets:
+            response['facets'] = get_facets(criteria, facets)
+        return current_app.json.dumps(response)
+    
+    try:
+        body = search_cache.get_or_compute(cache_key, run_search)
+        return current_app.response_class(body, status=200, mimetype='application/json')
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@main_bp.route('/excel-data/search/cache-stats', methods=['GET'])
+@login_required
+@authorize(['SuperAdmin', 'Admin'])
+def get_search_cache_stats():
+    """Obtiene los contadores de la caché de resultados de búsqueda"""
+    stats = search_cache.stats()
+    stats['dataVersion'] = get_table_version('excel_data')
+    return jsonify(stats), 200
+
 # Rutas para carga de archivos
 @main_bp.route('/upload', methods=['POST'])
 @login_required
@@ -408,44 +518,32 @@ def upload_file():
     file = request.files['file']
     store_code = request.form.get('storeCode')
     
-    if not file.filename or file.filename == '':
-        return jsonify({'error': 'Nombre de archivo no válido'}), 400
-    
-    if not store_code:
-        return jsonify({'error': 'No se proporcionó código de tienda'}), 400
-    
-    # Verificar que la tienda existe
-    store = Store.query.filter_by(code=store_code).first()
-    if not store:
-        return jsonify({'error': 'Tienda no encontrada'}), 404
-    
-    # Verificar tipo de archivo
-    filename = secure_filename(file.filename)
-    file_extension = os.path.splitext(filename)[1].lower()
-    
-    if file_extension in ['.xlsx', '.xls', '.xlsm']:
-        file_type = 'Excel'
-        upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'excel')
-    elif file_extension == '.pdf':
-        file_type = 'PDF'
-        upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'pdf')
-    else:
-        return jsonify({'error': 'Tipo de archivo no soportado'}), 400
-    
-    # Verificar que el tipo de tienda coincide
-    if store.type != file_type:
-        return jsonify({'error': f'La tienda es de tipo {store.type}, pero el archivo es {file_type}'}), 400
-    
-    # Crear directorio si no existe
-    os.makedirs(upload_dir, exist_ok=True)
+    try:
+        filename, file_type, upload_dir = resolve_upload_target(file.filename, store_code)
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
     
     # Guardar el archivo con timestamp
-    timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-    new_filename = f"{timestamp}_{filename}"
-    file_path = os.path.join(upload_dir, new_filename)
-    file.save(file_path)
+    file_path = unique_upload_path(upload_dir, filename)
+    _, content_hash = save_stream(file.stream, file_path)
     
-    # Crear registro de actividad
+    activity = register_uploaded_file(filename, file_path, store_code, file_type, content_hash)
+    return jsonify({'message': 'Archivo cargado correctamente', 'activity': activity.to_dict()}), 201
+
+def register_uploaded_file(filename, file_path, store_code, file_type, content_hash=None):
+    """
+    Crea la actividad de un archivo cargado y encola su procesamiento.
+    
+    Args:
+        filename: Nombre original (seguro) del archivo
+        file_path: Ruta donde está guardado
+        store_code: Código de la tienda
+        file_type: "Excel" o "PDF"
+        content_hash: SHA-256 del archivo (opcional)
+    
+    Returns:
+        FileActivity: Actividad creada
+    """
     activity = FileActivity(
         filename=filename,
         saved_path=file_path,
@@ -454,27 +552,194 @@ def upload_file():
         file_type=file_type,
         status='Pending',
         upload_date=datetime.utcnow(),
-        processed_by=current_user.id
+        processed_by=current_user.id,
+        content_hash=content_hash
     )
     
     db.session.add(activity)
     db.session.commit()
+    publish_activity(activity)
     
-    # Iniciar procesamiento en un hilo separado
+    # Encolar el procesamiento en el hilo escritor de la ingesta
     if file_type == 'Excel':
-        threading.Thread(target=process_excel_file, args=(activity.id,)).start()
+        ingestion_writer.submit(process_excel_file, activity.id)
     else:  # PDF
-        threading.Thread(target=process_pdf_file, args=(activity.id,)).start()
+        ingestion_writer.submit(process_pdf_file, activity.id)
     
-    return jsonify({'message': 'Archivo cargado correctamente', 'activity': activity.to_dict()}), 201
+    return activity
+
+# Cargas por fragmentos (reanudables)
+def _get_own_upload(upload_id):
+    """Obtiene una carga en curso si pertenece al usuario actual"""
+    upload = UploadSession.query.get(upload_id)
+    if not upload or upload.user_id != current_user.id:
+        return None
+    return upload
+
+@main_bp.route('/uploads', methods=['POST'])
+@login_required
+def create_chunked_upload():
+    """
+    Inicia una carga por fragmentos.
+    
+    Cuerpo: {"filename", "storeCode", "size", "sha256" (opcional)}
+    """
+    data = request.json or {}
+    schedule_purge()
+    
+    try:
+        upload = create_upload(current_user.id, data.get('filename'), data.get('storeCode'),
+                               data.get('size'), data.get('sha256'))
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+    
+    result = upload.to_dict()
+    result['chunkSize'] = current_app.config['UPLOAD_MAX_CHUNK_SIZE']
+    return jsonify(result), 201
+
+@main_bp.route('/uploads/<upload_id>', methods=['GET'])
+@login_required
+def get_chunked_upload(upload_id):
+    """Obtiene el estado de una carga (posición desde la que reanudar)"""
+    upload = _get_own_upload(upload_id)
+    if not upload:
+        return jsonify({'error': 'Carga no encontrada'}), 404
+    return jsonify(upload.to_dict()), 200
+
+@main_bp.route('/uploads/<upload_id>', methods=['PUT'])
+@login_required
+def put_upload_chunk(upload_id):
+    """Recibe un fragmento en bruto en la posición indicada (?offset=)"""
+    upload = _get_own_upload(upload_id)
+    if not upload:
+        return jsonify({'error': 'Carga no encontrada'}), 404
+    
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({'error': 'Se requiere el parámetro offset'}), 400
+    
+    try:
+        received = write_chunk(upload, offset, request.stream, request.content_length)
+    except UploadError as e:
+        return jsonify({'error': str(e), 'offset': upload.received_bytes}), e.status
+    
+    return jsonify({'uploadId': upload.id, 'offset': received, 'totalSize': upload.total_size}), 200
+
+@main_bp.route('/uploads/<upload_id>/complete', methods=['POST'])
+@login_required
+def complete_chunked_upload(upload_id):
+    """Finaliza una carga: verifica tamaño y hash, crea la actividad y encola el procesamiento"""
+    upload = _get_own_upload(upload_id)
+    if not upload:
+        return jsonify({'error': 'Carga no encontrada'}), 404
+    
+    filename, store_code, file_type = upload.filename, upload.store_code, upload.file_type
+    try:
+        file_path, content_hash = complete_upload(upload)
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+    
+    if file_type == 'ZIP':
+        # Un ZIP se procesa como carga masiva y después se elimina
+        try:
+            batch = create_batch(current_user.id, [(filename, file_path)], store_code)
+        except UploadError as e:
+            return jsonify({'error': str(e)}), e.status
+        finally:
+            os.remove(file_path)
+        dispatch_batch(batch.id)
+        return jsonify({'message': 'Carga masiva registrada', 'batch': batch_progress(batch), 'sha256': content_hash}), 201
+    
+    activity = register_uploaded_file(filename, file_path, store_code, file_type, content_hash)
+    return jsonify({
+        'message': 'Archivo cargado correctamente',
+        'activity': activity.to_dict(),
+        'sha256': content_hash
+    }), 201
+
+@main_bp.route('/uploads/<upload_id>', methods=['DELETE'])
+@login_required
+def abort_chunked_upload(upload_id):
+    """Cancela una carga y elimina lo recibido"""
+    upload = _get_own_upload(upload_id)
+    if not upload:
+        return jsonify({'error': 'Carga no encontrada'}), 404
+    
+    discard_upload(upload)
+    db.session.commit()
+    return jsonify({'message': 'Carga cancelada'}), 200
+
+# Cargas masivas (varios archivos o ZIP)
+@main_bp.route('/upload-batches', methods=['POST'])
+@login_required
+def create_upload_batch():
+    """
+    Carga varios archivos Excel/PDF o ZIP en una sola petición (campo "files").
+    La tienda de cada archivo se obtiene de su nombre; "storeCode" es opcional
+    y se usa para los archivos cuyo nombre no la identifica.
+    """
+    files = request.files.getlist('files')
+    if not files:
+        return jsonify({'error': 'No se proporcionaron archivos'}), 400
+    
+    try:
+        batch = create_batch(current_user.id, [(f.filename, f.stream) for f in files],
+                             request.form.get('storeCode'))
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+    
+    dispatch_batch(batch.id)
+    return jsonify(batch_progress(batch)), 201
+
+@main_bp.route('/upload-batches/<int:id>', methods=['GET'])
+@login_required
+def get_upload_batch(id):
+    """Obtiene el progreso agregado de una carga masiva"""
+    batch = UploadBatch.query.get(id)
+    if not batch:
+        return jsonify({'error': 'Carga no encontrada'}), 404
+    return jsonify(batch_progress(batch)), 200
+
+@main_bp.route('/upload-batches/<int:id>/activities', methods=['GET'])
+@login_required
+def get_upload_batch_activities(id):
+    """Obtiene las actividades de una carga masiva"""
+    query = FileActivity.query.filter_by(batch_id=id).order_by(FileActivity.id)
+    return list_response(query, FileActivity)
+
+# Rutas para el archivo histórico
+@main_bp.route('/archive', methods=['GET'])
+@login_required
+@authorize(['SuperAdmin', 'Admin'])
+def get_archives():
+    """Obtiene los años archivados y el tamaño de sus bases"""
+    archives = []
+    for year in archive_years():
+        path = archive_path(year)
+        archives.append({'year': year, 'fileSize': os.path.getsize(path)})
+    return jsonify(archives), 200
+
+@main_bp.route('/archive/run', methods=['POST'])
+@login_required
+@authorize(['SuperAdmin'])
+def run_archive():
+    """Encola el archivado de los registros antiguos en el hilo escritor"""
+    data = request.json or {}
+    days = data.get('days')
+    if days is not None and (not isinstance(days, int) or days < 1):
+        return jsonify({'error': 'El número de días debe ser un entero positivo'}), 400
+    
+    ingestion_writer.submit(archive_old_rows, days)
+    return jsonify({'message': 'Archivado encolado'}), 202
 
 # Rutas para configuración del sistema
 @main_bp.route('/system-config', methods=['GET'])
 @login_required
 def get_system_configs():
     """Obtiene todas las configuraciones del sistema"""
-    configs = SystemConfig.query.all()
-    return jsonify([config.to_dict() for config in configs]), 200
+    return versioned_json_response('system_config', 'all', lambda: [
+        config.to_dict() for config in SystemConfig.query.all()
+    ])
 
 @main_bp.route('/system-config/<key>', methods=['GET'])
 @login_required
@@ -602,12 +867,14 @@ def get_watchlist_persons():
     """Obtiene personas en la lista de vigilancia"""
     include_inactive = request.args.get('includeInactive', 'false').lower() == 'true'
     
-    if include_inactive:
-        persons = WatchlistPerson.query.all()
-    else:
-        persons = WatchlistPerson.query.filter_by(active=True).all()
+    def build():
+        if include_inactive:
+            persons = WatchlistPerson.query.all()
+        else:
+            persons = WatchlistPerson.query.filter_by(active=True).all()
+        return [person.to_dict() for person in persons]
     
-    return jsonify([person.to_dict() for person in persons]), 200
+    return versioned_json_response('watchlist_person', 'all' if include_inactive else 'active', build)
 
 @main_bp.route('/watchlist/persons', methods=['POST'])
 @login_required
@@ -616,10 +883,17 @@ def create_watchlist_person():
     """Añade una persona a la lista de vigilancia"""
     data = request.json
     
+    try:
+        fuzzy_threshold = parse_fuzzy_threshold(data.get('fuzzyThreshold'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     person = WatchlistPerson(
         name=data['name'],
+        name_norm=normalize_name(data['name']),
         id_number=data.get('idNumber'),
         description=data.get('description'),
+        fuzzy_threshold=fuzzy_threshold,
         created_by=current_user.id,
         active=data.get('active', True)
     )
@@ -640,12 +914,21 @@ def update_watchlist_person(id):
     
     data = request.json
     
+    if 'fuzzyThreshold' in data:
+        try:
+            fuzzy_threshold = parse_fuzzy_threshold(data['fuzzyThreshold'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    
     if 'name' in data:
         person.name = data['name']
+        person.name_norm = normalize_name(data['name'])
     if 'idNumber' in data:
         person.id_number = data['idNumber']
     if 'description' in data:
         person.description = data['description']
+    if 'fuzzyThreshold' in data:
+        person.fuzzy_threshold = fuzzy_threshold
     if 'active' in data:
         person.active = data['active']
     
@@ -673,12 +956,14 @@ def get_watchlist_items():
     """Obtiene elementos en la lista de vigilancia"""
     include_inactive = request.args.get('includeInactive', 'false').lower() == 'true'
     
-    if include_inactive:
-        items = WatchlistItem.query.all()
-    else:
-        items = WatchlistItem.query.filter_by(active=True).all()
+    def build():
+        if include_inactive:
+            items = WatchlistItem.query.all()
+        else:
+            items = WatchlistItem.query.filter_by(active=True).all()
+        return [item.to_dict() for item in items]
     
-    return jsonify([item.to_dict() for item in items]), 200
+    return versioned_json_response('watchlist_item', 'all' if include_inactive else 'active', build)
 
 @main_bp.route('/watchlist/items', methods=['POST'])
 @login_required
@@ -738,6 +1023,20 @@ def delete_watchlist_item(id):
     
     return jsonify({'message': 'Elemento eliminado correctamente'}), 200
 
+# Rutas para estadísticas del panel principal
+@main_bp.route('/stats', methods=['GET'])
+@login_required
+def get_dashboard_stats():
+    """Obtiene los contadores y las series por tienda del panel principal"""
+    days = min(max(request.args.get('days', 30, type=int), 1), 3660)
+    bucket = request.args.get('bucket', 'day')
+    store_code = request.args.get('storeCode')
+    
+    if bucket not in BUCKET_FORMATS:
+        return jsonify({'error': f"Agrupación no válida. Valores permitidos: {', '.join(BUCKET_FORMATS)}"}), 400
+    
+    return jsonify(get_stats(days, bucket, store_code)), 200
+
 # Rutas para alertas
 @main_bp.route('/alerts', methods=['GET'])
 @login_required
@@ -751,8 +1050,74 @@ def get_alerts():
     if status:
         query = query.filter_by(status=status)
     
-    alerts = query.order_by(Alert.alert_date.desc()).limit(limit).all()
-    return jsonify([alert.to_dict() for alert in alerts]), 200
+    return list_response(query.order_by(Alert.alert_date.desc()).limit(limit), Alert)
+
+@main_bp.route('/alerts/expanded', methods=['GET'])
+@login_required
+def get_alerts_expanded():
+    """
+    Obtiene alertas con su registro Excel, el elemento vigilado y la tienda en
+    una sola consulta, con paginación por cursor (fecha de alerta, id).
+    """
+    status = request.args.get('status')
+    store_code = request.args.get('storeCode')
+    date_from = request.args.get('dateFrom')
+    date_to = request.args.get('dateTo')
+    cursor = request.args.get('cursor')
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    
+    query = db.session.query(Alert, Store).join(Alert.excel_data).outerjoin(
+        Store, Store.code == ExcelData.store_code
+    ).options(
+        contains_eager(Alert.excel_data),
+        joinedload(Alert.watchlist_person),
+        joinedload(Alert.watchlist_item)
+    )
+    
+    try:
+        if status:
+            query = query.filter(Alert.status == status)
+        if store_code:
+            query = query.filter(ExcelData.store_code == store_code)
+        if date_from:
+            query = query.filter(Alert.alert_date >= datetime.fromisoformat(date_from))
+        if date_to:
+            query = query.filter(Alert.alert_date <= datetime.fromisoformat(date_to))
+        
+        # El cursor es la fecha e id de la última alerta de la página anterior
+        if cursor:
+            cursor_date, cursor_id = cursor.rsplit('_', 1)
+            cursor_date = datetime.fromisoformat(cursor_date)
+            cursor_id = int(cursor_id)
+            query = query.filter(or_(
+                Alert.alert_date < cursor_date,
+                and_(Alert.alert_date == cursor_date, Alert.id < cursor_id)
+            ))
+    except ValueError:
+        return jsonify({'error': 'Parámetros de filtro o cursor no válidos'}), 400
+    
+    rows = query.order_by(Alert.alert_date.desc(), Alert.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    alerts = []
+    for alert, store in rows:
+        entry = alert.to_dict()
+        entry['excelData'] = alert.excel_data.to_dict()
+        entry['watchlistPerson'] = alert.watchlist_person.to_dict() if alert.watchlist_person else None
+        entry['watchlistItem'] = alert.watchlist_item.to_dict() if alert.watchlist_item else None
+        entry['store'] = store.to_dict() if store else None
+        alerts.append(entry)
+    
+    next_cursor = None
+    if has_more and rows:
+        last_alert = rows[-1][0]
+        next_cursor = f"{last_alert.alert_date.isoformat()}_{last_alert.id}"
+    
+    return jsonify({
+        'alerts': alerts,
+        'nextCursor': next_cursor
+    }), 200
 
 @main_bp.route('/alerts/<int:id>', methods=['GET'])
 @login_required
@@ -775,14 +1140,49 @@ def review_alert(id):
     
     data = request.json
     
-    alert.status = data.get('status', 'Reviewed')
+    new_status = data.get('status', 'Reviewed')
+    record_alert_status_change(alert.status, new_status)
+    record_alert_stats_change(alert.status, new_status)
+    
+    alert.status = new_status
     alert.reviewed_by = current_user.id
     alert.review_notes = data.get('notes')
     
+    if alert.group:
+        refresh_alert_group_status(alert.group)
+    
     db.session.commit()
+    bump_version('alert')
     
     return jsonify(alert.to_dict()), 200
 
+def refresh_alert_group_status(group):
+    """
+    Recalcula el estado de un grupo tras revisar una de sus alertas: sigue
+    pendiente mientras quede alguna alerta pendiente; si no, queda descartado
+    cuando todas lo están y revisado en otro caso.
+    
+    Args:
+        group: AlertGroup de la alerta revisada
+    """
+    statuses = {status for (status,) in db.session.query(Alert.status).filter(
+        Alert.group_id == group.id
+    ).distinct()}
+    if 'Pending' in statuses:
+        new_status = 'Pending'
+    elif statuses == {'Dismissed'}:
+        new_status = 'Dismissed'
+    else:
+        new_status = 'Reviewed'
+    
+    if new_status == group.status:
+        return
+    record_alert_group_stats_change(group.status, new_status)
+    group.status = new_status
+    if new_status != 'Pending':
+        group.reviewed_by = current_user.id
+        group.review_date = datetime.utcnow()
+
 @main_bp.route('/alerts/by-excel-data/<int:excel_data_id>', methods=['GET'])
 @login_required
 def get_alerts_by_excel_data(excel_data_id):
@@ -790,6 +1190,98 @@ def get_alerts_by_excel_data(excel_data_id):
     alerts = Alert.query.filter_by(excel_data_id=excel_data_id).all()
     return jsonify([alert.to_dict() for alert in alerts]), 200
 
+# Rutas para grupos de alertas
+@main_bp.route('/alert-groups', methods=['GET'])
+@login_required
+def get_alert_groups():
+    """Obtiene los grupos de alertas (elemento vigilado y archivo) según estado y límite"""
+    status = request.args.get('status')
+    file_activity_id = request.args.get('fileActivityId', type=int)
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    
+    query = AlertGroup.query
+    
+    if status:
+        query = query.filter(AlertGroup.status == status)
+    if file_activity_id:
+        query = query.filter(AlertGroup.file_activity_id == file_activity_id)
+    
+    groups = query.order_by(AlertGroup.last_alert_date.desc(), AlertGroup.id.desc()).limit(limit).all()
+    return jsonify([group.to_dict() for group in groups]), 200
+
+@main_bp.route('/alert-groups/<int:id>', methods=['GET'])
+@login_required
+def get_alert_group(id):
+    """Obtiene un grupo de alertas con sus alertas"""
+    group = AlertGroup.query.get(id)
+    if not group:
+        return jsonify({'error': 'Grupo de alertas no encontrado'}), 404
+    
+    result = group.to_dict()
+    result['alerts'] = [alert.to_dict() for alert in group.alerts]
+    return jsonify(result), 200
+
+@main_bp.route('/alert-groups/<int:id>/review', methods=['POST'])
+@login_required
+@authorize(['SuperAdmin', 'Admin'])
+def review_alert_group(id):
+    """Marca como revisadas todas las alertas de un grupo en una sola operación"""
+    group = AlertGroup.query.get(id)
+    if not group:
+        return jsonify({'error': 'Grupo de alertas no encontrado'}), 404
+    
+    data = request.json or {}
+    new_status = data.get('status', 'Reviewed')
+    notes = data.get('notes')
+    
+    # Ajustar la faceta de estado según el estado actual de las alertas del grupo
+    status_counts = db.session.query(Alert.status, func.count()).filter(
+        Alert.group_id == group.id
+    ).group_by(Alert.status).all()
+    for old_status, count in status_counts:
+        record_alert_status_change(old_status, new_status, count)
+        record_alert_stats_change(old_status, new_status, count)
+    record_alert_group_stats_change(group.status, new_status)
+    
+    Alert.query.filter(Alert.group_id == group.id).update({
+        Alert.status: new_status,
+        Alert.reviewed_by: current_user.id,
+        Alert.review_notes: notes
+    }, synchronize_session=False)
+    record_alert_changes(Alert.query.filter(Alert.group_id == group.id))
+    # La actualización masiva no pasa por los eventos del mapeador
+    bump_table_version('alert')
+    
+    group.status = new_status
+    group.reviewed_by = current_user.id
+    group.review_date = datetime.utcnow()
+    group.review_notes = notes
+    
+    db.session.commit()
+    bump_version('alert')
+    
+    return jsonify(group.to_dict()), 200
+
+# Registro de cambios para sincronización incremental
+@main_bp.route('/changes', methods=['GET'])
+@login_required
+def get_change_feed():
+    """
+    Obtiene los cambios posteriores a un cursor (?since=<id>), en lotes acotados.
+    Sin "since" devuelve solo el cursor actual para empezar a sincronizar.
+    """
+    since = request.args.get('since', type=int)
+    max_batch = current_app.config['CHANGES_MAX_BATCH']
+    limit = min(max(request.args.get('limit', max_batch, type=int), 1), max_batch)
+    
+    entities = [e for e in request.args.get('entities', '').split(',') if e]
+    unknown = [e for e in entities if e not in ENTITY_NAMES]
+    if unknown:
+        return jsonify({'error': f"Entidades no válidas: {', '.join(unknown)}"}), 400
+    
+    schedule_prune(current_app.config['CHANGE_LOG_RETENTION_DAYS'])
+    return jsonify(get_changes(since, limit, entities)), 200
+
 # Rutas para historial de búsqueda
 @main_bp.route('/search-history', methods=['GET'])
 @login_required
@@ -797,7 +1289,8 @@ def get_search_history():
     """Obtiene el historial de búsqueda del usuario actual"""
     limit = request.args.get('limit', 10, type=int)
     
-    history = SearchHistory.query.filter_by(user_id=current_user.id).order_by(SearchHistory.search_date.desc()).limit(limit).all()
+    # La columna "query" oculta SearchHistory.query: se consulta a través de la sesión
+    history = db.session.query(SearchHistory).filter_by(user_id=current_user.id).order_by(SearchHistory.search_date.desc()).limit(limit).all()
     return jsonify([entry.to_dict() for entry in history]), 200
 
 # Rutas para control de vigilancia de archivos
@@ -847,4 +1340,142 @@ async def verifyAdminPassword(userId, password):
     if not user:
         return False
     
-    return user.check_password(password)
\ No newline at end of file
+    return user.check_password(password)
+
+# Canal de eventos en tiempo real (Server-Sent Events)
+@main_bp.route('/events', methods=['GET'])
+@login_required
+def stream_events():
+    """Envía al navegador los eventos de alertas y actividades de archivos"""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    
+    subscriber, backlog, resync = event_bus.subscribe(last_event_id)
+    
+    def generate():
+        try:
+            yield "retry: 5000\n\n"
+            if resync:
+                # El búfer ya no cubre el último evento del cliente: debe recargar sus listas
+                yield format_sse(event_bus.last_id, 'resync', '{}')
+            for event in backlog:
+                yield format_sse(*event)
+            
+            while True:
+                try:
+                    event = subscriber.get(timeout=15)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    break
+                yield format_sse(*event)
+        finally:
+            event_bus.unsubscribe(subscriber)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+# Peticiones por lotes
+# Rutas que no se pueden ejecutar dentro de un lote (flujos continuos y el propio lote)
+BATCH_EXCLUDED_ENDPOINTS = {'main.stream_events', 'main.batch_requests'}
+
+def _run_sub_request(spec):
+    """
+    Ejecuta una subpetición GET dentro del contexto de aplicación actual,
+    reutilizando la sesión Flask, el usuario cargado y la sesión de base de
+    datos de la petición del lote. Los decoradores de la vista
+    (login_required, authorize) se aplican igual que en una petición normal.
+    
+    Args:
+        spec: Diccionario con 'path' y opcionalmente 'query'
+    
+    Returns:
+        tuple: (código de estado, cuerpo JSON o None, mensaje de error o None)
+    """
+    from flask import session
+    from flask.ctx import RequestContext
+    from werkzeug.exceptions import HTTPException
+    from werkzeug.test import EnvironBuilder
+    
+    path = spec.get('path')
+    if not isinstance(path, str) or not path.startswith('/api/'):
+        return 400, None, 'Ruta no válida'
+    
+    builder = EnvironBuilder(path=path, method='GET', query_string=spec.get('query') or None,
+                             base_url=request.host_url)
+    try:
+        environ = builder.get_environ()
+    finally:
+        builder.close()
+    
+    app = current_app._get_current_object()
+    context = RequestContext(app, environ, session=session._get_current_object())
+    with context:
+        try:
+            context.match_request()
+            if request.routing_exception is not None:
+                raise request.routing_exception
+            if request.blueprint not in ('main', 'auth'):
+                # Solo rutas de la API (no la ruta comodín del frontend)
+                return 404, None, 'Ruta no encontrada'
+            if request.url_rule.endpoint in BATCH_EXCLUDED_ENDPOINTS:
+                return 400, None, 'Ruta no permitida en un lote'
+            response = app.make_response(app.view_functions[request.url_rule.endpoint](**request.view_args))
+        except HTTPException as e:
+            return e.code, None, e.description
+        except Exception as e:
+            db.session.rollback()
+            return 500, None, str(e)
+        
+        try:
+            if response.is_streamed or not response.is_json:
+                return 400, None, 'La ruta no devuelve JSON'
+            return response.status_code, response.get_json(), None
+        finally:
+            response.close()
+
+@main_bp.route('/batch', methods=['POST'])
+@login_required
+def batch_requests():
+    """
+    Ejecuta varias consultas GET de la API en una sola petición.
+    
+    Cuerpo: {"requests": [{"id": "stores", "path": "/api/stores", "query": {...}}, ...]}
+    Cada subpetición conserva su propia autorización, código de estado y tiempo.
+    """
+    data = request.json or {}
+    specs = data.get('requests')
+    max_requests = current_app.config['BATCH_MAX_REQUESTS']
+    
+    if not isinstance(specs, list) or not specs:
+        return jsonify({'error': 'Se requiere una lista de peticiones'}), 400
+    if len(specs) > max_requests:
+        return jsonify({'error': f'Máximo {max_requests} peticiones por lote'}), 400
+    
+    started = time.perf_counter()
+    responses = []
+    for index, spec in enumerate(specs):
+        if not isinstance(spec, dict):
+            spec = {}
+        call_started = time.perf_counter()
+        status, body, error = _run_sub_request(spec)
+        result = {
+            'id': spec.get('id', index),
+            'status': status,
+            'body': body,
+            'ms': round((time.perf_counter() - call_started) * 1000, 2)
+        }
+        if error:
+            result['error'] = error
+        responses.append(result)
+    
+    return jsonify({
+        'responses': responses,
+        'totalMs': round((time.perf_counter() - started) * 1000, 2)
+    }), 200
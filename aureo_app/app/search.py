@@ -0,0 +1,279 @@
+from datetime import datetime
+from sqlalchemy import text
+from . import db
+from .models import ExcelData
+from .normalization import normalize_name, name_like_pattern
+from .archive import archive_years_for_range, archive_schema, attach_archives, archive_year_groups, MAX_ATTACHED
+
+# Campos de texto donde se aplica la búsqueda general
+TEXT_SEARCH_FIELDS = ['order_number', 'customer_name', 'customer_contact',
+                      'customer_address', 'customer_location', 'item_details',
+                      'metals', 'engravings', 'stones']
+
+# Operadores permitidos para la comparación de precio
+PRICE_OPERATORS = ['=', '<', '>', '<=', '>=', '!=']
+
+# Columnas exportadas en los trabajos de búsqueda, con su cabecera
+EXPORT_COLUMNS = [
+    ('store_code', 'Código tienda'),
+    ('order_number', 'Número'),
+    ('order_date', 'Fecha'),
+    ('customer_name', 'Cliente'),
+    ('customer_contact', 'DNI'),
+    ('customer_address', 'Dirección'),
+    ('customer_location', 'Localidad'),
+    ('item_details', 'Artículo'),
+    ('carats', 'Peso'),
+    ('metals', 'Metal'),
+    ('engravings', 'Grabado'),
+    ('stones', 'Piedras'),
+    ('price', 'Precio'),
+    ('pawn_ticket', 'Papeletas'),
+    ('sale_date', 'Venta'),
+]
+
+# Claves del payload de búsqueda que afectan al resultado
+SEARCH_CRITERIA_KEYS = ['query', 'storeCode', 'dateFrom', 'dateTo', 'orderNumber',
+                        'customerName', 'customerNameMatch', 'customerContact', 'itemDetails', 'metals',
+                        'price', 'priceOperator', 'onlyAlerts']
+
+def normalize_search_criteria(data):
+    """
+    Normaliza el payload de búsqueda para que búsquedas equivalentes
+    produzcan los mismos criterios (y la misma clave de caché).
+
+    Args:
+        data: Diccionario recibido en la petición de búsqueda
+
+    Returns:
+        dict: Criterios normalizados, sin valores vacíos
+    """
+    criteria = {}
+    for key in SEARCH_CRITERIA_KEYS:
+        value = data.get(key)
+        if isinstance(value, str):
+            value = value.strip()
+        if value in (None, '', False):
+            continue
+        criteria[key] = value
+
+    # El operador de precio solo tiene sentido si hay precio
+    if 'price' in criteria:
+        criteria['price'] = str(float(criteria['price']))
+        criteria['priceOperator'] = criteria.get('priceOperator', '=')
+        if criteria['priceOperator'] not in PRICE_OPERATORS:
+            raise ValueError(f"Operador de precio no válido: {criteria['priceOperator']}")
+    else:
+        criteria.pop('priceOperator', None)
+
+    if 'onlyAlerts' in criteria:
+        criteria['onlyAlerts'] = True
+
+    # Las variantes de un nombre ("JOSÉ GARCÍA", "garcia, jose") comparten criterio
+    if 'customerName' in criteria:
+        criteria['customerName'] = normalize_name(criteria['customerName']) or criteria['customerName']
+        if criteria.get('customerNameMatch') != 'exact':
+            criteria.pop('customerNameMatch', None)
+    else:
+        criteria.pop('customerNameMatch', None)
+
+    return criteria
+
+def escape_like_pattern(pattern):
+    """Escapa los caracteres especiales de un patrón LIKE"""
+    return pattern.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def build_search_conditions(criteria):
+    """
+    Construye las condiciones WHERE de una búsqueda sobre excel_data (alias e).
+
+    Args:
+        criteria: Criterios normalizados (ver normalize_search_criteria)
+
+    Returns:
+        tuple: (lista de condiciones SQL, diccionario de parámetros)
+    """
+    conditions = []
+    params = {}
+
+    if criteria.get('onlyAlerts'):
+        conditions.append("EXISTS (SELECT 1 FROM alert a WHERE a.excel_data_id = e.id)")
+
+    if criteria.get('storeCode'):
+        conditions.append("e.store_code = :store_code")
+        params['store_code'] = criteria['storeCode']
+
+    if criteria.get('dateFrom'):
+        conditions.append("e.order_date >= :date_from")
+        params['date_from'] = datetime.fromisoformat(criteria['dateFrom'])
+
+    if criteria.get('dateTo'):
+        conditions.append("e.order_date <= :date_to")
+        params['date_to'] = datetime.fromisoformat(criteria['dateTo'])
+
+    # Nombre del cliente sobre la columna normalizada: la coincidencia exacta
+    # usa el índice; la parcial exige todos los tokens en orden alfabético
+    if criteria.get('customerName'):
+        if criteria.get('customerNameMatch') == 'exact':
+            conditions.append("e.customer_name_norm = :customer_name_norm")
+            params['customer_name_norm'] = normalize_name(criteria['customerName'])
+        else:
+            conditions.append("e.customer_name_norm LIKE :customer_name_norm")
+            params['customer_name_norm'] = name_like_pattern(criteria['customerName'])
+
+    like_filters = [
+        ('orderNumber', 'order_number'),
+        ('customerContact', 'customer_contact'),
+        ('itemDetails', 'item_details'),
+        ('metals', 'metals'),
+    ]
+    for key, column in like_filters:
+        if criteria.get(key):
+            conditions.append(f"e.{column} LIKE :{column} ESCAPE '\\'")
+            params[column] = f"%{escape_like_pattern(criteria[key])}%"
+
+    # Manejo especial para búsqueda de precio
+    # El campo price es un string pero queremos compararlo como número
+    if criteria.get('price'):
+        price_operator = criteria.get('priceOperator', '=')
+        if price_operator not in PRICE_OPERATORS:
+            raise ValueError(f"Operador de precio no válido: {price_operator}")
+
+        # SQLite no tiene REGEXP nativo, usamos GLOB para una aproximación
+        conditions.append(f"""
+            CASE
+                WHEN (e.price GLOB '*[0-9]*' AND e.price NOT GLOB '*[a-zA-Z]*') THEN
+                    CAST(e.price AS REAL) {price_operator} :price_value
+                ELSE 0
+            END
+            """)
+        params['price_value'] = float(criteria['price'])
+
+    # Búsqueda general de texto
+    if criteria.get('query'):
+        text_conditions = [f"e.{field} LIKE :query_text ESCAPE '\\'" for field in TEXT_SEARCH_FIELDS]
+        conditions.append("(" + " OR ".join(text_conditions) + ")")
+        params['query_text'] = f"%{escape_like_pattern(criteria['query'])}%"
+
+    return conditions, params
+
+def search_archive_years(criteria):
+    """
+    Devuelve los años archivados que una búsqueda necesita consultar según
+    su rango de fechas. Los registros con alertas nunca se archivan.
+
+    Args:
+        criteria: Criterios normalizados
+
+    Returns:
+        list: Años de las bases de archivo
+    """
+    if criteria.get('onlyAlerts'):
+        return []
+    return archive_years_for_range(criteria.get('dateFrom'), criteria.get('dateTo'))
+
+def search_segments(criteria):
+    """
+    Divide una búsqueda en tramos de fechas que se pueden consultar uno tras
+    otro sin superar el límite de bases adjuntas de SQLite.
+
+    Con hasta MAX_ATTACHED años archivados hay un solo tramo sin límites.
+    Con más, cada tramo adjunta un grupo de años y limita por fecha tanto la
+    tabla principal como los archivos, de modo que los tramos, del más
+    reciente al más antiguo, devuelven los resultados ya en el orden global.
+
+    Args:
+        criteria: Criterios normalizados
+
+    Returns:
+        list: Tuplas (años, fecha inicial incluida o None, fecha final excluida o None)
+    """
+    years = search_archive_years(criteria)
+    if len(years) <= MAX_ATTACHED:
+        return [(years, None, None)]
+
+    groups = archive_year_groups(years)
+    segments = []
+    upper = None
+    for index, group in enumerate(groups):
+        lower = None if index == len(groups) - 1 else datetime(min(group), 1, 1)
+        segments.append((group, lower, upper))
+        upper = lower
+    return segments
+
+def build_search_query(criteria, columns=None, archive_years=(), segment_from=None, segment_to=None):
+    """
+    Construye la consulta SQL completa de búsqueda.
+
+    Args:
+        criteria: Criterios normalizados
+        columns: Columnas de excel_data a devolver (por defecto todas)
+        archive_years: Años archivados que se unen a la tabla principal
+        segment_from: Fecha inicial del tramo (incluida, opcional)
+        segment_to: Fecha final del tramo (excluida, opcional)
+
+    Returns:
+        tuple: (sentencia SQL, diccionario de parámetros)
+    """
+    conditions, params = build_search_conditions(criteria)
+    if segment_from is not None:
+        conditions.append("e.order_date >= :segment_from")
+        params['segment_from'] = segment_from
+    if segment_to is not None:
+        conditions.append("e.order_date < :segment_to")
+        params['segment_to'] = segment_to
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+
+    if not archive_years:
+        select = ", ".join(f"e.{column}" for column in columns) if columns else "e.*"
+        sql_query = f"SELECT {select} FROM excel_data e{where}"
+
+        # Ordenar por fecha de forma descendente
+        sql_query += " ORDER BY e.order_date DESC"
+        return sql_query, params
+
+    # Con archivos, las columnas se nombran explícitamente: el orden físico
+    # de la tabla principal puede variar por las columnas añadidas después
+    columns = columns or [column.name for column in ExcelData.__table__.columns]
+    select = ", ".join(f"e.{column}" for column in columns)
+    sources = ["main.excel_data"] + [f"{archive_schema(year)}.excel_data" for year in archive_years]
+    sql_query = " UNION ALL ".join(f"SELECT {select} FROM {source} e{where}" for source in sources)
+    sql_query += " ORDER BY order_date DESC"
+    return sql_query, params
+
+def prepare_search(criteria, columns=None):
+    """
+    Prepara las sentencias de una búsqueda, una por tramo (ver search_segments).
+    Antes de entregar cada sentencia adjunta a su conexión las bases de archivo
+    que necesita, así que cada una debe leerse por completo antes de pedir la
+    siguiente.
+
+    Args:
+        criteria: Criterios normalizados
+        columns: Columnas de excel_data a devolver (por defecto todas)
+
+    Yields:
+        tuple: (sentencia text(), diccionario de parámetros)
+    """
+    for years, segment_from, segment_to in search_segments(criteria):
+        sql_query, params = build_search_query(criteria, columns, years, segment_from, segment_to)
+        statement = text(sql_query)
+        attach_archives(years, statement)
+        yield statement, params
+
+def execute_search(criteria):
+    """
+    Ejecuta una búsqueda sobre los datos Excel, incluidos los archivados
+    cuando el rango de fechas lo requiere.
+
+    Args:
+        criteria: Criterios normalizados
+
+    Returns:
+        list: Registros encontrados como diccionarios
+    """
+    records = []
+    for statement, params in prepare_search(criteria):
+        result = db.session.execute(statement, params)
+        records.extend(dict(row._mapping) for row in result)
+    return records
@@ -0,0 +1,114 @@
+import threading
+from collections import OrderedDict
+
+class _InflightEntry:
+    """Ejecución en curso compartida por peticiones idénticas concurrentes"""
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+class SearchResultCache:
+    """
+    Caché LRU de resultados de búsqueda con presupuesto de memoria.
+
+    Las entradas se indexan por una clave hashable (payload normalizado +
+    versión de datos) y guardan el cuerpo JSON ya serializado, de modo que
+    un acierto no vuelve a consultar ni a serializar. Las peticiones
+    idénticas concurrentes comparten una única ejecución.
+    """
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get_or_compute(self, key, compute):
+        """
+        Devuelve el valor cacheado para la clave o lo calcula una sola vez.
+
+        Args:
+            key: Clave de la entrada
+            compute: Función sin argumentos que devuelve el valor (bytes)
+
+        Returns:
+            bytes: Valor cacheado o recién calculado
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                self.coalesced += 1
+                owner = False
+            else:
+                self.misses += 1
+                inflight = _InflightEntry()
+                self._inflight[key] = inflight
+                owner = True
+
+        if not owner:
+            inflight.event.wait()
+            if inflight.error is not None:
+                raise inflight.error
+            return inflight.value
+
+        try:
+            value = compute()
+            inflight.value = value
+            self._store(key, value)
+            return value
+        except Exception as e:
+            inflight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            inflight.event.set()
+
+    def _store(self, key, value):
+        """Guarda una entrada respetando el presupuesto de memoria"""
+        size = len(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= len(self._entries.pop(key))
+            self._entries[key] = value
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        """Vacía la caché"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """Devuelve los contadores de la caché"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'maxBytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions
+            }
+
+# Instancia compartida por la aplicación
+search_cache = SearchResultCache()
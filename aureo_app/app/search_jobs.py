@@ -0,0 +1,165 @@
+import os
+import csv
+import gzip
+import json
+import uuid
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from . import db
+from .models import SearchJob
+from .search import prepare_search, EXPORT_COLUMNS
+
+# Formatos de exportación soportados
+EXPORT_FORMATS = {
+    'csv': '.csv.gz',
+    'xlsx': '.xlsx',
+}
+
+# Filas leídas de la base de datos en cada lote
+FETCH_BATCH_SIZE = 1000
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """Obtiene (o crea) el pool de hilos que ejecuta los trabajos de búsqueda"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=current_app.config['SEARCH_JOB_WORKERS'],
+                thread_name_prefix='search-job'
+            )
+        return _executor
+
+def create_search_job(user_id, criteria, export_format):
+    """
+    Registra un trabajo de búsqueda y lo encola para su ejecución.
+
+    Args:
+        user_id: ID del usuario que solicita la búsqueda
+        criteria: Criterios normalizados de la búsqueda
+        export_format: "csv" o "xlsx"
+
+    Returns:
+        SearchJob: Trabajo creado
+    """
+    cleanup_expired_jobs()
+
+    job = SearchJob(
+        id=str(uuid.uuid4()),
+        user_id=user_id,
+        criteria=json.dumps(criteria, sort_keys=True),
+        format=export_format,
+        status='Pending'
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    get_executor().submit(run_search_job, app, job.id)
+    return job
+
+def run_search_job(app, job_id):
+    """
+    Ejecuta un trabajo de búsqueda en un hilo del pool, volcando los
+    resultados al archivo de exportación a medida que se leen.
+
+    Args:
+        app: Aplicación Flask (para crear el contexto del hilo)
+        job_id: ID del trabajo
+    """
+    with app.app_context():
+        job = SearchJob.query.get(job_id)
+        if not job:
+            return
+
+        job.status = 'Running'
+        job.started_date = datetime.utcnow()
+        db.session.commit()
+
+        export_dir = app.config['SEARCH_EXPORT_FOLDER']
+        os.makedirs(export_dir, exist_ok=True)
+        final_path = os.path.join(export_dir, f"{job.id}{EXPORT_FORMATS[job.format]}")
+        temp_path = final_path + '.tmp'
+
+        try:
+            criteria = json.loads(job.criteria)
+            partitions = _iter_partitions(criteria)
+            if job.format == 'xlsx':
+                row_count = _write_xlsx(partitions, temp_path)
+            else:
+                row_count = _write_csv_gz(partitions, temp_path)
+
+            os.replace(temp_path, final_path)
+
+            job.status = 'Completed'
+            job.row_count = row_count
+            job.file_path = final_path
+            job.file_size = os.path.getsize(final_path)
+        except Exception as e:
+            db.session.rollback()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            job.status = 'Failed'
+            job.error_message = str(e)
+
+        job.finished_date = datetime.utcnow()
+        db.session.commit()
+
+def _iter_partitions(criteria):
+    """Lee los resultados de una búsqueda por lotes, tramo a tramo"""
+    for statement, params in prepare_search(criteria, [column for column, _ in EXPORT_COLUMNS]):
+        result = db.session.execute(statement, params,
+                                    execution_options={'yield_per': FETCH_BATCH_SIZE})
+        yield from result.partitions()
+
+def _write_csv_gz(partitions, path):
+    """Escribe las filas en un CSV comprimido con gzip y devuelve cuántas se escribieron"""
+    row_count = 0
+    with gzip.open(path, 'wt', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow([header for _, header in EXPORT_COLUMNS])
+        for partition in partitions:
+            writer.writerows(partition)
+            row_count += len(partition)
+    return row_count
+
+def _write_xlsx(partitions, path):
+    """Escribe las filas en un XLSX en modo solo escritura y devuelve cuántas se escribieron"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Resultados')
+    sheet.append([header for _, header in EXPORT_COLUMNS])
+
+    row_count = 0
+    for partition in partitions:
+        for row in partition:
+            sheet.append(list(row))
+        row_count += len(partition)
+
+    workbook.save(path)
+    return row_count
+
+def cleanup_expired_jobs():
+    """Elimina los trabajos finalizados (y sus archivos) que superan el tiempo de retención"""
+    retention = timedelta(hours=current_app.config['SEARCH_JOB_RETENTION_HOURS'])
+    expired = SearchJob.query.filter(
+        SearchJob.finished_date.isnot(None),
+        SearchJob.finished_date < datetime.utcnow() - retention
+    ).all()
+
+    for job in expired:
+        if job.file_path and os.path.exists(job.file_path):
+            try:
+                os.remove(job.file_path)
+            except OSError as e:
+                print(f"Error al eliminar exportación {job.file_path}: {str(e)}")
+                continue
+        db.session.delete(job)
+
+    if expired:
+        db.session.commit()
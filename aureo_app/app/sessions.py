@@ -0,0 +1,122 @@
+import time
+import secrets
+from datetime import datetime, timedelta
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface
+from flask_session.sessions import ServerSideSession
+from itsdangerous import Signer, BadSignature
+from sqlalchemy import select, insert, update, delete
+from . import db
+from .models import UserSession
+from .storage import READ_BIND_KEY, ingestion_writer
+
+_serializer = TaggedJSONSerializer()
+
+# Momento (time.monotonic) de la última limpieza de sesiones caducadas en este proceso
+_last_cleanup = 0.0
+
+def purge_expired_sessions():
+    """
+    Elimina las sesiones caducadas.
+
+    Returns:
+        int: Número de sesiones eliminadas
+    """
+    result = db.session.execute(delete(UserSession).where(UserSession.expiry < datetime.utcnow()))
+    db.session.commit()
+    return result.rowcount
+
+class DatabaseSessionInterface(SessionInterface):
+    """
+    Sesiones de servidor guardadas en la tabla user_session.
+
+    A diferencia del almacenamiento en archivos, la sesión solo se escribe
+    cuando cambia o cuando queda menos de la mitad de su tiempo de
+    inactividad, de modo que una petición normal solo hace una lectura por
+    clave primaria. La cookie lleva únicamente el identificador firmado.
+    Las consultas usan conexiones propias del motor, sin tocar la sesión
+    SQLAlchemy de la petición.
+    """
+    session_class = ServerSideSession
+
+    def __init__(self, app):
+        self.idle_timeout = timedelta(minutes=app.config['SESSION_IDLE_TIMEOUT_MINUTES'])
+        self.cleanup_interval = app.config['SESSION_CLEANUP_INTERVAL_MINUTES'] * 60
+        self.signer = Signer(app.secret_key, salt='aureo-session')
+        self.table = UserSession.__table__
+
+    def _new_session(self):
+        session = self.session_class(sid=secrets.token_urlsafe(32), permanent=False)
+        session.expiry = None
+        return session
+
+    def _schedule_cleanup(self):
+        """Encola la limpieza de sesiones caducadas cada cierto tiempo"""
+        global _last_cleanup
+        now = time.monotonic()
+        if now - _last_cleanup >= self.cleanup_interval:
+            _last_cleanup = now
+            ingestion_writer.submit(purge_expired_sessions)
+
+    def open_session(self, app, request):
+        self._schedule_cleanup()
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie:
+            return self._new_session()
+        try:
+            sid = self.signer.unsign(cookie).decode()
+        except BadSignature:
+            return self._new_session()
+
+        engine = db.engines.get(READ_BIND_KEY, db.engine)
+        with engine.connect() as connection:
+            row = connection.execute(
+                select(self.table.c.data, self.table.c.expiry).where(self.table.c.session_id == sid)
+            ).first()
+        if row is None or row.expiry <= datetime.utcnow():
+            return self._new_session()
+
+        try:
+            data = _serializer.loads(row.data)
+        except ValueError:
+            return self._new_session()
+        session = self.session_class(data, sid=sid, permanent=False)
+        session.expiry = row.expiry
+        return session
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified:
+                if session.expiry is not None:
+                    with db.engine.begin() as connection:
+                        connection.execute(delete(self.table).where(self.table.c.session_id == session.sid))
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        now = datetime.utcnow()
+        # Renovar la caducidad solo cuando ha pasado la mitad del tiempo de inactividad
+        needs_refresh = session.expiry is None or session.expiry - now < self.idle_timeout / 2
+        if not session.modified and not needs_refresh:
+            return
+
+        values = {'data': _serializer.dumps(dict(session)), 'expiry': now + self.idle_timeout}
+        with db.engine.begin() as connection:
+            if session.expiry is None:
+                connection.execute(insert(self.table).values(session_id=session.sid, **values))
+            else:
+                connection.execute(update(self.table).where(self.table.c.session_id == session.sid).values(**values))
+
+        response.set_cookie(
+            name,
+            self.signer.sign(session.sid).decode(),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
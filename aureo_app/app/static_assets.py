@@ -0,0 +1,244 @@
+import os
+import re
+import gzip
+import json
+import hashlib
+import mimetypes
+from flask import current_app, request, render_template, send_file
+
+try:
+    import brotli
+except ImportError:  # La variante .br es opcional
+    brotli = None
+
+# Manifiesto generado por build_frontend.py dentro del directorio static
+MANIFEST_NAME = 'asset-manifest.json'
+
+# Manifiestos de compilación de Vite (build.manifest): listan los archivos generados con huella
+VITE_MANIFESTS = ('.vite/manifest.json', 'manifest.json')
+
+# Sin manifiesto de Vite: nombres con huella dentro de assets/ (p. ej. assets/index-B4x9kQ2a.js).
+# La huella de Vite 5 son 8 caracteres base64url; se exige al menos un dígito para no tomar
+# por huella palabras de nombres normales (un falso negativo solo pierde la caché larga)
+_FINGERPRINTED = re.compile(r'^assets/(?:[^/]+/)*[^/]+-(?=[A-Za-z_-]*[0-9])[A-Za-z0-9_-]{8}\.[a-z0-9]+$')
+
+# Tipos que merece la pena comprimir
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml',
+                      'application/xml', 'application/wasm')
+
+# Tamaño mínimo para generar variantes comprimidas
+MIN_COMPRESS_SIZE = 1024
+
+# Caché de un año para los archivos con huella (su nombre cambia si cambia el contenido)
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Extensión de cada variante y su Content-Encoding, por orden de preferencia
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+def _guess_type(name):
+    return mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+def _is_compressible(mimetype):
+    return mimetype.startswith(COMPRESSIBLE_TYPES)
+
+def _load_vite_outputs(static_dir):
+    """
+    Lee del manifiesto de Vite los archivos generados con huella.
+
+    Args:
+        static_dir: Directorio static
+
+    Returns:
+        set: Rutas relativas con huella, o None si no hay manifiesto de Vite
+    """
+    for name in VITE_MANIFESTS:
+        path = os.path.join(static_dir, name)
+        if not os.path.exists(path):
+            continue
+        try:
+            with open(path, encoding='utf-8') as f:
+                chunks = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if not isinstance(chunks, dict) or not all(isinstance(c, dict) and 'file' in c for c in chunks.values()):
+            continue  # No es un manifiesto de Vite
+        outputs = set()
+        for chunk in chunks.values():
+            outputs.add(chunk['file'])
+            outputs.update(chunk.get('css', []))
+            outputs.update(chunk.get('assets', []))
+        return outputs
+    return None
+
+def _immutable_checker(static_dir):
+    """
+    Devuelve la función que decide si un archivo tiene huella de contenido y
+    puede cachearse un año: los archivos del manifiesto de Vite si existe, o
+    si no los nombres con huella dentro de assets/.
+    """
+    outputs = _load_vite_outputs(static_dir)
+    if outputs is not None:
+        return lambda relative: relative in outputs
+    return lambda relative: bool(_FINGERPRINTED.match(relative))
+
+def build_manifest(static_dir):
+    """
+    Genera las variantes comprimidas (gzip y, si está instalado, brotli) y
+    el manifiesto de los archivos del directorio static.
+
+    Args:
+        static_dir: Directorio static con el frontend ya copiado
+
+    Returns:
+        dict: Manifiesto escrito en static/asset-manifest.json
+    """
+    files = {}
+    is_immutable = _immutable_checker(static_dir)
+    for root, _, names in os.walk(static_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, static_dir).replace(os.sep, '/')
+            if relative == MANIFEST_NAME or relative.endswith(('.gz', '.br')):
+                continue
+
+            with open(path, 'rb') as f:
+                content = f.read()
+            mimetype = _guess_type(name)
+            entry = {
+                'etag': hashlib.blake2b(content, digest_size=12).hexdigest(),
+                'size': len(content),
+                'mimetype': mimetype,
+                'immutable': is_immutable(relative),
+                'encodings': {}
+            }
+
+            if _is_compressible(mimetype) and len(content) >= MIN_COMPRESS_SIZE:
+                variants = {'gzip': gzip.compress(content, compresslevel=9, mtime=0)}
+                if brotli is not None:
+                    variants['br'] = brotli.compress(content, quality=11)
+                for encoding, suffix in ENCODINGS:
+                    data = variants.get(encoding)
+                    # Solo si ahorra al menos un 10 %
+                    if data is None or len(data) > len(content) * 0.9:
+                        continue
+                    with open(path + suffix, 'wb') as f:
+                        f.write(data)
+                    entry['encodings'][encoding] = relative + suffix
+
+            files[relative] = entry
+
+    manifest = {'files': files}
+    with open(os.path.join(static_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return manifest
+
+class StaticAssets:
+    """
+    Sirve el frontend compilado a partir del manifiesto cargado una sola vez.
+
+    Cada petición se resuelve con una búsqueda en memoria: sin comprobar la
+    existencia de archivos, con la variante comprimida que acepte el cliente
+    y con caché inmutable para los archivos con huella. El resto de rutas
+    reciben index.html, renderizado y comprimido una sola vez.
+    """
+    def __init__(self, static_dir):
+        self.static_dir = static_dir
+        self.files = self._load_manifest()
+        self._index = None
+
+    def _load_manifest(self):
+        path = os.path.join(self.static_dir, MANIFEST_NAME)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)['files']
+
+        # Sin manifiesto (frontend copiado a mano): inventario sin variantes comprimidas
+        files = {}
+        if os.path.isdir(self.static_dir):
+            is_immutable = _immutable_checker(self.static_dir)
+            for root, _, names in os.walk(self.static_dir):
+                for name in names:
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    relative = os.path.relpath(path, self.static_dir).replace(os.sep, '/')
+                    files[relative] = {
+                        'etag': f"{int(stat.st_mtime)}-{stat.st_size}",
+                        'size': stat.st_size,
+                        'mimetype': _guess_type(name),
+                        'immutable': is_immutable(relative),
+                        'encodings': {}
+                    }
+        if files:
+            print(f"No se encontró {MANIFEST_NAME}; ejecute build_frontend.py para servir archivos comprimidos.")
+        return files
+
+    def _negotiate(self, available):
+        """Elige la mejor codificación disponible que acepte el cliente"""
+        for encoding, _ in ENCODINGS:
+            if encoding in available and request.accept_encodings[encoding] > 0:
+                return encoding
+        return None
+
+    def _finish(self, response, entry, encoding):
+        if entry['encodings']:
+            response.vary.add('Accept-Encoding')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if entry['immutable']:
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        return response
+
+    def serve_asset(self, path):
+        """
+        Sirve un archivo del frontend si está en el manifiesto.
+
+        Args:
+            path: Ruta relativa solicitada
+
+        Returns:
+            Response: Respuesta con el archivo, o None si no es un archivo del frontend
+        """
+        entry = self.files.get(path)
+        if entry is None:
+            return None
+
+        encoding = self._negotiate(entry['encodings'])
+        relative = entry['encodings'][encoding] if encoding else path
+        etag = f"{entry['etag']}-{encoding}" if encoding else entry['etag']
+        response = send_file(
+            os.path.join(self.static_dir, relative),
+            mimetype=entry['mimetype'],
+            etag=etag,
+            conditional=True,
+            max_age=None
+        )
+        return self._finish(response, entry, encoding)
+
+    def serve_index(self):
+        """Sirve index.html (renderizado y comprimido la primera vez)"""
+        if self._index is None:
+            content = render_template('index.html').encode('utf-8')
+            variants = {'gzip': gzip.compress(content, mtime=0)}
+            if brotli is not None:
+                variants['br'] = brotli.compress(content)
+            self._index = {
+                'etag': hashlib.blake2b(content, digest_size=12).hexdigest(),
+                'content': content,
+                'variants': variants,
+                'immutable': False,
+                'encodings': variants
+            }
+
+        entry = self._index
+        encoding = self._negotiate(entry['variants'])
+        etag = f"{entry['etag']}-{encoding}" if encoding else entry['etag']
+        body = entry['variants'][encoding] if encoding else entry['content']
+        response = current_app.response_class(body, mimetype='text/html')
+        response.set_etag(etag)
+        response = response.make_conditional(request)
+        return self._finish(response, entry, encoding)
@@ -0,0 +1,216 @@
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from . import db
+from .models import StatCounter
+
+# Contadores globales
+PENDING_ALERTS = 'pendingAlerts'
+PENDING_ALERT_GROUPS = 'pendingAlertGroups'
+PENDING_STORE_ASSIGNMENTS = 'pendingStoreAssignments'
+
+COUNTER_NAMES = [PENDING_ALERTS, PENDING_ALERT_GROUPS, PENDING_STORE_ASSIGNMENTS]
+
+# Formato SQLite de cada agrupación temporal de las series
+BUCKET_FORMATS = {
+    'day': '%Y-%m-%d',
+    'week': '%Y-W%W',
+    'month': '%Y-%m',
+}
+
+_DAILY_COLUMNS = ['excel_rows', 'files_processed', 'files_failed', 'alerts']
+
+_DAILY_UPSERT_SUFFIX = """
+    ON CONFLICT(day, store_code) DO UPDATE SET
+        excel_rows = excel_rows + excluded.excel_rows,
+        files_processed = files_processed + excluded.files_processed,
+        files_failed = files_failed + excluded.files_failed,
+        alerts = alerts + excluded.alerts
+"""
+
+_COUNTER_UPSERT = text("""
+    INSERT INTO stat_counter (name, value) VALUES (:name, :delta)
+    ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+""")
+
+def bump_counter(name, delta):
+    """
+    Suma (o resta) una cantidad a un contador global dentro de la transacción actual.
+
+    Args:
+        name: Nombre del contador
+        delta: Cantidad a sumar
+    """
+    if delta:
+        db.session.execute(_COUNTER_UPSERT, {'name': name, 'delta': delta})
+
+def record_activity_stats(activity):
+    """
+    Suma a las estadísticas diarias un archivo que termina de procesarse
+    (correctamente o con error), junto con sus registros y alertas. Se ejecuta
+    en la misma transacción que cambia el estado de la actividad.
+
+    Args:
+        activity: FileActivity con el estado final ya asignado
+    """
+    store_code = activity.store_code or ''
+    day = (activity.processing_date or datetime.utcnow()).strftime('%Y-%m-%d')
+    processed = 1 if activity.status == 'Processed' else 0
+
+    db.session.execute(text(
+        "INSERT INTO daily_store_stats (day, store_code, excel_rows, files_processed, files_failed, alerts) "
+        "VALUES (:day, :store_code, 0, :processed, :failed, 0)" + _DAILY_UPSERT_SUFFIX
+    ), {'day': day, 'store_code': store_code, 'processed': processed, 'failed': 1 - processed})
+
+    db.session.execute(text("""
+        INSERT INTO daily_store_stats (day, store_code, excel_rows, files_processed, files_failed, alerts)
+        SELECT date(e.order_date), e.store_code, COUNT(*), 0, 0, 0
+        FROM excel_data e
+        WHERE e.file_activity_id = :activity_id
+        GROUP BY 1, 2
+    """ + _DAILY_UPSERT_SUFFIX), {'activity_id': activity.id})
+
+    db.session.execute(text("""
+        INSERT INTO daily_store_stats (day, store_code, excel_rows, files_processed, files_failed, alerts)
+        SELECT date(a.alert_date), e.store_code, 0, 0, 0, COUNT(*)
+        FROM alert a JOIN excel_data e ON e.id = a.excel_data_id
+        WHERE e.file_activity_id = :activity_id
+        GROUP BY 1, 2
+    """ + _DAILY_UPSERT_SUFFIX), {'activity_id': activity.id})
+
+def record_activity_status_change(old_status, new_status):
+    """
+    Actualiza el contador de archivos pendientes de asignación de tienda.
+
+    Args:
+        old_status: Estado anterior (None si la actividad es nueva)
+        new_status: Estado nuevo
+    """
+    if old_status == new_status:
+        return
+    if old_status == 'PendingStoreAssignment':
+        bump_counter(PENDING_STORE_ASSIGNMENTS, -1)
+    if new_status == 'PendingStoreAssignment':
+        bump_counter(PENDING_STORE_ASSIGNMENTS, 1)
+
+def _record_pending_change(counter, old_status, new_status, count):
+    """Actualiza un contador de elementos en estado "Pending" tras un cambio de estado"""
+    if old_status == new_status or not count:
+        return
+    if old_status == 'Pending':
+        bump_counter(counter, -count)
+    if new_status == 'Pending':
+        bump_counter(counter, count)
+
+def record_alert_stats_change(old_status, new_status, count=1):
+    """
+    Actualiza el contador de alertas pendientes cuando se crean o revisan alertas.
+
+    Args:
+        old_status: Estado anterior (None si las alertas son nuevas)
+        new_status: Estado nuevo
+        count: Número de alertas que cambian
+    """
+    _record_pending_change(PENDING_ALERTS, old_status, new_status, count)
+
+def record_alert_group_stats_change(old_status, new_status):
+    """
+    Actualiza el contador de grupos de alertas pendientes.
+
+    Args:
+        old_status: Estado anterior (None si el grupo es nuevo)
+        new_status: Estado nuevo
+    """
+    _record_pending_change(PENDING_ALERT_GROUPS, old_status, new_status, 1)
+
+def rebuild_stats():
+    """Recalcula desde cero las estadísticas diarias y los contadores"""
+    db.session.execute(text("DELETE FROM daily_store_stats"))
+    db.session.execute(text("DELETE FROM stat_counter"))
+
+    db.session.execute(text("""
+        INSERT INTO daily_store_stats (day, store_code, excel_rows, files_processed, files_failed, alerts)
+        SELECT date(COALESCE(processing_date, upload_date)), COALESCE(store_code, ''), 0,
+               SUM(status = 'Processed'), SUM(status = 'Failed'), 0
+        FROM file_activity
+        WHERE status IN ('Processed', 'Failed')
+        GROUP BY 1, 2
+    """ + _DAILY_UPSERT_SUFFIX))
+    db.session.execute(text("""
+        INSERT INTO daily_store_stats (day, store_code, excel_rows, files_processed, files_failed, alerts)
+        SELECT date(order_date), store_code, COUNT(*), 0, 0, 0
+        FROM excel_data GROUP BY 1, 2
+    """ + _DAILY_UPSERT_SUFFIX))
+    db.session.execute(text("""
+        INSERT INTO daily_store_stats (day, store_code, excel_rows, files_processed, files_failed, alerts)
+        SELECT date(a.alert_date), e.store_code, 0, 0, 0, COUNT(*)
+        FROM alert a JOIN excel_data e ON e.id = a.excel_data_id
+        GROUP BY 1, 2
+    """ + _DAILY_UPSERT_SUFFIX))
+
+    db.session.execute(text("""
+        INSERT INTO stat_counter (name, value)
+        SELECT :pending_alerts, COUNT(*) FROM alert WHERE status = 'Pending'
+        UNION ALL
+        SELECT :pending_groups, COUNT(*) FROM alert_group WHERE status = 'Pending'
+        UNION ALL
+        SELECT :pending_assignments, COUNT(*) FROM file_activity WHERE status = 'PendingStoreAssignment'
+    """), {
+        'pending_alerts': PENDING_ALERTS,
+        'pending_groups': PENDING_ALERT_GROUPS,
+        'pending_assignments': PENDING_STORE_ASSIGNMENTS
+    })
+    db.session.commit()
+
+def get_stats(days=30, bucket='day', store_code=None):
+    """
+    Obtiene los contadores globales y las series por tienda del panel principal.
+    Solo lee las tablas agregadas, cuyo tamaño depende de tiendas y días, no
+    del volumen de registros.
+
+    Args:
+        days: Número de días hacia atrás incluidos en las series
+        bucket: Agrupación temporal ("day", "week" o "month")
+        store_code: Limitar las series a una tienda (opcional)
+
+    Returns:
+        dict: {'counters', 'totals', 'series', 'bucket', 'from'}
+    """
+    counters = {name: 0 for name in COUNTER_NAMES}
+    for counter in StatCounter.query.filter(StatCounter.name.in_(COUNTER_NAMES)).all():
+        counters[counter.name] = counter.value
+
+    since = (datetime.utcnow() - timedelta(days=days)).strftime('%Y-%m-%d')
+    sums = ', '.join(f"SUM({column})" for column in _DAILY_COLUMNS)
+    sql = f"""
+        SELECT store_code, strftime(:bucket_format, day), {sums}
+        FROM daily_store_stats
+        WHERE day >= :since
+    """
+    params = {'bucket_format': BUCKET_FORMATS[bucket], 'since': since}
+    if store_code:
+        sql += " AND store_code = :store_code"
+        params['store_code'] = store_code
+    sql += " GROUP BY 1, 2 ORDER BY 1, 2"
+
+    series = {}
+    totals = {'excelRows': 0, 'filesProcessed': 0, 'filesFailed': 0, 'alerts': 0}
+    for code, period, excel_rows, processed, failed, alerts in db.session.execute(text(sql), params):
+        series.setdefault(code, []).append({
+            'period': period,
+            'excelRows': excel_rows,
+            'filesProcessed': processed,
+            'filesFailed': failed,
+            'alerts': alerts
+        })
+        totals['excelRows'] += excel_rows
+        totals['filesProcessed'] += processed
+        totals['filesFailed'] += failed
+        totals['alerts'] += alerts
+
+    return {
+        'counters': counters,
+        'totals': totals,
+        'series': series,
+        'bucket': bucket,
+        'from': since
+    }
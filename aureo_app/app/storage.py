@@ -0,0 +1,172 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from flask import has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql import Select, TextClause
+from .metrics import DB_CONNECTION_WAIT_SECONDS, WRITER_WAIT_SECONDS, WRITER_JOB_SECONDS, ERRORS
+from .query_stats import track_job
+
+# Clave del enlace (SQLALCHEMY_BINDS) de las conexiones de solo lectura
+READ_BIND_KEY = 'readonly'
+
+# Métodos HTTP cuyas consultas se envían a las conexiones de solo lectura
+READ_METHODS = ('GET', 'HEAD')
+
+def _is_read_statement(clause):
+    """Indica si una sentencia es una consulta de solo lectura"""
+    if isinstance(clause, Select):
+        return True
+    if isinstance(clause, TextClause):
+        return clause.text.lstrip().upper().startswith(('SELECT', 'WITH'))
+    return False
+
+class RoutingSession(Session):
+    """
+    Sesión que envía las consultas de las peticiones GET a un pool de
+    conexiones de solo lectura, de modo que las lecturas de la API no
+    compiten con las escrituras por la conexión principal.
+
+    Todo lo demás (escrituras, flush, hilos sin petición y cualquier consulta
+    de una sesión que ya ha escrito) usa la conexión principal.
+    """
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and not self.info.get('wrote')
+                and READ_BIND_KEY in self._db.engines and has_request_context()
+                and request.method in READ_METHODS and _is_read_statement(clause)):
+            return self._db.engines[READ_BIND_KEY]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_session_wrote(session, flush_context):
+    # A partir de aquí la sesión debe leer sus propios cambios
+    session.info['wrote'] = True
+
+@event.listens_for(RoutingSession, 'after_commit')
+@event.listens_for(RoutingSession, 'after_rollback')
+def _reset_session_wrote(session):
+    session.info.pop('wrote', None)
+
+class TimedQueuePool(QueuePool):
+    """Pool de conexiones que mide cuánto se espera para obtener una conexión"""
+    metrics_label = 'default'
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_CONNECTION_WAIT_SECONDS.observe(time.perf_counter() - started, self.metrics_label)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics_label = self.metrics_label
+        return pool
+
+def _apply_pragmas(config, read_only):
+    """Crea el manejador que aplica el perfil de almacenamiento a cada conexión nueva"""
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT_MS'])}")
+        if not read_only:
+            # El modo de diario se guarda en el archivo; basta con fijarlo desde la conexión principal
+            cursor.execute(f"PRAGMA journal_mode = {config['SQLITE_JOURNAL_MODE']}")
+        cursor.execute(f"PRAGMA synchronous = {config['SQLITE_SYNCHRONOUS']}")
+        cursor.execute(f"PRAGMA mmap_size = {int(config['SQLITE_MMAP_SIZE'])}")
+        # Un valor negativo indica el tamaño en KiB en lugar de en páginas
+        cursor.execute(f"PRAGMA cache_size = -{int(config['SQLITE_CACHE_SIZE_KB'])}")
+        if read_only:
+            cursor.execute("PRAGMA query_only = ON")
+        cursor.close()
+    return on_connect
+
+def init_storage(app, db):
+    """
+    Aplica el perfil de almacenamiento SQLite a los motores de la aplicación e
+    inicia el hilo escritor de la ingesta.
+
+    Args:
+        app: Aplicación Flask
+        db: Extensión SQLAlchemy
+    """
+    with app.app_context():
+        for bind_key, engine in db.engines.items():
+            if isinstance(engine.pool, TimedQueuePool):
+                engine.pool.metrics_label = bind_key or 'main'
+            if engine.dialect.name != 'sqlite':
+                continue
+            event.listen(engine, 'connect', _apply_pragmas(app.config, bind_key == READ_BIND_KEY))
+
+    ingestion_writer.start(app)
+
+class WriterQueue:
+    """
+    Cola de trabajos de escritura ejecutados de uno en uno por un único hilo
+    con su propio contexto de aplicación.
+
+    SQLite solo admite un escritor a la vez: en lugar de abrir un hilo por
+    archivo que compita por el bloqueo de escritura ("database is locked"),
+    la ingesta se encola aquí y se escribe en serie.
+    """
+    def __init__(self, name):
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._app = None
+        self._lock = threading.Lock()
+
+    def start(self, app):
+        """Inicia el hilo escritor (una sola vez por proceso)"""
+        with self._lock:
+            self._app = app
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Encola un trabajo de escritura.
+
+        Args:
+            func: Función a ejecutar en el hilo escritor
+            *args, **kwargs: Argumentos de la función
+
+        Returns:
+            Future: Resultado del trabajo
+        """
+        future = Future()
+        self._queue.put((func, args, kwargs, future, time.perf_counter()))
+        return future
+
+    @property
+    def pending(self):
+        """Número de trabajos en espera"""
+        return self._queue.qsize()
+
+    def _run(self):
+        from . import db
+
+        while True:
+            func, args, kwargs, future, queued_at = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            started = time.perf_counter()
+            WRITER_WAIT_SECONDS.observe(started - queued_at, self.name)
+            job_name = getattr(func, '__name__', str(func))
+            with self._app.app_context():
+                try:
+                    future.set_result(track_job(job_name, func, *args, **kwargs))
+                except Exception as e:
+                    db.session.rollback()
+                    ERRORS.inc(1, self.name)
+                    print(f"Error en el trabajo de escritura {job_name}: {str(e)}")
+                    future.set_exception(e)
+                finally:
+                    db.session.remove()
+                    WRITER_JOB_SECONDS.observe(time.perf_counter() - started, self.name, job_name)
+
+# Hilo escritor compartido por toda la ingesta (vigilancia, cargas y asignaciones)
+ingestion_writer = WriterQueue('ingestion-writer')
@@ -0,0 +1,330 @@
+import os
+import time
+import uuid
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from werkzeug.utils import secure_filename
+from . import db
+from .models import Store, UploadSession
+from .storage import ingestion_writer
+
+# Tamaño de los bloques leídos del cuerpo de la petición
+STREAM_BLOCK_SIZE = 1024 * 1024
+
+# Estado del hash de cada carga en este proceso: id -> (bytes procesados, objeto hashlib)
+_hashers = {}
+_locks = {}
+_registry_lock = threading.Lock()
+
+# Momento (time.monotonic) de la última limpieza de cargas abandonadas en este proceso
+_last_purge = 0.0
+
+class UploadError(Exception):
+    """Error de una carga por fragmentos, con el código HTTP a devolver"""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+# Extensiones de cada tipo de archivo cargable
+EXCEL_EXTENSIONS = ['.xlsx', '.xls', '.xlsm']
+PDF_EXTENSIONS = ['.pdf']
+ARCHIVE_EXTENSIONS = ['.zip']
+
+def file_type_for(filename):
+    """
+    Tipo de archivo según su extensión.
+
+    Args:
+        filename: Nombre del archivo
+
+    Returns:
+        str: "Excel", "PDF", "ZIP" o None si no está soportado
+    """
+    file_extension = os.path.splitext(filename)[1].lower()
+    if file_extension in EXCEL_EXTENSIONS:
+        return 'Excel'
+    if file_extension in PDF_EXTENSIONS:
+        return 'PDF'
+    if file_extension in ARCHIVE_EXTENSIONS:
+        return 'ZIP'
+    return None
+
+def upload_dir_for(file_type):
+    """Directorio de destino de un tipo de archivo"""
+    subfolder = {'Excel': 'excel', 'PDF': 'pdf', 'ZIP': 'batches'}[file_type]
+    upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], subfolder)
+    os.makedirs(upload_dir, exist_ok=True)
+    return upload_dir
+
+def resolve_upload_target(filename, store_code, allow_archive=False):
+    """
+    Valida el nombre del archivo y la tienda de una carga.
+
+    Args:
+        filename: Nombre original del archivo
+        store_code: Código de la tienda (opcional para archivos ZIP)
+        allow_archive: Admitir archivos ZIP (carga masiva)
+
+    Returns:
+        tuple: (nombre seguro, tipo de archivo, directorio de destino)
+
+    Raises:
+        UploadError: Si el archivo o la tienda no son válidos
+    """
+    if not filename:
+        raise UploadError('Nombre de archivo no válido')
+
+    filename = secure_filename(filename)
+    file_type = file_type_for(filename)
+    if file_type is None or (file_type == 'ZIP' and not allow_archive):
+        raise UploadError('Tipo de archivo no soportado')
+
+    if not store_code:
+        if file_type != 'ZIP':
+            raise UploadError('No se proporcionó código de tienda')
+        return filename, file_type, upload_dir_for(file_type)
+
+    store = Store.query.filter_by(code=store_code).first()
+    if not store:
+        raise UploadError('Tienda no encontrada', 404)
+
+    # En un ZIP la tienda indicada es la tienda por defecto de sus entradas
+    if file_type != 'ZIP' and store.type != file_type:
+        raise UploadError(f'La tienda es de tipo {store.type}, pero el archivo es {file_type}')
+
+    upload_dir = upload_dir_for(file_type)
+
+    return filename, file_type, upload_dir
+
+def unique_upload_path(upload_dir, filename):
+    """Ruta de destino con marca de tiempo, como las cargas directas"""
+    timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+    return os.path.join(upload_dir, f"{timestamp}_{filename}")
+
+def save_stream(stream, file_path, max_size=None):
+    """
+    Guarda un flujo en un archivo por bloques calculando su SHA-256.
+
+    Args:
+        stream: Flujo de entrada
+        file_path: Ruta de destino
+        max_size: Tamaño máximo admitido (opcional)
+
+    Returns:
+        tuple: (tamaño en bytes, SHA-256 en hexadecimal)
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    with open(file_path, 'wb') as f:
+        while True:
+            block = stream.read(STREAM_BLOCK_SIZE)
+            if not block:
+                break
+            size += len(block)
+            if max_size is not None and size > max_size:
+                f.close()
+                os.remove(file_path)
+                raise UploadError(f'El archivo supera el tamaño máximo ({max_size} bytes)', 413)
+            f.write(block)
+            hasher.update(block)
+    return size, hasher.hexdigest()
+
+def _upload_lock(upload_id):
+    with _registry_lock:
+        return _locks.setdefault(upload_id, threading.Lock())
+
+def _forget(upload_id):
+    with _registry_lock:
+        _hashers.pop(upload_id, None)
+        _locks.pop(upload_id, None)
+
+def _hasher_at(upload):
+    """
+    Devuelve el hash acumulado hasta received_bytes. Si este proceso no lo
+    tiene (reinicio u otro proceso), se recalcula leyendo lo ya recibido.
+    """
+    if not os.path.exists(upload.part_path):
+        # El archivo parcial ya se movió o eliminó (carga finalizada o purgada)
+        _forget(upload.id)
+        raise UploadError('El archivo parcial de la carga ya no existe; inicie una nueva carga', 410)
+
+    state = _hashers.get(upload.id)
+    if state and state[0] == upload.received_bytes:
+        return state[1]
+
+    hasher = hashlib.sha256()
+    remaining = upload.received_bytes
+    with open(upload.part_path, 'rb') as f:
+        while remaining > 0:
+            block = f.read(min(STREAM_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            hasher.update(block)
+            remaining -= len(block)
+    return hasher
+
+def create_upload(user_id, filename, store_code, total_size, expected_hash=None):
+    """
+    Inicia una carga por fragmentos y reserva el archivo parcial.
+
+    Args:
+        user_id: Usuario que carga el archivo
+        filename: Nombre original del archivo
+        store_code: Código de la tienda
+        total_size: Tamaño total en bytes
+        expected_hash: SHA-256 esperado en hexadecimal (opcional)
+
+    Returns:
+        UploadSession: Carga creada
+    """
+    max_size = current_app.config['UPLOAD_MAX_FILE_SIZE']
+    if not isinstance(total_size, int) or total_size <= 0:
+        raise UploadError('Tamaño de archivo no válido')
+    if total_size > max_size:
+        raise UploadError(f'El archivo supera el tamaño máximo ({max_size} bytes)', 413)
+
+    filename, file_type, upload_dir = resolve_upload_target(filename, store_code, allow_archive=True)
+    upload_id = uuid.uuid4().hex
+    part_path = os.path.join(upload_dir, f".{upload_id}.part")
+    open(part_path, 'wb').close()
+
+    upload = UploadSession(
+        id=upload_id,
+        user_id=user_id,
+        store_code=store_code,
+        filename=filename,
+        file_type=file_type,
+        part_path=part_path,
+        total_size=total_size,
+        received_bytes=0,
+        expected_hash=expected_hash.lower() if expected_hash else None
+    )
+    db.session.add(upload)
+    db.session.commit()
+    return upload
+
+def write_chunk(upload, offset, stream, length):
+    """
+    Escribe un fragmento en su posición del archivo parcial, leyendo el cuerpo
+    por bloques y actualizando el hash sin cargar el fragmento en memoria.
+
+    Args:
+        upload: UploadSession
+        offset: Posición del fragmento (debe ser igual a los bytes ya recibidos)
+        stream: Flujo de entrada del cuerpo de la petición
+        length: Longitud declarada del fragmento (Content-Length)
+
+    Returns:
+        int: Bytes recibidos en total
+    """
+    max_chunk = current_app.config['UPLOAD_MAX_CHUNK_SIZE']
+    if length is None or length <= 0:
+        raise UploadError('Se requiere Content-Length', 411)
+    if length > max_chunk:
+        raise UploadError(f'El fragmento supera el tamaño máximo ({max_chunk} bytes)', 413)
+
+    with _upload_lock(upload.id):
+        db.session.refresh(upload)
+        if offset != upload.received_bytes:
+            # El cliente debe continuar desde la posición confirmada
+            raise UploadError(f'Posición incorrecta: se esperaba {upload.received_bytes}', 409)
+        if offset + length > upload.total_size:
+            raise UploadError('El fragmento excede el tamaño declarado del archivo', 416)
+
+        # Se trabaja sobre una copia: el hash guardado solo avanza con fragmentos confirmados
+        hasher = _hasher_at(upload).copy()
+        written = 0
+        try:
+            with open(upload.part_path, 'r+b') as f:
+                f.seek(offset)
+                while written < length:
+                    block = stream.read(min(STREAM_BLOCK_SIZE, length - written))
+                    if not block:
+                        break
+                    f.write(block)
+                    hasher.update(block)
+                    written += len(block)
+                if written != length:
+                    raise UploadError('Fragmento incompleto: conexión interrumpida')
+                f.truncate(offset + written)
+
+            upload.received_bytes = offset + written
+            upload.updated_date = datetime.utcnow()
+            db.session.commit()
+        except Exception:
+            # Un fragmento fallido (corte de conexión, ClientDisconnected, error al
+            # confirmar) se descarta entero: la posición confirmada no cambia
+            db.session.rollback()
+            with open(upload.part_path, 'r+b') as f:
+                f.truncate(offset)
+            _hashers.pop(upload.id, None)
+            raise
+
+        _hashers[upload.id] = (upload.received_bytes, hasher)
+        return upload.received_bytes
+
+def complete_upload(upload):
+    """
+    Comprueba que la carga está completa y su hash, y mueve el archivo a su
+    ruta definitiva. La eliminación de la carga se confirma en ese momento: a
+    partir de ahí el archivo es responsabilidad de quien la finaliza.
+
+    Args:
+        upload: UploadSession
+
+    Returns:
+        tuple: (ruta del archivo, SHA-256 en hexadecimal)
+    """
+    with _upload_lock(upload.id):
+        db.session.refresh(upload)
+        if upload.received_bytes != upload.total_size:
+            raise UploadError(f'Carga incompleta: {upload.received_bytes} de {upload.total_size} bytes', 409)
+
+        content_hash = _hasher_at(upload).hexdigest()
+        if upload.expected_hash and upload.expected_hash != content_hash:
+            discard_upload(upload)
+            db.session.commit()
+            raise UploadError('El hash del archivo no coincide con el indicado; la carga se ha descartado', 422)
+
+        file_path = unique_upload_path(os.path.dirname(upload.part_path), upload.filename)
+        os.replace(upload.part_path, file_path)
+        db.session.delete(upload)
+        db.session.commit()
+        _forget(upload.id)
+        return file_path, content_hash
+
+def discard_upload(upload):
+    """Cancela una carga y elimina su archivo parcial (sin confirmar la transacción)"""
+    if os.path.exists(upload.part_path):
+        os.remove(upload.part_path)
+    db.session.delete(upload)
+    _forget(upload.id)
+
+def purge_stale_uploads(max_age_hours=None):
+    """
+    Elimina las cargas sin actividad durante más de UPLOAD_SESSION_TTL_HOURS.
+
+    Args:
+        max_age_hours: Horas sin actividad (por defecto, la configuración)
+
+    Returns:
+        int: Cargas eliminadas
+    """
+    if max_age_hours is None:
+        max_age_hours = current_app.config['UPLOAD_SESSION_TTL_HOURS']
+    cutoff = datetime.utcnow() - timedelta(hours=max_age_hours)
+    stale = UploadSession.query.filter(UploadSession.updated_date < cutoff).all()
+    for upload in stale:
+        discard_upload(upload)
+    db.session.commit()
+    return len(stale)
+
+def schedule_purge(interval_seconds=3600):
+    """Encola la limpieza de cargas abandonadas como mucho una vez por intervalo"""
+    global _last_purge
+    now = time.monotonic()
+    if now - _last_purge >= interval_seconds:
+        _last_purge = now
+        ingestion_writer.submit(purge_stale_uploads, current_app.config['UPLOAD_SESSION_TTL_HOURS'])
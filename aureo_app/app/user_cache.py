@@ -0,0 +1,56 @@
+import time
+import threading
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import make_transient_to_detached
+from . import db
+from .models import User
+
+# Usuarios cargados recientemente: id -> (caducidad en time.monotonic, valores de columnas)
+_users = {}
+_lock = threading.Lock()
+
+# Tiempo de vida de cada entrada (se sobrescribe con USER_CACHE_TTL_SECONDS)
+ttl_seconds = 30
+
+def invalidate_user(user_id):
+    """Elimina un usuario de la caché"""
+    with _lock:
+        _users.pop(user_id, None)
+
+def load_cached_user(user_id):
+    """
+    Obtiene el usuario de la sesión actual sin consultar la base de datos si
+    se cargó hace menos de ttl_seconds en este proceso.
+
+    El usuario cacheado se añade a la sesión SQLAlchemy de la petición como
+    objeto persistente, así que se puede modificar y guardar como cualquier
+    otro.
+
+    Args:
+        user_id: ID del usuario
+
+    Returns:
+        User: Usuario, o None si no existe
+    """
+    now = time.monotonic()
+    with _lock:
+        entry = _users.get(user_id)
+    if entry and entry[0] > now:
+        user = db.session.identity_map.get(inspect(User).identity_key_from_primary_key((user_id,)))
+        if user is None:
+            user = User(**entry[1])
+            make_transient_to_detached(user)
+            db.session.add(user)
+        return user
+
+    user = User.query.get(user_id)
+    if user is not None:
+        values = {column.key: getattr(user, column.key) for column in inspect(User).column_attrs}
+        with _lock:
+            _users[user_id] = (now + ttl_seconds, values)
+    return user
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_changed_user(mapper, connection, target):
+    invalidate_user(target.id)
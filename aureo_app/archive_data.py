@@ -0,0 +1,44 @@
+import sys
+import argparse
+from app import create_app, db
+from app.archive import archive_old_rows, archive_years, archive_path
+
+def parse_arguments():
+    """Procesa los argumentos de línea de comandos"""
+    parser = argparse.ArgumentParser(description='Mueve los registros Excel antiguos a las bases de archivo anuales')
+    parser.add_argument('--days', type=int, default=None,
+                        help='Antigüedad mínima en días (por defecto: ARCHIVE_AFTER_DAYS)')
+    parser.add_argument('--vacuum', action='store_true',
+                        help='Compactar la base principal al terminar para liberar espacio')
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    app = create_app()
+    
+    with app.app_context():
+        try:
+            moved = archive_old_rows(args.days)
+        except Exception as e:
+            print(f"Error al archivar registros: {str(e)}")
+            return False
+        
+        if not moved:
+            print("No hay registros que archivar.")
+        for year, count in sorted(moved.items()):
+            print(f"Año {year}: {count} registros archivados en {archive_path(year)}")
+        
+        if args.vacuum and moved:
+            print("Compactando la base de datos principal...")
+            db.session.remove()
+            with db.engine.connect() as connection:
+                connection.exec_driver_sql("VACUUM")
+        
+        print(f"Años archivados: {', '.join(str(year) for year in archive_years()) or 'ninguno'}")
+    return True
+
+if __name__ == "__main__":
+    if main():
+        sys.exit(0)
+    else:
+        sys.exit(1)
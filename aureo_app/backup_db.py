@@ -0,0 +1,86 @@
+import sys
+import argparse
+from app import create_app
+from app.backup import SnapshotStore, online_backup, verify_database, database_path
+
+def parse_arguments():
+    """Procesa los argumentos de línea de comandos"""
+    parser = argparse.ArgumentParser(description='Copias de seguridad en línea de la base de datos de Áureo')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    snapshot = subparsers.add_parser('snapshot', help='Crear una instantánea incremental')
+    snapshot.add_argument('--full', action='store_true', help='Reescribir todas las páginas')
+    snapshot.add_argument('--no-verify', action='store_true', help='No verificar la instantánea creada')
+    
+    copy = subparsers.add_parser('copy', help='Crear una copia completa en un archivo SQLite')
+    copy.add_argument('dest', help='Ruta del archivo de destino')
+    
+    subparsers.add_parser('list', help='Listar las instantáneas')
+    
+    verify = subparsers.add_parser('verify', help='Verificar una instantánea (por defecto, la última)')
+    verify.add_argument('snapshot_id', nargs='?')
+    
+    restore = subparsers.add_parser('restore', help='Restaurar una instantánea en un archivo')
+    restore.add_argument('snapshot_id')
+    restore.add_argument('dest', help='Ruta del archivo restaurado (detenga la aplicación antes de sustituir la base en uso)')
+    
+    prune = subparsers.add_parser('prune', help='Eliminar las instantáneas antiguas')
+    prune.add_argument('--keep', type=int, default=None, help='Instantáneas a conservar (por defecto: BACKUP_KEEP)')
+    
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    app = create_app()
+    store = SnapshotStore(app.config['BACKUP_FOLDER'])
+    
+    try:
+        if args.command == 'snapshot':
+            manifest = store.create_snapshot(database_path(app), full=args.full)
+            print(f"Instantánea {manifest['id']} creada: {manifest['changedPages']} de {manifest['pageCount']} "
+                  f"páginas nuevas ({manifest['bytesWritten']} bytes) en {manifest['seconds']} s")
+            if not args.no_verify and not store.verify_snapshot(manifest['id']):
+                return False
+        
+        elif args.command == 'copy':
+            online_backup(database_path(app), args.dest)
+            ok, result = verify_database(args.dest)
+            if not ok:
+                print(f"La copia no supera la comprobación de integridad: {result[:5]}")
+                return False
+            print(f"Copia creada en: {args.dest}")
+        
+        elif args.command == 'list':
+            for snapshot in store.list_snapshots():
+                print(f"{snapshot['id']}  {'completa   ' if snapshot['full'] else 'incremental'}  "
+                      f"{snapshot['pageCount']} páginas, {snapshot['changedPages']} nuevas, "
+                      f"{snapshot['bytesWritten']} bytes")
+        
+        elif args.command == 'verify':
+            snapshots = store.list_snapshots()
+            snapshot_id = args.snapshot_id or (snapshots[-1]['id'] if snapshots else None)
+            if not snapshot_id:
+                print("No hay instantáneas.")
+                return False
+            if not store.verify_snapshot(snapshot_id):
+                return False
+            print(f"Instantánea {snapshot_id} verificada correctamente.")
+        
+        elif args.command == 'restore':
+            store.restore_snapshot(args.snapshot_id, args.dest)
+            print(f"Instantánea {args.snapshot_id} restaurada y verificada en: {args.dest}")
+        
+        elif args.command == 'prune':
+            keep = args.keep if args.keep is not None else app.config['BACKUP_KEEP']
+            print(f"Instantáneas eliminadas: {store.prune(keep)}")
+    except Exception as e:
+        print(f"Error en la copia de seguridad: {str(e)}")
+        return False
+    
+    return True
+
+if __name__ == "__main__":
+    if main():
+        sys.exit(0)
+    else:
+        sys.exit(1)
@@ -9,6 +9,7 @@ def build_frontend():
     
     - Ejecuta `npm run build` en el directorio del cliente React
     - Copia los archivos generados al directorio static de Flask
+    - Genera las variantes gzip/brotli y el manifiesto de archivos
     """
     base_dir = os.path.abspath(os.path.dirname(__file__))
     client_dir = os.path.abspath(os.path.join(base_dir, '..', 'client'))
@@ -79,6 +80,12 @@ def build_frontend():
                 shutil.copytree(src, dst)
         
         print(f"Archivos copiados al directorio static.")
+        
+        # Variantes comprimidas y manifiesto para el servidor
+        from app.static_assets import build_manifest
+        manifest = build_manifest(static_dir)
+        compressed = sum(1 for entry in manifest['files'].values() if entry['encodings'])
+        print(f"Manifiesto generado: {len(manifest['files'])} archivos, {compressed} con variantes comprimidas.")
         return True
         
     except Exception as e:
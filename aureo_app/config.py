@@ -12,20 +12,97 @@ class Config:
     SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(BASE_DIR, 'datos.sqlite')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Perfil de almacenamiento SQLite (se aplica a cada conexión)
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))  # 256MB
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 64 * 1024))  # 64MB
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_READ_POOL_SIZE = int(os.environ.get('SQLITE_READ_POOL_SIZE', 8))
+    
+    # Conexiones de solo lectura para las consultas GET de la API
+    SQLALCHEMY_BINDS = {
+        'readonly': {
+            'url': SQLALCHEMY_DATABASE_URI,
+            'pool_size': SQLITE_READ_POOL_SIZE,
+        }
+    }
+    
     # Configuración de seguridad
     SECRET_KEY = os.environ.get('SECRET_KEY', 'aureo_app_secret_key_change_in_production')
     
-    # Configuración de sesión
-    SESSION_TYPE = 'filesystem'
+    # Configuración de sesión ('database' guarda las sesiones en la tabla user_session;
+    # también se admiten los tipos de Flask-Session, como 'filesystem')
+    SESSION_TYPE = os.environ.get('SESSION_TYPE', 'database')
     SESSION_FILE_DIR = os.path.join(BASE_DIR, 'flask_session')
     SESSION_PERMANENT = False
     SESSION_USE_SIGNER = True
+    SESSION_IDLE_TIMEOUT_MINUTES = int(os.environ.get('SESSION_IDLE_TIMEOUT_MINUTES', 480))
+    SESSION_CLEANUP_INTERVAL_MINUTES = int(os.environ.get('SESSION_CLEANUP_INTERVAL_MINUTES', 60))
+    
+    # Registro de cambios (/api/changes)
+    CHANGES_MAX_BATCH = int(os.environ.get('CHANGES_MAX_BATCH', 500))
+    CHANGE_LOG_RETENTION_DAYS = int(os.environ.get('CHANGE_LOG_RETENTION_DAYS', 30))
+    
+    # Número máximo de subpeticiones en /api/batch
+    BATCH_MAX_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS', 20))
+    
+    # Codificador JSON de los listados: 'auto' (orjson si está instalado), 'orjson' o 'json'
+    JSON_FAST_BACKEND = os.environ.get('JSON_FAST_BACKEND', 'auto')
+    
+    # Segundos que se reutiliza en memoria el usuario autenticado sin consultarlo
+    USER_CACHE_TTL_SECONDS = int(os.environ.get('USER_CACHE_TTL_SECONDS', 30))
     
     # Configuración de archivos
     UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
     EXCEL_WATCH_DIR = os.path.join(BASE_DIR, 'data', 'excel_watch')
     PDF_WATCH_DIR = os.path.join(BASE_DIR, 'data', 'pdf_watch')
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # Máximo 16MB
+    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # Máximo 16MB por petición (cargas directas)
+    
+    # Cargas por fragmentos (/api/uploads): sin el límite de 16MB por archivo
+    UPLOAD_MAX_FILE_SIZE = int(os.environ.get('UPLOAD_MAX_FILE_SIZE', 2 * 1024 * 1024 * 1024))
+    UPLOAD_MAX_CHUNK_SIZE = 8 * 1024 * 1024  # Debe ser menor que MAX_CONTENT_LENGTH
+    UPLOAD_SESSION_TTL_HOURS = int(os.environ.get('UPLOAD_SESSION_TTL_HOURS', 48))
+    
+    # Caché de miniaturas de páginas PDF
+    THUMBNAIL_CACHE_FOLDER = os.path.join(BASE_DIR, 'cache', 'thumbnails')
+    THUMBNAIL_CACHE_MAX_BYTES = int(os.environ.get('THUMBNAIL_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+    THUMBNAIL_MAX_AGE = 24 * 3600  # Segundos que el navegador reutiliza una miniatura
+    
+    # Cargas masivas (/api/upload-batches)
+    BULK_UPLOAD_MAX_FILES = int(os.environ.get('BULK_UPLOAD_MAX_FILES', 1000))
+    BULK_PARSE_WORKERS = int(os.environ.get('BULK_PARSE_WORKERS', min(4, os.cpu_count() or 1)))
+    
+    # Métricas en formato Prometheus (/metrics); con METRICS_TOKEN se exige "Authorization: Bearer <token>"
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() == 'true'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    
+    # Medición de consultas SQL: registro de consultas lentas (con su plan) y cabecera Server-Timing
+    SLOW_QUERY_THRESHOLD_MS = int(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 200))
+    SLOW_QUERY_EXPLAIN = os.environ.get('SLOW_QUERY_EXPLAIN', 'True').lower() == 'true'
+    QUERY_COUNT_WARNING = int(os.environ.get('QUERY_COUNT_WARNING', 100))  # Consultas por petición; 0 desactiva el aviso
+    SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', 'True').lower() == 'true'
+    
+    # Configuración del archivo histórico de registros Excel
+    ARCHIVE_FOLDER = os.path.join(BASE_DIR, 'archive')
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 365))
+    
+    # Configuración de copias de seguridad (instantáneas incrementales)
+    # Solo el almacenamiento es incremental: cada instantánea lee la base completa mediante una
+    # copia en línea a un archivo temporal del mismo tamaño en BACKUP_FOLDER
+    BACKUP_FOLDER = os.path.join(BASE_DIR, 'backups')
+    BACKUP_SCHEDULE_ENABLED = os.environ.get('BACKUP_SCHEDULE_ENABLED', 'True').lower() == 'true'
+    BACKUP_INTERVAL_HOURS = float(os.environ.get('BACKUP_INTERVAL_HOURS', 6))
+    BACKUP_KEEP = int(os.environ.get('BACKUP_KEEP', 28))  # Instantáneas conservadas
+    BACKUP_FULL_EVERY = int(os.environ.get('BACKUP_FULL_EVERY', 28))  # Una completa cada N instantáneas
+    
+    # Configuración de caché de búsquedas
+    SEARCH_CACHE_MAX_BYTES = int(os.environ.get('SEARCH_CACHE_MAX_BYTES', 64 * 1024 * 1024))  # 64MB
+    
+    # Configuración de trabajos de búsqueda en segundo plano
+    SEARCH_EXPORT_FOLDER = os.path.join(BASE_DIR, 'exports')
+    SEARCH_JOB_WORKERS = int(os.environ.get('SEARCH_JOB_WORKERS', 2))
+    SEARCH_JOB_RETENTION_HOURS = int(os.environ.get('SEARCH_JOB_RETENTION_HOURS', 48))
     
     # Configuración de aplicación
     DEBUG = os.environ.get('FLASK_DEBUG', 'True').lower() == 'true'
@@ -41,9 +118,20 @@ class Config:
         # Crear directorios para archivos
         os.makedirs(os.path.join(Config.BASE_DIR, 'uploads', 'excel'), exist_ok=True)
         os.makedirs(os.path.join(Config.BASE_DIR, 'uploads', 'pdf'), exist_ok=True)
+        os.makedirs(os.path.join(Config.BASE_DIR, 'uploads', 'batches'), exist_ok=True)
+        os.makedirs(os.path.join(Config.BASE_DIR, 'cache', 'thumbnails'), exist_ok=True)
         os.makedirs(os.path.join(Config.BASE_DIR, 'data', 'excel_watch'), exist_ok=True)
         os.makedirs(os.path.join(Config.BASE_DIR, 'data', 'pdf_watch'), exist_ok=True)
         
+        # Crear directorio para exportaciones de búsquedas
+        os.makedirs(os.path.join(Config.BASE_DIR, 'exports'), exist_ok=True)
+        
+        # Crear directorio para las bases de archivo
+        os.makedirs(os.path.join(Config.BASE_DIR, 'archive'), exist_ok=True)
+        
+        # Crear directorio para las copias de seguridad
+        os.makedirs(os.path.join(Config.BASE_DIR, 'backups'), exist_ok=True)
+        
         # Crear directorio para sesiones
         os.makedirs(os.path.join(Config.BASE_DIR, 'flask_session'), exist_ok=True)
 
@@ -54,9 +142,6 @@ class ProductionConfig(Config):
     DEBUG = False
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'generate-a-secure-key-for-production'
     
-    # En producción, usar un tipo de sesión más seguro y eficiente si está disponible
-    SESSION_TYPE = 'filesystem'  # Considerar 'redis' o 'memcached' para mayor rendimiento
-    
     # Configuración de seguridad adicional para producción
     SESSION_COOKIE_SECURE = True  # Solo enviar cookie de sesión por HTTPS
     SESSION_COOKIE_HTTPONLY = True  # Prevenir acceso a cookie por JavaScript
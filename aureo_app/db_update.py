@@ -2,18 +2,25 @@ import os
 import sys
 import subprocess
 import sqlite3
+from sqlalchemy import text
 from app import create_app, db
 from app.models import init_db
 
 def backup_database():
-    """Crea una copia de seguridad de la base de datos antes de actualizarla"""
+    """Crea una copia de seguridad consistente de la base de datos antes de actualizarla"""
+    from app.backup import online_backup, verify_database
+    
     base_dir = os.path.abspath(os.path.dirname(__file__))
     db_path = os.path.join(base_dir, 'datos.sqlite')
     backup_path = os.path.join(base_dir, 'datos.sqlite.bak')
     
     if os.path.exists(db_path):
-        import shutil
-        shutil.copy2(db_path, backup_path)
+        # La API de copia de SQLite incluye lo pendiente en el WAL, a diferencia de copiar el archivo
+        online_backup(db_path, backup_path)
+        ok, result = verify_database(backup_path)
+        if not ok:
+            print(f"La copia de seguridad no supera la comprobación de integridad: {result[:5]}")
+            return False
         print(f"Copia de seguridad creada en: {backup_path}")
         return True
     return False
@@ -38,7 +45,11 @@ def check_if_update_needed():
             required_tables = [
                 'user', 'store', 'system_config', 'file_activity', 
                 'excel_data', 'pdf_document', 'watchlist_person', 
-                'watchlist_item', 'alert', 'search_history'
+                'watchlist_item', 'alert', 'search_history', 'person',
+                'facet_count', 'search_job', 'alert_group',
+                'daily_store_stats', 'stat_counter', 'user_session',
+                'table_version', 'change_log', 'upload_session',
+                'upload_batch'
             ]
             
             missing_tables = [table for table in required_tables if table not in tables]
@@ -46,14 +57,191 @@ def check_if_update_needed():
             if missing_tables:
                 print(f"Tablas faltantes: {missing_tables}")
                 return True
+            
+            missing_columns = get_missing_columns(cursor)
+            if missing_columns:
+                print(f"Columnas faltantes: {[f'{table}.{column.name}' for table, column in missing_columns]}")
+                return True
                 
             return False
         except Exception as e:
             print(f"Error al verificar estructura de base de datos: {str(e)}")
             return True
 
+def get_missing_columns(cursor):
+    """
+    Obtiene las columnas definidas en los modelos que no existen en la base de datos.
+    
+    Args:
+        cursor: Cursor sqlite3 abierto sobre la base de datos
+    
+    Returns:
+        list: Tuplas (nombre de tabla, columna) de las columnas faltantes
+    """
+    missing = []
+    for table in db.metadata.sorted_tables:
+        cursor.execute(f"PRAGMA table_info('{table.name}')")
+        existing = {row[1] for row in cursor.fetchall()}
+        if not existing:
+            continue  # La tabla no existe: la crea db.create_all()
+        for column in table.columns:
+            if column.name not in existing:
+                missing.append((table.name, column))
+    return missing
+
+def backfill_derived_columns():
+    """Calcula las columnas derivadas (normalizadas) de los registros existentes"""
+    from app.normalization import normalize_name
+    
+    backfills = [
+        ('excel_data', 'customer_name', 'customer_name_norm', normalize_name),
+        ('watchlist_person', 'name', 'name_norm', normalize_name),
+    ]
+    
+    for table, source, target, func in backfills:
+        rows = db.session.execute(text(
+            f"SELECT id, {source} FROM {table} WHERE {target} IS NULL AND {source} IS NOT NULL"
+        )).fetchall()
+        
+        updates = [{'id': row[0], 'value': func(row[1])} for row in rows]
+        for start in range(0, len(updates), 5000):
+            db.session.execute(text(f"UPDATE {table} SET {target} = :value WHERE id = :id"),
+                               updates[start:start + 5000])
+        db.session.commit()
+        
+        if updates:
+            print(f"Columna {table}.{target} calculada para {len(updates)} registros")
+
+def backfill_persons():
+    """Vincula los registros Excel existentes con su persona (DNI/NIE)"""
+    from app.models import ExcelData
+    from app.file_processors import link_person
+    
+    persons = {}
+    linked = 0
+    last_id = 0
+    
+    while True:
+        batch = ExcelData.query.filter(
+            ExcelData.id > last_id,
+            ExcelData.person_id.is_(None),
+            ExcelData.customer_contact.isnot(None)
+        ).order_by(ExcelData.id).limit(5000).all()
+        if not batch:
+            break
+        
+        for excel_data in batch:
+            if link_person(excel_data, persons):
+                linked += 1
+        last_id = batch[-1].id
+        db.session.commit()
+    
+    if linked:
+        print(f"Registros vinculados con personas: {linked}")
+
+def backfill_alert_groups():
+    """Agrupa las alertas existentes por elemento vigilado y archivo"""
+    from app.models import Alert, AlertGroup, ExcelData
+    
+    rows = db.session.query(
+        Alert.id, Alert.type, Alert.watchlist_person_id, Alert.watchlist_item_id, Alert.match_type,
+        Alert.excel_data_id, Alert.alert_date, Alert.status, ExcelData.file_activity_id
+    ).join(ExcelData, ExcelData.id == Alert.excel_data_id).filter(
+        Alert.group_id.is_(None)
+    ).order_by(Alert.id).all()
+    if not rows:
+        return
+    
+    groups = {}
+    members = {}
+    for row in rows:
+        key = (row.type, row.watchlist_person_id, row.watchlist_item_id, row.file_activity_id)
+        group = groups.get(key)
+        if group is None:
+            group = AlertGroup(
+                file_activity_id=row.file_activity_id,
+                watchlist_person_id=row.watchlist_person_id,
+                watchlist_item_id=row.watchlist_item_id,
+                type=row.type,
+                match_types='',
+                hit_count=0,
+                excel_data_ids='[]',
+                status='Reviewed',
+                first_alert_date=row.alert_date
+            )
+            groups[key] = group
+            members[key] = []
+        group.add_hit(row.excel_data_id, row.match_type)
+        group.last_alert_date = row.alert_date
+        if row.status == 'Pending':
+            group.status = 'Pending'
+        members[key].append(row.id)
+    
+    for group in groups.values():
+        group.apply_hits(group.last_alert_date)
+    db.session.add_all(groups.values())
+    db.session.flush()
+    
+    updates = [{'group_id': groups[key].id, 'id': alert_id}
+               for key, alert_ids in members.items() for alert_id in alert_ids]
+    for start in range(0, len(updates), 5000):
+        db.session.execute(text("UPDATE alert SET group_id = :group_id WHERE id = :id"),
+                           updates[start:start + 5000])
+    db.session.commit()
+    print(f"Grupos de alertas creados: {len(groups)}")
+
+def migrate_database_schema():
+    """
+    Actualiza la estructura sin perder datos: crea las tablas nuevas, añade las
+    columnas que faltan con sus índices y calcula las columnas derivadas.
+    
+    Returns:
+        bool: True si se completó correctamente, False en caso contrario
+    """
+    try:
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+            
+            conn = sqlite3.connect(app.config['SQLALCHEMY_DATABASE_URI'].replace('sqlite:///', ''))
+            cursor = conn.cursor()
+            missing_columns = get_missing_columns(cursor)
+            
+            for table_name, column in missing_columns:
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {column.name} {column_type}")
+                print(f"Columna añadida: {table_name}.{column.name}")
+            
+            conn.commit()
+            conn.close()
+            
+            # Crear los índices de las columnas añadidas
+            for table in db.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(bind=db.engine, checkfirst=True)
+            
+            backfill_derived_columns()
+            backfill_persons()
+            backfill_alert_groups()
+            
+            # Recalcular las facetas agregadas si la tabla es nueva
+            from app.facets import rebuild_facet_counts
+            from app.models import FacetCount
+            if FacetCount.query.first() is None:
+                rebuild_facet_counts()
+            
+            # Recalcular las estadísticas del panel si las tablas son nuevas
+            from app.stats import rebuild_stats
+            from app.models import StatCounter
+            if StatCounter.query.first() is None:
+                rebuild_stats()
+            return True
+    except Exception as e:
+        print(f"Error al migrar la base de datos: {str(e)}")
+        return False
+
 def update_database_schema():
-    """Actualiza la estructura de la base de datos según el modelo actual"""
+    """Recrea la estructura de la base de datos según el modelo actual (conserva solo usuarios)"""
     try:
         # Crear aplicación y contexto
         app = create_app()
@@ -120,6 +308,11 @@ def main():
         print("Actualización cancelada.")
         return False
     
+    if migrate_database_schema():
+        print("Base de datos actualizada correctamente.")
+        return True
+    
+    print("No se pudo migrar la estructura; se recreará la base de datos conservando los usuarios.")
     if update_database_schema():
         print("Base de datos actualizada correctamente.")
         return True
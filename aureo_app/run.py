@@ -1,10 +1,16 @@
 from app import create_app, db
 from app.file_watcher import init_watchers
+from app.backup import start_backup_scheduler
 import os
 import argparse
 
 app = create_app()
 
+# Copias de seguridad programadas (solo en el proceso que atiende peticiones,
+# no en el proceso vigilante del recargador de depuración)
+if app.config['BACKUP_SCHEDULE_ENABLED'] and (not app.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+    start_backup_scheduler(app)
+
 # Ejecutar antes del primer request
 @app.before_first_request
 def before_first_request():
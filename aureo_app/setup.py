@@ -14,8 +14,13 @@ def setup_aureo():
     dirs = [
         os.path.join(base_dir, 'uploads', 'excel'),
         os.path.join(base_dir, 'uploads', 'pdf'),
+        os.path.join(base_dir, 'uploads', 'batches'),
+        os.path.join(base_dir, 'cache', 'thumbnails'),
         os.path.join(base_dir, 'data', 'excel_watch'),
         os.path.join(base_dir, 'data', 'pdf_watch'),
+        os.path.join(base_dir, 'exports'),
+        os.path.join(base_dir, 'archive'),
+        os.path.join(base_dir, 'backups'),
         os.path.join(base_dir, 'flask_session'),
     ]
     